@@ -61,10 +61,20 @@ class CaisseAdmin(admin.ModelAdmin):
     search_fields = ('name',)
     list_filter = ('name',)
     readonly_fields = ('current_balance', 'last_updated')
+    
+    def get_queryset(self, request):
+        return Caisse.annotate_balances(super().get_queryset(request))
 
 @admin.register(CaisseOperation)
 class CaisseOperationAdmin(admin.ModelAdmin):
     list_display = ('caisse', 'operation_type', 'amount', 'balance_after', 'description', 'performed_by', 'timestamp')
     list_filter = ('caisse', 'operation_type', 'performed_by')
     search_fields = ('description', 'performed_by__username')
-    date_hierarchy = 'timestamp'
\ No newline at end of file
+    date_hierarchy = 'timestamp'
+    
+    # The ledger is append-only: balances, snapshots and caisse ETags rely on it
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
\ No newline at end of file
@@ -0,0 +1,53 @@
+"""
+Token authentication with a cache of token -> user lookups.
+
+DRF's TokenAuthentication joins Token and User on every request. Here a
+successful lookup is remembered for TOKEN_CACHE_TTL seconds (see settings)
+in the default cache, so the POS hot path skips that query. Entries are
+deleted when a token is deleted (logout) or its user is saved or deleted,
+through `api.signals`. The default cache is shared between workers (the
+api.E001 system check enforces it), so a logout or deactivation takes effect
+in every worker at once.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+def _ttl():
+    return getattr(settings, 'TOKEN_CACHE_TTL', 60)
+
+
+def token_cache_key(key):
+    # Hashed so raw tokens never appear in the cache backend
+    return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def forget_token(key):
+    """Drop a token from the cache, e.g. once it has been deleted"""
+    cache.delete(token_cache_key(key))
+
+
+def forget_user(user_id):
+    """Drop the cached tokens of a user, e.g. after it was deactivated"""
+    keys = Token.objects.filter(user_id=user_id).values_list('key', flat=True)
+    cache.delete_many([token_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that remembers successful lookups for a short time"""
+
+    def authenticate_credentials(self, key):
+        # Entries are unpickled on every get, so requests never share a user instance
+        entry = cache.get(token_cache_key(key))
+        if entry is not None:
+            return entry
+
+        user, token = super().authenticate_credentials(key)
+        ttl = _ttl()
+        if ttl > 0:
+            cache.set(token_cache_key(key), (user, token), ttl)
+        return user, token
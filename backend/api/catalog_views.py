@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import viewsets, status, permissions
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .models import Product, Stock, DeletedProduct
+
+# Columns of the catalog payload, in order, and the values they are read from
+CATALOG_COLUMNS = (
+    ('id', 'id'),
+    ('type', 'product_type'),
+    ('code', 'code'),
+    ('name', 'name'),
+    ('price', 'selling_unite_price'),
+    ('semi_bulk_price', 'selling_semi_bulk_price'),
+    ('bulk_price', 'selling_bulk_price'),
+    ('stock', 'stock__quantity'),
+)
+
+# Rows written by transactions still open when a token is issued carry an
+# earlier timestamp than the token: auto_now is set before the write waits for
+# the database lock, for up to the busy timeout, and commits. Tokens therefore
+# point back by the busy timeout plus this margin, so such rows are re-sent
+# instead of missed. Clients apply rows by id, so re-sent rows are harmless.
+SYNC_MARGIN = timedelta(seconds=10)
+
+
+def sync_overlap():
+    """How far before the current time issued tokens point"""
+    busy_timeout = settings.DATABASES['default'].get('OPTIONS', {}).get('timeout', 0)
+    return timedelta(seconds=busy_timeout) + SYNC_MARGIN
+
+
+def encode_token(moment):
+    return str(int(moment.timestamp() * 1_000_000))
+
+
+def decode_token(token):
+    """Return the datetime a token stands for, or None if it is malformed"""
+    try:
+        return datetime.fromtimestamp(int(token) / 1_000_000, tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def catalog_columns(queryset):
+    """Serialize products column by column: {'id': [...], 'name': [...], ...}"""
+    sources = [source for _, source in CATALOG_COLUMNS]
+    rows = list(queryset.order_by('id').values_list(*sources))
+    columns = {}
+    for index, (column, _) in enumerate(CATALOG_COLUMNS):
+        values = [row[index] for row in rows]
+        if column.endswith('price'):
+            values = [str(value) if value is not None else None for value in values]
+        elif column == 'stock':
+            values = [value or 0 for value in values]
+        columns[column] = values
+    return len(rows), columns
+
+
+# Catalog ViewSet
+class CatalogViewSet(viewsets.ViewSet):
+    """Compact product catalog for point-of-sale clients, with delta sync"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def sellable_products(self):
+        return Product.objects.filter(product_type__in=[kind for kind, _ in Product.PRODUCT_TYPES])
+
+    @action(detail=False, methods=['get'])
+    def snapshot(self, request):
+        """Every product with its prices and stock; pass `token` to `changes` afterwards"""
+        token = encode_token(timezone.now() - sync_overlap())
+        count, columns = catalog_columns(self.sellable_products())
+        return Response({'token': token, 'count': count, 'columns': columns})
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Products whose details or stock changed, and ids deleted, since `since`.
+        Tokens older than CATALOG_SYNC_MAX_AGE_DAYS are answered with 410 Gone.
+        """
+        since = decode_token(request.query_params.get('since', None))
+        if since is None:
+            return Response({'error': 'since must be a token returned by snapshot or changes'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if since < DeletedProduct.sync_horizon():
+            # Tombstones that old are pruned, so deletions could be missed
+            return Response({'error': 'since is too old; take a new snapshot', 'snapshot_required': True},
+                            status=status.HTTP_410_GONE)
+
+        token = encode_token(timezone.now() - sync_overlap())
+
+        # Two index range scans instead of an OR across the join
+        changed_ids = set(Product.objects.filter(updated_at__gte=since).values_list('id', flat=True))
+        changed_ids.update(Stock.objects.filter(last_updated__gte=since).values_list('product_id', flat=True))
+
+        count, columns = catalog_columns(self.sellable_products().filter(id__in=changed_ids))
+        deleted = sorted(set(
+            DeletedProduct.objects.filter(deleted_at__gte=since).values_list('product_id', flat=True)
+        ))
+        return Response({'token': token, 'count': count, 'columns': columns, 'deleted': deleted})
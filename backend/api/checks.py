@@ -0,0 +1,28 @@
+"""
+System checks for deployment settings the API relies on.
+"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Backends whose entries live in the memory of a single process
+PER_PROCESS_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Cached responses and reports are invalidated by bumping generations in
+    the default cache, and cached token lookups by deleting their entry there
+    (api.authentication). On a per-process cache these only reach the worker
+    that made the change, so with several workers the cache must be shared.
+    """
+    workers = getattr(settings, 'WEB_WORKERS', 1)
+    backend = settings.CACHES['default']['BACKEND']
+    if workers > 1 and backend in PER_PROCESS_CACHES:
+        return [Error(
+            f'{workers} workers are configured but the default cache ({backend}) is per-process, '
+            'so the other workers would keep serving stale responses and accepting revoked tokens.',
+            hint='Set CACHE_BACKEND to a shared backend (database, Redis, ...) or run a single worker.',
+            id='api.E001',
+        )]
+    return []
@@ -0,0 +1,136 @@
+"""
+Product code allocation.
+
+Codes are 4 characters over a 32-symbol alphabet, giving 32^4 = 2^20 codes.
+Instead of guessing random codes until one is free, a counter stored in
+`ProductCodeSequence` is advanced atomically and each counter value is mapped
+through a fixed bijection of [0, 2^20) before being encoded. Consecutive
+products therefore get unrelated-looking codes, every counter value maps to a
+distinct code, and allocating N codes costs one UPDATE plus one indexed lookup
+regardless of how full the code space is.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from .models import Product, ProductCodeSequence
+
+# Excludes visually similar characters (0, O, 1, l, I)
+CODE_ALPHABET = '23456789ABCDEFGHJKLMNPQRSTUVWXYZ'
+CODE_LENGTH = 4
+CODE_SPACE = len(CODE_ALPHABET) ** CODE_LENGTH
+CODE_MASK = CODE_SPACE - 1
+CODE_BITS = CODE_MASK.bit_length()
+
+SEQUENCE_ID = 1
+
+
+class ProductCodeSpaceExhausted(Exception):
+    """Raised when every product code has been handed out"""
+
+
+def scramble(value):
+    """
+    Map a counter value to a code index. Each step (odd multiplication modulo
+    2^20, xor with a right shift, constant offset) is invertible, so the whole
+    mapping is a permutation of the code space.
+    """
+    value = (value * 0x9E3B5) & CODE_MASK
+    value ^= value >> 11
+    value = (value * 0x5BD1F) & CODE_MASK
+    value ^= value >> 7
+    return (value + 0x2F1A3) & CODE_MASK
+
+
+_INVERSE_1 = pow(0x9E3B5, -1, CODE_SPACE)
+_INVERSE_2 = pow(0x5BD1F, -1, CODE_SPACE)
+
+
+def _unshift(value, shift):
+    # Inverse of value ^= value >> shift
+    result = value
+    for _ in range(CODE_BITS // shift):
+        result = value ^ (result >> shift)
+    return result
+
+
+def unscramble(index):
+    """Inverse of `scramble`: the counter value a code index is handed out at"""
+    value = (index - 0x2F1A3) & CODE_MASK
+    value = _unshift(value, 7)
+    value = (value * _INVERSE_2) & CODE_MASK
+    value = _unshift(value, 11)
+    return (value * _INVERSE_1) & CODE_MASK
+
+
+def encode(index):
+    """Encode a code index as a fixed-length string over CODE_ALPHABET"""
+    chars = []
+    for _ in range(CODE_LENGTH):
+        index, digit = divmod(index, len(CODE_ALPHABET))
+        chars.append(CODE_ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def decode(code):
+    """Code index of a string produced by `encode`, or None for codes outside the scheme"""
+    if not code or len(code) != CODE_LENGTH:
+        return None
+    index = 0
+    for char in code:
+        digit = CODE_ALPHABET.find(char)
+        if digit < 0:
+            return None
+        index = index * len(CODE_ALPHABET) + digit
+    return index
+
+
+def _reserve(count):
+    """Advance the sequence by `count` and return the first reserved value"""
+    updated = ProductCodeSequence.objects.filter(pk=SEQUENCE_ID).update(next_value=F('next_value') + count)
+    if not updated:
+        ProductCodeSequence.objects.get_or_create(pk=SEQUENCE_ID)
+        ProductCodeSequence.objects.filter(pk=SEQUENCE_ID).update(next_value=F('next_value') + count)
+
+    next_value = ProductCodeSequence.objects.values_list('next_value', flat=True).get(pk=SEQUENCE_ID)
+    return next_value - count
+
+
+def allocate_product_codes(count):
+    """
+    Reserve `count` unused product codes in one batch, e.g. for bulk imports.
+    Codes already present in the catalog (legacy random codes or codes typed
+    in by hand) are skipped and replaced from the sequence.
+    """
+    codes = []
+    with transaction.atomic():
+        while len(codes) < count:
+            needed = count - len(codes)
+            start = _reserve(needed)
+            if start + needed > CODE_SPACE:
+                raise ProductCodeSpaceExhausted(f"Only {max(CODE_SPACE - start, 0)} product codes left")
+
+            candidates = [encode(scramble(value)) for value in range(start, start + needed)]
+            taken = set(Product.objects.filter(code__in=candidates).values_list('code', flat=True))
+            codes.extend(code for code in candidates if code not in taken)
+
+    return codes
+
+
+def allocate_product_code():
+    """Reserve a single unused product code"""
+    return allocate_product_codes(1)[0]
+
+
+def remaining_product_codes():
+    """
+    Number of codes the sequence can still hand out. Codes already in the
+    catalog that the sequence has not reached yet will be skipped when it
+    does, so they are not counted.
+    """
+    next_value = ProductCodeSequence.objects.filter(pk=SEQUENCE_ID).values_list('next_value', flat=True).first() or 0
+    ahead = 0
+    for code in Product.objects.exclude(code__isnull=True).values_list('code', flat=True).iterator():
+        index = decode(code)
+        if index is not None and unscramble(index) >= next_value:
+            ahead += 1
+    return max(CODE_SPACE - next_value - ahead, 0)
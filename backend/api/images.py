@@ -0,0 +1,213 @@
+"""
+Background processing of uploaded pictures.
+
+Once a PhoneImage or Brand with a new picture is committed, `api.signals`
+hands it to `schedule_processing`, which runs `process_image` on a small
+thread pool (Pillow releases the GIL while decoding, resizing and encoding).
+The upload is checked to be a readable image, rotated upright from its EXIF
+orientation, stripped of metadata and recompressed to at most
+MAX_DIMENSION pixels, and one thumbnail is written per THUMBNAIL_SIZES
+entry, all in WebP (JPEG when Pillow lacks WebP support).
+
+The result is recorded in the model's `thumbnails` JSON field:
+{'source': <processed file name>, 'grid': <name>, 'detail': ..., 'zoom': ...},
+or {'source': <upload name>, 'error': <reason>} when the upload could not be
+read. Serializers turn it into URLs with `thumbnail_urls`, falling back to
+the original picture until the thumbnails exist.
+
+Set IMAGE_PIPELINE_WORKERS (see settings) to 0 to process pictures inline
+once the transaction commits instead.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from .response_cache import invalidate_responses
+
+logger = logging.getLogger(__name__)
+
+# Bounding boxes, in pixels, of the thumbnails kept for every picture
+THUMBNAIL_SIZES = {
+    'zoom': 1200,
+    'detail': 600,
+    'grid': 200,
+}
+
+# Longest side of the recompressed original
+MAX_DIMENSION = 2048
+
+QUALITY = 82
+
+if features.check('webp'):
+    FORMAT, EXTENSION = 'WEBP', 'webp'
+else:
+    FORMAT, EXTENSION = 'JPEG', 'jpg'
+
+THUMBNAIL_DIRECTORY = 'thumbnails'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def validate_upload(file):
+    """Raise ValueError unless `file` is an image Pillow can read"""
+    try:
+        with Image.open(file) as image:
+            image.verify()
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise ValueError(f'{getattr(file, "name", "File")} is not a valid image: {e}')
+    finally:
+        file.seek(0)
+
+
+def _encode(image):
+    buffer = BytesIO()
+    if FORMAT == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha channel: flatten transparent pictures onto white
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    image.save(buffer, FORMAT, quality=QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def render(file):
+    """
+    Decode an uploaded picture and return (original, {size: thumbnail}) as
+    encoded bytes. Raises ValueError if the file is not a readable image.
+    """
+    validate_upload(file)
+    try:
+        with Image.open(file) as source:
+            source.load()
+            image = ImageOps.exif_transpose(source)
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise ValueError(f'Unreadable image: {e}')
+
+    # Only pixels are kept: EXIF, ICC profiles and comments are dropped
+    mode = 'RGBA' if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info else 'RGB'
+    image = image.convert(mode)
+    image.info = {}
+
+    image.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.LANCZOS)
+    original = _encode(image)
+
+    # Largest first, each thumbnail scaled down from the previous one
+    thumbnails = {}
+    for size, bound in THUMBNAIL_SIZES.items():
+        image = image.copy()
+        image.thumbnail((bound, bound), Image.LANCZOS)
+        thumbnails[size] = _encode(image)
+    return original, thumbnails
+
+
+def process_image(model, pk, field_name, name, table):
+    """
+    Recompress the picture `name` of row `pk` and write its thumbnails.
+
+    The row is only updated if its picture is still `name`; when it was
+    replaced in the meantime the files just written are removed, and the
+    newer picture is processed by its own task.
+    """
+    storage = model._meta.get_field(field_name).storage
+    rows = model.objects.filter(pk=pk, **{field_name: name})
+    # Queryset updates skip auto_now; bump it so conditional GETs see the change
+    updates = {}
+    if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+        updates['updated_at'] = timezone.now()
+
+    try:
+        with storage.open(name) as file:
+            original, thumbnails = render(file)
+    except FileNotFoundError:
+        logger.warning('Image %s of %s #%s is missing; not processed', name, model.__name__, pk)
+        return
+    except ValueError as e:
+        logger.warning('Image %s of %s #%s rejected: %s', name, model.__name__, pk, e)
+        if rows.update(thumbnails={'source': name, 'error': str(e)}, **updates):
+            invalidate_responses(table)
+        return
+
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    written = [storage.save(os.path.join(directory, f'{stem}.{EXTENSION}'), ContentFile(original))]
+    record = {'source': written[0]}
+    for size, content in thumbnails.items():
+        record[size] = storage.save(
+            os.path.join(THUMBNAIL_DIRECTORY, directory, f'{stem}_{size}.{EXTENSION}'), ContentFile(content)
+        )
+        written.append(record[size])
+
+    previous = rows.values_list('thumbnails', flat=True).first()
+    if not rows.update(**{field_name: written[0], 'thumbnails': record}, **updates):
+        for path in written:
+            storage.delete(path)
+        return
+
+    # The raw upload and the thumbnails of an earlier picture are no longer referenced
+    stale = {name} | {path for key, path in (previous or {}).items() if key in THUMBNAIL_SIZES}
+    for path in stale.difference(written):
+        storage.delete(path)
+    invalidate_responses(table)
+
+
+def _run(*args):
+    try:
+        process_image(*args)
+    except Exception:
+        logger.exception('Image processing failed for %s #%s', args[0].__name__, args[1])
+    finally:
+        # Worker threads would otherwise keep a connection open each
+        connection.close()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_PIPELINE_WORKERS, thread_name_prefix='image-pipeline'
+            )
+        return _executor
+
+
+def needs_processing(instance, field_name):
+    """Whether the picture in `field_name` has not been processed yet"""
+    name = getattr(instance, field_name).name
+    return bool(name) and (instance.thumbnails or {}).get('source') != name
+
+
+def schedule_processing(instance, field_name, table):
+    """Process the picture in `field_name` of `instance` once the current transaction commits"""
+    args = (type(instance), instance.pk, field_name, getattr(instance, field_name).name, table)
+
+    def submit():
+        if settings.IMAGE_PIPELINE_WORKERS > 0:
+            _get_executor().submit(_run, *args)
+        else:
+            process_image(*args)
+
+    transaction.on_commit(submit)
+
+
+def thumbnail_urls(file, thumbnails, request=None):
+    """
+    {size: URL} of a picture's thumbnails, using the picture itself for sizes
+    not generated yet; None when there is no picture.
+    """
+    if not file:
+        return None
+    processed = (thumbnails or {}).get('source') == file.name
+    urls = {}
+    for size in THUMBNAIL_SIZES:
+        url = file.storage.url(thumbnails[size]) if processed and size in thumbnails else file.url
+        urls[size] = request.build_absolute_uri(url) if request is not None else url
+    return urls
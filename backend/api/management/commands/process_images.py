@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from api import images, response_cache
+from api.models import Brand, PhoneImage
+
+
+class Command(BaseCommand):
+    help = 'Recompress phone images and brand pictures and generate their thumbnails (api/images.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Process every picture again, not only those without thumbnails'
+        )
+
+    def handle(self, *args, **options):
+        for model, field_name, table in (
+            (PhoneImage, 'image', response_cache.PHONE_IMAGE),
+            (Brand, 'picture', response_cache.BRAND),
+        ):
+            rows = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            processed = 0
+            for pk, name, thumbnails in rows.values_list('pk', field_name, 'thumbnails').iterator():
+                if options['force'] or (thumbnails or {}).get('source') != name:
+                    images.process_image(model, pk, field_name, name, table)
+                    processed += 1
+            self.stdout.write(f'Processed {processed} {model._meta.verbose_name_plural}')
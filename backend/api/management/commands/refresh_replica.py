@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from smartstore.routers import refresh_replica, replica_path
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary database into the reporting replica (DATABASE_REPLICA_NAME)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Keep refreshing every INTERVAL seconds instead of refreshing once'
+        )
+
+    def handle(self, *args, **options):
+        if replica_path() is None:
+            raise CommandError('Set DATABASE_REPLICA_NAME to configure a replica')
+
+        interval = options['interval']
+        while True:
+            started = time.monotonic()
+            path = refresh_replica()
+            self.stdout.write(f'Refreshed {path} in {time.monotonic() - started:.2f}s')
+            if interval <= 0:
+                return
+            close_old_connections()
+            time.sleep(interval)
@@ -0,0 +1,23 @@
+from django.conf import settings
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from smartstore.metrics import registry
+from .renderers import FastJSONRenderer, PrometheusRenderer
+
+
+# Metrics View
+class MetricsView(APIView):
+    """Per-route request statistics of this process, as JSON or Prometheus text (`?format=prometheus`)"""
+    permission_classes = [IsAdminUser]
+    renderer_classes = [FastJSONRenderer, PrometheusRenderer]
+
+    def get(self, request):
+        if request.accepted_renderer.format == 'prometheus':
+            return Response(registry.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+        return Response({
+            'since': registry.started,
+            'slow_request_threshold_ms': getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 500),
+            'routes': registry.snapshot(),
+        })
@@ -0,0 +1,69 @@
+from django.db import migrations
+
+# Row ids encode the object kind: object_id * 4 + (0 phone, 1 accessory, 2 brand, 3 supplier)
+CREATE_INDEX_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS api_search_index USING fts5(
+    name, code, brand, model, color, storage,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+POPULATE_INDEX_SQL = [
+    """
+    INSERT INTO api_search_index (rowid, name, code, brand, model, color, storage)
+    SELECT p.id * 4 + 0, p.name, COALESCE(p.code, ''), b.name, COALESCE(m.name, ''),
+           COALESCE(ph.color, ''), COALESCE(ph.storage_gb || 'GB', '')
+    FROM api_phone ph
+    JOIN api_product p ON p.id = ph.product_ptr_id
+    JOIN api_brand b ON b.id = p.brand_id
+    LEFT JOIN api_model m ON m.id = ph.model_id
+    """,
+    """
+    INSERT INTO api_search_index (rowid, name, code, brand, model, color, storage)
+    SELECT p.id * 4 + 1, p.name, COALESCE(p.code, ''), b.name, '', COALESCE(a.color, ''), ''
+    FROM api_accessory a
+    JOIN api_product p ON p.id = a.product_ptr_id
+    JOIN api_brand b ON b.id = p.brand_id
+    """,
+    """
+    INSERT INTO api_search_index (rowid, name, code, brand, model, color, storage)
+    SELECT id * 4 + 2, name, '', '', '', '', '' FROM api_brand
+    """,
+    """
+    INSERT INTO api_search_index (rowid, name, code, brand, model, color, storage)
+    SELECT id * 4 + 3, name, '', '', '', '', '' FROM api_supplier
+    """,
+]
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    # FTS5 is SQLite specific; other backends use the icontains fallback in api.search
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if not cursor.fetchone()[0]:
+            return
+        cursor.execute(CREATE_INDEX_SQL)
+        for statement in POPULATE_INDEX_SQL:
+            cursor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS api_search_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_rename_body_water_resistant_model_bodyother_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:35
+
+from django.db import migrations, models
+
+
+def create_sequence(apps, schema_editor):
+    ProductCodeSequence = apps.get_model('api', 'ProductCodeSequence')
+    ProductCodeSequence.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCodeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('next_value', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_sequence, migrations.RunPython.noop),
+    ]
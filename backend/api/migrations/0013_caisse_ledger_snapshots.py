@@ -0,0 +1,56 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:40
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max
+from django.utils import timezone
+
+
+def create_opening_snapshots(apps, schema_editor):
+    """
+    Carry each stored balance over as an opening snapshot covering every
+    existing operation, so legacy ledgers (which could hold a DEPOSIT and a
+    SALE row for the same sale) are not summed again.
+    """
+    Caisse = apps.get_model('api', 'Caisse')
+    CaisseBalanceSnapshot = apps.get_model('api', 'CaisseBalanceSnapshot')
+    snapshot_date = timezone.localdate() - datetime.timedelta(days=1)
+
+    for caisse in Caisse.objects.annotate(last_operation_id=Max('operations__id')):
+        CaisseBalanceSnapshot.objects.create(
+            caisse=caisse,
+            snapshot_date=snapshot_date,
+            balance=caisse.current_balance,
+            last_operation_id=caisse.last_operation_id or 0,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_product_code_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CaisseBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('snapshot_date', models.DateField()),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('last_operation_id', models.PositiveBigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('caisse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='api.caisse')),
+            ],
+            options={
+                'unique_together': {('caisse', 'snapshot_date')},
+            },
+        ),
+        migrations.RunPython(create_opening_snapshots, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='caisse',
+            name='current_balance',
+        ),
+    ]
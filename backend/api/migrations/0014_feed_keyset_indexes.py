@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_caisse_ledger_snapshots'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='caisseoperation',
+            index=models.Index(fields=['timestamp', 'id'], name='caisseop_timestamp_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='caisseoperation',
+            index=models.Index(fields=['caisse', 'timestamp', 'id'], name='caisseop_caisse_ts_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['invoice_date', 'id'], name='invoice_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['date', 'id'], name='purchase_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['sale_date', 'id'], name='sale_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_feed_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='caisseoperation',
+            index=models.Index(fields=['operation_type', 'timestamp'], name='caisseop_type_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='phone',
+            index=models.Index(fields=['condition', 'version', 'phone_type'], name='phone_cond_version_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='phoneimage',
+            index=models.Index(fields=['phone', 'is_primary'], name='phoneimage_phone_primary_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['supplier', 'date'], name='purchase_supplier_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['payment_status', 'date'], name='purchase_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['sale_type', 'sale_date'], name='sale_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['quantity'], name='stock_quantity_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 05:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_reference_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchase',
+            name='received_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
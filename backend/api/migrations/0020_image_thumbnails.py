@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 05:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_purchase_payments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='brand',
+            name='thumbnails',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='phoneimage',
+            name='thumbnails',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,297 @@
+import functools
+import hashlib
+import re
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.relations import PrimaryKeyRelatedField
+
+from smartstore.routers import read_from_replica
+
+from .response_cache import get_cached_response, response_cache_key, store_response
+
+
+class QueryPlanMixin:
+    """
+    Declares the relations a viewset's serializer touches so list and detail
+    responses are served in a constant number of queries.
+
+    Viewsets list the forward foreign keys / one-to-ones to JOIN in
+    `select_related_fields` and the reverse or many-to-many relations to batch
+    in `prefetch_related_fields`. The plan is applied in `filter_queryset`, which
+    DRF calls for list, retrieve and detail actions after `get_queryset`, so the
+    filtering logic in each viewset's `get_queryset` stays untouched.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    def plan_queryset(self, queryset):
+        """Apply the declared select_related/prefetch_related plan to a queryset"""
+        if self.select_related_fields:
+            queryset = queryset.select_related(*self.select_related_fields)
+        if self.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*self.prefetch_related_fields)
+        return queryset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return self.plan_queryset(queryset)
+
+
+class ReplicaReadMixin:
+    """
+    Serves the listed read actions from the reporting replica when one is
+    configured. Writes and any action not listed always use the primary.
+
+    Only the action handler is routed: authentication, throttling and
+    permission checks run in `initial()` against the primary, so token and
+    session lookups never see a lagging copy.
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.replica_actions:
+            # dispatch() looks the handler up after initial(), so swap in a routed one
+            method = request.method.lower()
+            handler = getattr(self, method)
+
+            @functools.wraps(handler)
+            def read(*args, **kwargs):
+                with read_from_replica():
+                    return handler(*args, **kwargs)
+
+            setattr(self, method, read)
+
+
+class ConditionalGetMixin:
+    """
+    Answers conditional GETs on read actions with `304 Not Modified` before
+    anything is serialized.
+
+    The ETag is derived from a cheap version of the data the response is built
+    from: for each `(model, field)` in `version_sources`, the latest value of
+    `field`, the row count of the table (so deletions change it too) and the
+    highest primary key (ids are never reused, so an insert changes it even
+    when paired with a deletion and carrying an older `field`). It also covers
+    the request path, query string and rendered format.
+    Models listed in `append_only_sources` are only ever inserted into, so
+    their count is skipped: only the two maxima are read, which are index
+    seeks, instead of a COUNT(*) that scans an ever-growing table.
+    Last-Modified is sent alongside but not used to validate. Responses
+    are marked `private, no-cache`, so browsers keep them but revalidate on
+    every use, which needs no client-side changes.
+    """
+    conditional_actions = ('list', 'retrieve')
+    version_sources = ()
+    append_only_sources = ()
+
+    def get_data_version(self):
+        """(version string, latest timestamp or None) of the declared sources"""
+        parts = []
+        latest = None
+        for model, field in self.version_sources:
+            aggregates = {'latest': Max(field), 'last_pk': Max('pk')}
+            if model not in self.append_only_sources:
+                aggregates['count'] = Count('pk')
+            values = model._default_manager.aggregate(**aggregates)
+            value = values['latest']
+            if hasattr(value, 'timestamp'):
+                latest = value if latest is None else max(latest, value)
+                value = value.isoformat()
+            parts.append(f"{model._meta.label}:{value}:{values.get('count')}:{values['last_pk']}")
+        return '|'.join(parts), latest
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        """Run `handler` unless the client's cached copy is still current"""
+        version, latest = self.get_data_version()
+        digest = hashlib.md5(
+            f'{version}|{request.get_full_path()}|{request.accepted_renderer.format}'.encode(),
+            usedforsecurity=False,
+        ).hexdigest()
+        etag = f'W/"{digest}"'
+        last_modified = int(latest.timestamp()) if latest is not None else None
+
+        # Only the ETag validates: deleting a row does not move Last-Modified
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Accept', 'Authorization', 'Cookie'))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if 'list' not in self.conditional_actions:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if 'retrieve' not in self.conditional_actions:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(request, super().retrieve, *args, **kwargs)
+
+
+class CachedResponseMixin:
+    """
+    Serves read actions from `api.response_cache`: the rendered JSON is stored
+    per path, query string and user, against the generations of the tables
+    listed in `cache_tables`, and replayed without querying or serializing
+    until a write to one of those tables commits. Other formats (e.g. the
+    browsable API) are never cached.
+
+    Listed before ConditionalGetMixin, it also stores the ETag and answers a
+    matching If-None-Match from the cache, so a hit runs no query at all.
+    """
+    cache_actions = ('list', 'retrieve')
+    cache_tables = ()
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        """Replay the cached response for this request, or run `handler` and cache what it renders"""
+        if request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+
+        key = response_cache_key(request, self.cache_tables)
+        cached = get_cached_response(key)
+        if cached is not None:
+            content, headers = cached
+            response = HttpResponse(content, headers=headers)
+            if 'ETag' in headers:
+                response = get_conditional_response(request, etag=headers['ETag'], response=response)
+            return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            response.add_post_render_callback(lambda rendered: store_response(key, rendered))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if 'list' not in self.cache_actions:
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if 'retrieve' not in self.cache_actions:
+            return super().retrieve(request, *args, **kwargs)
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
+
+
+class SparseFieldsetMixin(QueryPlanMixin):
+    """
+    Lets read actions return a subset of the serializer fields with
+    `?fields=id,name,code` (keep only these) and/or `?omit=images` (drop these).
+
+    Besides pruning the serializer, the query plan shrinks to match: relations
+    that no remaining field reads are neither joined nor prefetched, and the
+    SELECT list is limited with `only()` to the columns the fields read. A
+    field's columns are derived from its `source`; fields computed in Python
+    (SerializerMethodField, ...) declare theirs as ORM paths in
+    `sparse_field_dependencies`. When a remaining field's columns are unknown
+    the full query plan is used.
+    """
+    sparse_actions = ('list', 'retrieve')
+    sparse_field_dependencies = {}
+
+    def get_sparse_fields(self):
+        """Names of the serializer fields to render, or None to render all of them"""
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = None
+            params = self.request.query_params
+            fields = [name for name in params.get('fields', '').split(',') if name]
+            omit = {name for name in params.get('omit', '').split(',') if name}
+            if self.action in self.sparse_actions and (fields or omit):
+                available = self.get_serializer_class()(context=self.get_serializer_context()).fields
+                keep = set(fields).intersection(available) if fields else set(available)
+                self._sparse_fields = {name: available[name] for name in available if name in keep - omit}
+        return self._sparse_fields
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        sparse_fields = self.get_sparse_fields()
+        if sparse_fields is not None:
+            target = getattr(serializer, 'child', serializer)
+            for name in list(target.fields):
+                if name not in sparse_fields:
+                    target.fields.pop(name)
+        return serializer
+
+    def field_dependencies(self, name, field):
+        """ORM paths a serializer field reads, or None if they are unknown"""
+        if name in self.sparse_field_dependencies:
+            return self.sparse_field_dependencies[name]
+        if field.source == '*':
+            return None
+        attrs = field.source.split('.')
+        display = re.fullmatch(r'get_(\w+)_display', attrs[-1])
+        if display:
+            attrs[-1] = display.group(1)
+        elif isinstance(field, PrimaryKeyRelatedField):
+            # Rendered from the foreign key column alone
+            attrs[-1] += '_id'
+        return ('__'.join(attrs),)
+
+    def resolve_path(self, model, path):
+        """Split an ORM path into the relation it traverses and the column it loads"""
+        relations = []
+        many = False
+        for part in path.split('__'):
+            try:
+                field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                return None
+            if not field.is_relation or part != field.name:
+                break  # A plain column, or a foreign key referenced by its attname
+            relations.append(part)
+            many = many or field.many_to_many or field.one_to_many
+            model = field.related_model
+        # only() cannot reach across to-many relations; their prefetch loads them
+        return '__'.join(relations) or None, None if many else path
+
+    def plan_queryset(self, queryset):
+        sparse_fields = self.get_sparse_fields()
+        if sparse_fields is None:
+            return super().plan_queryset(queryset)
+
+        relations = set()
+        loads = []
+        for name, field in sparse_fields.items():
+            paths = self.field_dependencies(name, field)
+            resolved = [self.resolve_path(queryset.model, path) for path in paths] if paths is not None else [None]
+            if None in resolved:
+                return super().plan_queryset(queryset)
+            for relation, column in resolved:
+                if relation:
+                    relations.add(relation)
+                if column:
+                    loads.append((relation, column))
+
+        def needed(lookup):
+            return any(
+                lookup == relation or lookup.startswith(relation + '__') or relation.startswith(lookup + '__')
+                for relation in relations
+            )
+
+        select_related = [lookup for lookup in self.select_related_fields if needed(lookup)]
+        prefetch_related = [lookup for lookup in self.prefetch_related_fields if needed(lookup)]
+
+        columns = {queryset.model._meta.pk.name}
+        for relation, column in loads:
+            if relation and relation not in select_related:
+                # Not joined: keep the local foreign key so the relation still loads lazily
+                local = queryset.model._meta.get_field(column.split('__')[0])
+                if not local.concrete:
+                    continue
+                column = local.name
+            columns.add(column)
+
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset.only(*columns)
@@ -1,28 +1,33 @@
 from enum import unique
-import random
 import string
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Q, Case, When, Value, Sum, Max, OuterRef, Subquery, DecimalField
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.utils import timezone
-from decimal import Decimal
+from datetime import datetime, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from .response_cache import invalidate_responses, STOCK
 
 # --- Code Generation Function ---
 def generate_unique_product_code():
     """
     Generates a unique 4-character code for a product.
     Codes are generated in uppercase and exclude visually similar characters.
+    Allocation is handled by the sequence-backed allocator in api.codes.
     """
-    # Define characters to use, excluding visually similar ones (0, O, 1, l, I)
-    # Using uppercase only here since we will store codes in uppercase
-    allowed_chars = '23456789ABCDEFGHJKLMNPQRSTUVWXYZ'
-    code_length = 4
-
-    while True:
-        code = ''.join(random.choice(allowed_chars) for _ in range(code_length))
-        # Check if a product with this code already exists (comparison is case-sensitive in DB,
-        # but since we only store uppercase, this effectively checks for uniqueness)
-        if not Product.objects.filter(code=code).exists():
-            return code
+    from .codes import allocate_product_code
+    return allocate_product_code()
+
+# --- Product Code Sequence Model ---
+class ProductCodeSequence(models.Model):
+    """Single-row counter that product codes are derived from (see api.codes)"""
+    next_value = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Product code sequence at {self.next_value}"
 
 # --- Brand Model ---
 class Brand(models.Model):
@@ -31,6 +36,8 @@ class Brand(models.Model):
     picture = models.ImageField(upload_to='brand_pictures/', blank=True, null=True) # Field for brand logo/picture
     description = models.TextField(blank=True, null=True) # Added description for brand
     website = models.URLField(max_length=200, blank=True, null=True) # Added website field
+    thumbnails = models.JSONField(default=dict, blank=True) # Written by api.images once the picture is processed
+    updated_at = models.DateTimeField(auto_now=True) # Versions the brand list for conditional GETs
 
     def __str__(self):
         return self.name
@@ -93,6 +100,8 @@ class Model(models.Model):
     # Misc
     misc_colors = models.CharField(max_length=200, blank=True, null=True)
 
+    updated_at = models.DateTimeField(auto_now=True) # Versions the model list for conditional GETs
+
     class Meta:
         unique_together = ('brand', 'name') # A brand can't have two models with the same name
 
@@ -135,9 +144,32 @@ class Product(models.Model):
 
         super().save(*args, **kwargs)
 
+    class Meta:
+        # Catalog delta sync looks up products changed since a point in time
+        indexes = [models.Index(fields=['updated_at'], name='product_updated_at_idx')]
+
     def __str__(self):
         return f"{self.name} ({self.code})" # Include code in string representation
 
+# --- DeletedProduct Model ---
+class DeletedProduct(models.Model):
+    """Tombstone telling catalog delta sync clients that a product was deleted"""
+    product_id = models.PositiveBigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Product #{self.product_id} deleted on {self.deleted_at.strftime('%Y-%m-%d %H:%M')}"
+
+    @staticmethod
+    def sync_horizon():
+        """Oldest moment a catalog sync token may point to; tombstones before it are not kept"""
+        return timezone.now() - timedelta(days=settings.CATALOG_SYNC_MAX_AGE_DAYS)
+
+    @classmethod
+    def prune(cls):
+        """Delete the tombstones no valid sync token can still ask for"""
+        return cls.objects.filter(deleted_at__lt=cls.sync_horizon()).delete()[0]
+
 # --- Phone (Child Class) ---
 class PhoneImage(models.Model):
     """Model for storing multiple images for a phone"""
@@ -147,10 +179,12 @@ class PhoneImage(models.Model):
     color_variant = models.CharField(max_length=50, blank=True, null=True)
     sort_order = models.PositiveIntegerField(default=0)
     source_url = models.URLField(max_length=255, blank=True, null=True)
+    thumbnails = models.JSONField(default=dict, blank=True)  # Written by api.images once the image is processed
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['sort_order', 'created_at']
+        indexes = [models.Index(fields=['phone', 'is_primary'], name='phoneimage_phone_primary_idx')]
     
     def __str__(self):
         return f"Image for {self.phone.name} ({self.id})"
@@ -244,7 +278,6 @@ class Phone(Product):
     )
     phone_type = models.CharField(max_length=50, choices=PHONE_TYPE_CHOICES, default='ordinary')
 
-
     # Additional display specifications
     resolution = models.CharField(max_length=100, blank=True, null=True)  # e.g. "1080 x 2400 pixels"
     pixel_density = models.PositiveIntegerField(blank=True, null=True)  # PPI
@@ -280,6 +313,10 @@ class Phone(Product):
     
     # Add other phone-specific specs as needed
 
+    class Meta:
+        # PhoneViewSet filters on condition, optionally narrowed by version and phone_type
+        indexes = [models.Index(fields=['condition', 'version', 'phone_type'], name='phone_cond_version_type_idx')]
+
     def save(self, *args, **kwargs):
         self.product_type = 'phone' # Set the type automatically
         # Code generation and case conversion is handled in the base Product's save method
@@ -356,85 +393,227 @@ class Stock(models.Model):
     quantity = models.PositiveIntegerField(default=0)
     last_updated = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Low-stock and out-of-stock listings
+        indexes = [
+            models.Index(fields=['quantity'], name='stock_quantity_idx'),
+            models.Index(fields=['last_updated'], name='stock_last_updated_idx'),  # Catalog delta sync
+        ]
+
     def __str__(self):
         return f"{self.product.name} ({self.product.code}): {self.quantity} in stock" # Include code
 
+    @classmethod
+    def decrement_many(cls, quantities):
+        """
+        Remove stock for several products in one UPDATE, given a mapping of
+        product_id -> quantity. Returns False if any product lacks stock; the
+        caller must then roll back, as the other rows have been decremented.
+        """
+        if not quantities:
+            return True
+
+        enough_stock = Q()
+        for product_id, quantity in quantities.items():
+            enough_stock |= Q(product_id=product_id, quantity__gte=quantity)
+
+        updated = cls.objects.filter(enough_stock).update(
+            quantity=F('quantity') - Case(
+                *[When(product_id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+                output_field=models.PositiveIntegerField()
+            ),
+            last_updated=timezone.now()
+        )
+        # update() sends no post_save, so cached stock levels are invalidated here
+        invalidate_responses(STOCK)
+        return updated == len(quantities)
+
+    @classmethod
+    def increment_many(cls, quantities):
+        """
+        Add stock for several products, given a mapping of product_id -> quantity:
+        missing stock rows are created with one bulk INSERT and the others
+        incremented with one UPDATE. Returns the number of rows created.
+        """
+        if not quantities:
+            return 0
+
+        now = timezone.now()
+        existing = set(cls.objects.filter(product_id__in=list(quantities)).values_list('product_id', flat=True))
+        cls.objects.filter(product_id__in=existing).update(
+            quantity=F('quantity') + Case(
+                *[When(product_id=product_id, then=Value(quantities[product_id])) for product_id in existing],
+                output_field=models.PositiveIntegerField()
+            ),
+            last_updated=now
+        )
+        created = cls.objects.bulk_create([
+            cls(product_id=product_id, quantity=quantity, last_updated=now)
+            for product_id, quantity in quantities.items() if product_id not in existing
+        ])
+        # Neither update() nor bulk_create() sends post_save
+        invalidate_responses(STOCK)
+        return len(created)
 
 
 
-# --- CaisseOperation Model ---
-OPERATION_TYPE_CHOICES = (
-    ('DEPOSIT', 'Deposit'),
-    ('WITHDRAWAL', 'Withdrawal'),
-    ('SALE', 'Sale'),
-    ('PURCHASE_PAYMENT', 'Purchase Payment'),
-    ('ADJUSTMENT', 'Balance Adjustment'),
-)
-
-class CaisseOperation(models.Model):
-    caisse = models.ForeignKey("api.Caisse", on_delete=models.CASCADE, related_name='operations')
-    operation_type = models.CharField(max_length=20, choices=OPERATION_TYPE_CHOICES)
-    amount = models.DecimalField(max_digits=12, decimal_places=2)  # Can be positive (deposit) or negative (withdrawal)
-    balance_after = models.DecimalField(max_digits=12, decimal_places=2)  # Balance after this operation
-    description = models.TextField(blank=True, null=True)
-    reference_id = models.CharField(max_length=100, blank=True, null=True)  # For linking to sales/purchases
-    performed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
-    
-    def __str__(self):
-        return f"{self.operation_type} of {abs(self.amount)} on {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
 
 # --- Caisse (Cash Register) Model ---
 class Caisse(models.Model):
     name = models.CharField(max_length=100, default="Main Cash Register")
-    current_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     last_updated = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f"{self.name} - Balance: {self.current_balance}"
+        return self.name
+    
+    @property
+    def current_balance(self):
+        """Balance derived from the latest snapshot plus the operations recorded since"""
+        if 'annotated_balance' in self.__dict__:
+            return self.annotated_balance
+        return self.balance_at()
+    
+    @classmethod
+    def annotate_balances(cls, queryset):
+        """
+        Compute `current_balance` for every caisse of `queryset` in the same
+        query, so listing caisses does not cost two queries per row.
+        """
+        money = DecimalField(max_digits=12, decimal_places=2)
+        latest = CaisseBalanceSnapshot.objects.filter(caisse=OuterRef('pk')).order_by('-snapshot_date')
+        latest_from_operations = CaisseBalanceSnapshot.objects.filter(
+            caisse=OuterRef(OuterRef('pk'))
+        ).order_by('-snapshot_date')
+        since_snapshot = CaisseOperation.objects.filter(
+            caisse=OuterRef('pk'),
+            id__gt=Coalesce(Subquery(latest_from_operations.values('last_operation_id')[:1]), 0),
+        ).values('caisse').annotate(total=Sum('amount')).values('total')
+        return queryset.annotate(annotated_balance=(
+            Coalesce(Subquery(latest.values('balance')[:1]), Value(Decimal('0.00')), output_field=money)
+            + Coalesce(Subquery(since_snapshot), Value(Decimal('0.00')), output_field=money)
+        ))
+    
+    def balance_at(self, when=None):
+        """
+        Balance of the cash register at `when` (now if omitted): the latest daily
+        snapshot taken before that day plus the operations recorded after it.
+        """
+        snapshots = self.snapshots.all()
+        operations = self.operations.all()
+        if when is not None:
+            snapshots = snapshots.filter(snapshot_date__lt=timezone.localdate(when))
+            operations = operations.filter(timestamp__lte=when)
+        
+        snapshot = snapshots.order_by('-snapshot_date').first()
+        balance = Decimal('0.00')
+        if snapshot:
+            balance = snapshot.balance
+            operations = operations.filter(id__gt=snapshot.last_operation_id)
+        
+        total = operations.aggregate(total=Sum('amount'))['total']
+        return balance + (total or Decimal('0.00'))
+    
+    def lock(self):
+        """
+        Serialize postings to this caisse until the current transaction ends.
+        PostgreSQL locks the caisse row; SQLite already holds the database write
+        lock for the whole (IMMEDIATE) transaction.
+        """
+        Caisse.objects.select_for_update().filter(pk=self.pk).values_list('pk', flat=True).first()
+    
+    def roll_snapshot(self):
+        """
+        Record yesterday's closing balance if no snapshot covers it yet. Call
+        with the caisse locked (see `lock`), as record_operation does: every
+        posting holds that lock from before its insert until it commits, so no
+        operation with an id below the snapshot's last_operation_id can still
+        be uncommitted, and none is left out of both the snapshot and the
+        operations summed after it.
+        """
+        target_date = timezone.localdate() - timedelta(days=1)
+        latest = self.snapshots.order_by('-snapshot_date').first()
+        if latest and latest.snapshot_date >= target_date:
+            return latest
+        
+        # Everything recorded before today belongs to yesterday's closing balance
+        start_of_today = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+        operations = self.operations.filter(timestamp__lt=start_of_today)
+        balance = Decimal('0.00')
+        last_operation_id = 0
+        if latest:
+            operations = operations.filter(id__gt=latest.last_operation_id)
+            balance = latest.balance
+            last_operation_id = latest.last_operation_id
+        
+        totals = operations.aggregate(total=Sum('amount'), last_id=Max('id'))
+        snapshot, _ = CaisseBalanceSnapshot.objects.get_or_create(
+            caisse=self,
+            snapshot_date=target_date,
+            defaults={
+                'balance': balance + (totals['total'] or Decimal('0.00')),
+                'last_operation_id': totals['last_id'] or last_operation_id,
+            }
+        )
+        return snapshot
+    
+    def record_operation(self, operation_type, amount, description=None, user=None, reference_id=None):
+        """
+        Append an operation to the ledger. `amount` is signed (negative for money
+        leaving the register). Raises ValueError, recording nothing, if a negative
+        amount would make the balance negative.
+        """
+        # A balance computed by annotate_balances() no longer holds
+        self.__dict__.pop('annotated_balance', None)
+        outflow = amount < 0
+        with transaction.atomic():
+            # Every posting, inflows included, is serialized per caisse: ids are
+            # then committed in order, so balance_after sums every earlier
+            # operation and concurrent withdrawals cannot both pass the check
+            self.lock()
+            self.roll_snapshot()
+            
+            # balance_after is filled in below, once the balance including this operation is summed
+            operation = CaisseOperation.objects.create(
+                caisse=self,
+                operation_type=operation_type,
+                amount=amount,
+                balance_after=0,
+                description=description,
+                reference_id=reference_id,
+                performed_by=user
+            )
+            snapshot = self.snapshots.order_by('-snapshot_date').first()
+            operations = self.operations.filter(id__lte=operation.id)
+            balance = Decimal('0.00')
+            if snapshot:
+                balance = snapshot.balance
+                operations = operations.filter(id__gt=snapshot.last_operation_id)
+            balance += operations.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+            
+            if outflow and balance < 0:
+                raise ValueError("Insufficient funds in cash register")
+            
+            CaisseOperation.objects.filter(pk=operation.pk).update(balance_after=balance)
+            operation.balance_after = balance
+        
+        return operation
     
     def add_funds(self, amount, description="Manual deposit", user=None):
         """Add funds to the cash register"""
         if amount <= 0:
             raise ValueError("Amount must be positive")
-            
-        self.current_balance += Decimal(amount)
-        self.save()
-        
-        # Record the operation
-        CaisseOperation.objects.create(
-            caisse=self,
-            operation_type='DEPOSIT',
-            amount=amount,
-            balance_after=self.current_balance,
-            description=description,
-            performed_by=user
-        )
         
+        self.record_operation('DEPOSIT', Decimal(amount), description, user)
         return True
     
     def withdraw_funds(self, amount, description="Manual withdrawal", user=None):
         """Withdraw funds from the cash register"""
         if amount <= 0:
             raise ValueError("Amount must be positive")
-            
-        if amount > self.current_balance:
-            raise ValueError("Insufficient funds in cash register")
-            
-        self.current_balance -= Decimal(amount)
-        self.save()
-        
-        # Record the operation
-        CaisseOperation.objects.create(
-            caisse=self,
-            operation_type='WITHDRAWAL',
-            amount=-amount,  # Negative amount for withdrawals
-            balance_after=self.current_balance,
-            description=description,
-            performed_by=user
-        )
         
+        # Negative amount for withdrawals
+        self.record_operation('WITHDRAWAL', -Decimal(amount), description, user)
         return True
     
     def get_operations(self, start_date=None, end_date=None):
@@ -458,6 +637,7 @@ OPERATION_TYPE_CHOICES = (
 )
 
 class CaisseOperation(models.Model):
+    """Append-only ledger entry; the caisse balance is derived from these rows"""
     caisse = models.ForeignKey(Caisse, on_delete=models.CASCADE, related_name='operations')
     operation_type = models.CharField(max_length=20, choices=OPERATION_TYPE_CHOICES)
     amount = models.DecimalField(max_digits=12, decimal_places=2)  # Can be positive (deposit) or negative (withdrawal)
@@ -467,15 +647,31 @@ class CaisseOperation(models.Model):
     performed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        # Keyset pagination walks (timestamp, id) newest first, optionally within one caisse
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='caisseop_timestamp_id_idx'),
+            models.Index(fields=['caisse', 'timestamp', 'id'], name='caisseop_caisse_ts_id_idx'),
+            models.Index(fields=['operation_type', 'timestamp'], name='caisseop_type_ts_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.operation_type} of {abs(self.amount)} on {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
-    from_caisse = models.BooleanField(default=True)  # Whether payment was made from cash register
-    caisse = models.ForeignKey(Caisse, on_delete=models.SET_NULL, null=True, blank=True, related_name='purchase_payments')
-    paid_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
-    notes = models.TextField(blank=True, null=True)
+
+# --- CaisseBalanceSnapshot Model ---
+class CaisseBalanceSnapshot(models.Model):
+    """Closing balance of a caisse for a day, covering operations up to last_operation_id"""
+    caisse = models.ForeignKey(Caisse, on_delete=models.CASCADE, related_name='snapshots')
+    snapshot_date = models.DateField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    last_operation_id = models.PositiveBigIntegerField(default=0)  # Operations with a greater id come after this snapshot
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('caisse', 'snapshot_date')
     
     def __str__(self):
-        return f"Payment of {self.amount} for Purchase #{self.purchase.id} on {self.payment_date.strftime('%Y-%m-%d')}"
+        return f"{self.caisse.name} on {self.snapshot_date}: {self.balance}"
 
 # --- Sale Model ---
 SALE_TYPES = (
@@ -502,41 +698,13 @@ class Sale(models.Model):
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES_SALE, default='CASH')
     add_to_caisse = models.BooleanField(default=True)  # Whether to add the sale amount to cash register
     caisse = models.ForeignKey(Caisse, on_delete=models.SET_NULL, null=True, blank=True, related_name='sales')
-
-    def save(self, *args, **kwargs):
-        # Check if this is a new sale (no ID yet)
-        is_new = self.pk is None
-        
-        # Save the sale first
-        super().save(*args, **kwargs)
-        
-        # If new sale and add_to_caisse is True, add to cash register
-        if is_new and self.add_to_caisse and self.payment_method == 'CASH':
-            try:
-                # Get the default caisse or create one if it doesn't exist
-                caisse = self.caisse or Caisse.objects.first()
-                if not caisse:
-                    caisse = Caisse.objects.create(name="Main Cash Register")
-                    self.caisse = caisse
-                    self.save(update_fields=['caisse'])
-                
-                # Add sale amount to caisse
-                description = f"Sale #{self.id} - {self.customer_name or 'Unknown customer'}"
-                caisse.add_funds(self.total_amount, description, self.sold_by)
-                
-                # Record the operation with reference to this sale
-                CaisseOperation.objects.create(
-                    caisse=caisse,
-                    operation_type='SALE',
-                    amount=self.total_amount,
-                    balance_after=caisse.current_balance,
-                    description=description,
-                    reference_id=str(self.id),
-                    performed_by=self.sold_by
-                )
-            except Exception as e:
-                # Log the error but don't prevent sale from being created
-                print(f"Error adding sale to cash register: {e}")
+    # Cash sales are posted to the caisse by api.services.post_sale_to_caisse once the total is final
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['sale_date', 'id'], name='sale_date_id_idx'),
+            models.Index(fields=['sale_type', 'sale_date'], name='sale_type_date_idx'),
+        ]
     
     def __str__(self):
         return f"Sale #{self.id} on {self.sale_date.strftime('%Y-%m-%d')}"
@@ -561,6 +729,9 @@ class Invoice(models.Model):
     customer_info = models.TextField(blank=True, null=True) # Can still use this for more detailed info
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [models.Index(fields=['invoice_date', 'id'], name='invoice_date_id_idx')]
+
     def __str__(self):
         return f"Invoice #{self.invoice_number} for Sale #{self.sale.id}"
 
@@ -576,85 +747,10 @@ class Supplier(models.Model):
     NIS = models.CharField(max_length=50, blank=True, null=True)
     soumis_tva = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return f"{self.name} - Balance: {self.current_balance}"
-    
-    def add_funds(self, amount, description="Manual deposit", user=None):
-        """Add funds to the cash register"""
-        if amount <= 0:
-            raise ValueError("Amount must be positive")
-            
-        self.current_balance += amount
-        self.save()
-        
-        # Record the operation
-        CaisseOperation.objects.create(
-            caisse=self,
-            operation_type='DEPOSIT',
-            amount=amount,
-            balance_after=self.current_balance,
-            description=description,
-            performed_by=user
-        )
-        
-        return True
-    
-    def withdraw_funds(self, amount, description="Manual withdrawal", user=None):
-        """Withdraw funds from the cash register"""
-        if amount <= 0:
-            raise ValueError("Amount must be positive")
-            
-        if amount > self.current_balance:
-            raise ValueError("Insufficient funds in cash register")
-            
-        self.current_balance -= amount
-        self.save()
-        
-        # Record the operation
-        CaisseOperation.objects.create(
-            caisse=self,
-            operation_type='WITHDRAWAL',
-            amount=-amount,  # Negative amount for withdrawals
-            balance_after=self.current_balance,
-            description=description,
-            performed_by=user
-        )
-        
-        return True
-    
-    def get_operations(self, start_date=None, end_date=None):
-        """Get operations for this cash register with optional date filtering"""
-        operations = CaisseOperation.objects.filter(caisse=self)
-        
-        if start_date:
-            operations = operations.filter(timestamp__gte=start_date)
-        if end_date:
-            operations = operations.filter(timestamp__lte=end_date)
-            
-        return operations.order_by('-timestamp')
-
-# --- CaisseOperation Model ---
-OPERATION_TYPE_CHOICES = (
-    ('DEPOSIT', 'Deposit'),
-    ('WITHDRAWAL', 'Withdrawal'),
-    ('SALE', 'Sale'),
-    ('PURCHASE_PAYMENT', 'Purchase Payment'),
-    ('ADJUSTMENT', 'Balance Adjustment'),
-)
-
-class CaisseOperation(models.Model):
-    caisse = models.ForeignKey(Caisse, on_delete=models.CASCADE, related_name='operations')
-    operation_type = models.CharField(max_length=20, choices=OPERATION_TYPE_CHOICES)
-    amount = models.DecimalField(max_digits=12, decimal_places=2)  # Can be positive (deposit) or negative (withdrawal)
-    balance_after = models.DecimalField(max_digits=12, decimal_places=2)  # Balance after this operation
-    description = models.TextField(blank=True, null=True)
-    reference_id = models.CharField(max_length=100, blank=True, null=True)  # For linking to sales/purchases
-    performed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
-    
-    def __str__(self):
-        return f"{self.operation_type} of {abs(self.amount)} on {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
+        return self.name
 
 # --- Purchase Model ---
 PAYMENT_STATUS_CHOICES = (
@@ -672,6 +768,12 @@ PAYMENT_METHOD_CHOICES = (
     ('OTHER', 'Other'),
 )
 
+# Purchases still owing money to their supplier
+UNPAID_STATUSES = ('PENDING', 'PARTIAL')
+
+TVA_RATE = Decimal('0.19')  # 19% TVA
+CENT = Decimal('0.01')
+
 class Purchase(models.Model):
     supplier = models.ForeignKey(Supplier, on_delete=models.PROTECT, related_name='purchases')
     reference_number = models.CharField(max_length=100, unique=True)
@@ -689,16 +791,30 @@ class Purchase(models.Model):
     # Track amount paid and remaining
     amount_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     amount_remaining = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Set once the goods are added to stock; a purchase is received at most once
+    received_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'id'], name='purchase_date_id_idx'),
+            models.Index(fields=['supplier', 'date'], name='purchase_supplier_date_idx'),
+            models.Index(fields=['payment_status', 'date'], name='purchase_status_date_idx'),
+        ]
     
     def update_totals(self):
         """Update the purchase totals based on its items"""
-        from decimal import Decimal
-        
-        # Calculate totals from items
-        items = self.items.all()
-        total_ht = sum(item.ht for item in items)
-        total_tva = sum(item.tva for item in items) if self.soumis_tva else Decimal('0.00')
-        
+        # Payments update amount_paid in the database; never save a stale value over it
+        self.refresh_from_db(fields=['amount_paid'])
+        # Sum the items in the database rather than loading them
+        totals = self.items.aggregate(ht=Sum('ht'), tva=Sum('tva'))
+        self.apply_totals(totals['ht'] or Decimal('0.00'), totals['tva'] or Decimal('0.00'))
+        self.save()
+    
+    def apply_totals(self, total_ht, total_tva):
+        """
+        Set the header totals, amount remaining and payment status from the
+        summed HT and TVA of the items, without saving.
+        """
         # Apply purchase-level discount if any
         if self.discount > 0:
             if self.discount <= 100:
@@ -729,8 +845,6 @@ class Purchase(models.Model):
             self.payment_status = 'PARTIAL'
         else:
             self.payment_status = 'PAID'
-            
-        self.save()
     
     def __str__(self):
         return f"Purchase #{self.id} - {self.reference_number} from {self.supplier.name}"
@@ -757,29 +871,61 @@ class PurchaseItem(models.Model):
     ttc = models.DecimalField(max_digits=10, decimal_places=2)
     
     def save(self, *args, **kwargs):
+        self.compute_amounts(self.purchase.soumis_tva)
+        super().save(*args, **kwargs)
+    
+    def compute_amounts(self, soumis_tva):
+        """
+        Set HT, TVA and TTC from the quantity, unit price and discount, without
+        saving. Bulk inserts call this directly, as bulk_create skips save().
+        """
+        unit_price = Decimal(self.unit_price)
+        discount = Decimal(self.discount)
+        
         # Calculate HT (Hors Taxe) based on discount
-        base_amount = self.quantity * self.unit_price
+        base_amount = self.quantity * unit_price
         
         # Apply discount based on its value
-        if self.discount > 0:
-            if self.discount <= 100:  # Percentage discount
-                discount_amount = (base_amount * self.discount) / 100
-                self.ht = base_amount - discount_amount
+        if discount > 0:
+            if discount <= 100:  # Percentage discount
+                discount_amount = (base_amount * discount) / 100
+                ht = base_amount - discount_amount
             else:  # Absolute discount
-                self.ht = base_amount - self.discount
+                ht = base_amount - discount
         else:
-            self.ht = base_amount
+            ht = base_amount
+        self.ht = ht.quantize(CENT, rounding=ROUND_HALF_UP)
         
-        # Calculate TVA (Tax) based on purchase.soumis_tva
-        if self.purchase.soumis_tva:
-            self.tva = self.ht * 0.19  # 19% TVA
+        # Calculate TVA (Tax) based on the purchase's soumis_tva
+        if soumis_tva:
+            self.tva = (self.ht * TVA_RATE).quantize(CENT, rounding=ROUND_HALF_UP)
         else:
-            self.tva = 0
+            self.tva = Decimal('0.00')
         
         # Calculate TTC (Total with Tax)
         self.ttc = self.ht + self.tva
-        
-        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.quantity} x {self.product_name} in Purchase #{self.purchase.id}"
+
+# --- PurchasePayment Model ---
+class PurchasePayment(models.Model):
+    """A payment made to the supplier of a purchase; see api.services.record_purchase_payment"""
+    purchase = models.ForeignKey(Purchase, on_delete=models.CASCADE, related_name='payments')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_date = models.DateField(default=timezone.localdate)
+    payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES, default='CASH')
+    # Set when the money was taken from a cash register
+    from_caisse = models.ForeignKey(Caisse, on_delete=models.PROTECT, null=True, blank=True, related_name='purchase_payments')
+    caisse_operation = models.OneToOneField(CaisseOperation, on_delete=models.PROTECT, null=True, blank=True, related_name='purchase_payment')
+    notes = models.TextField(blank=True, null=True)
+    recorded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='purchase_payments')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['purchase', 'payment_date'], name='purchasepayment_purchase_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Payment of {self.amount} for Purchase #{self.purchase_id}"
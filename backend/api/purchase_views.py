@@ -1,14 +1,25 @@
+import base64
+import json
+
 from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_date
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
 
-from .models import Supplier, Purchase, PurchaseItem
+from .models import Supplier, Purchase, UNPAID_STATUSES
 from .serializers import (
-    SupplierSerializer, PurchaseSerializer, PurchaseItemSerializer, 
-    CreatePurchaseSerializer
+    SupplierSerializer, PurchaseSerializer,
+    CreatePurchaseSerializer, PurchasePaymentSerializer, CreatePurchasePaymentSerializer
 )
+from .mixins import ConditionalGetMixin, SparseFieldsetMixin
+from .search import search_queryset
+from .reports import BUCKETS, supplier_balances, supplier_balance, supplier_statement
+from .services import get_default_caisse, record_purchase, receive_purchase, record_purchase_payment
 
 # Custom pagination class
 class StandardResultsSetPagination(PageNumberPagination):
@@ -16,12 +27,126 @@ class StandardResultsSetPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+# Keyset pagination for append-mostly feeds
+class KeysetPagination(BasePagination):
+    """
+    Newest-first pagination on (view.keyset_field, id), or oldest-first when
+    the view sets `keyset_descending = False`. The cursor carries the last
+    row's sort key, so every page is an index range seek: no COUNT(*), no
+    OFFSET, and rows inserted while scrolling do not shift the following pages.
+    """
+    page_size = StandardResultsSetPagination.page_size
+    page_size_query_param = 'page_size'
+    max_page_size = StandardResultsSetPagination.max_page_size
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def encode_cursor(self, row):
+        value = getattr(row, self.field)
+        payload = json.dumps([value.isoformat(), row.pk]).encode()
+        return base64.urlsafe_b64encode(payload).decode()
+
+    def decode_cursor(self, cursor, model):
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            value = model._meta.get_field(self.field).to_python(value)
+            pk = int(pk)
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.field = view.keyset_field
+        page_size = self.get_page_size(request)
+
+        if getattr(view, 'keyset_descending', True):
+            queryset = queryset.order_by(f'-{self.field}', '-pk')
+            after, bound = 'lt', 'lte'
+        else:
+            queryset = queryset.order_by(self.field, 'pk')
+            after, bound = 'gt', 'gte'
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            value, pk = self.decode_cursor(cursor, queryset.model)
+            # The redundant inclusive bound gives SQLite a range to seek on the (field, id) index
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{after}': value}) | Q(**{self.field: value, f'pk__{after}': pk}),
+                **{f'{self.field}__{bound}': value}
+            )
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.next_cursor = self.encode_cursor(rows[-1]) if self.has_next else None
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'cursor': self.next_cursor,
+            'results': data,
+        })
+
+class FeedPagination(StandardResultsSetPagination):
+    """
+    Page-number pagination by default; switches to KeysetPagination when the
+    client sends `?pagination=cursor` or a `cursor` returned by a previous page.
+    """
+    mode_query_param = 'pagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if params.get(self.mode_query_param) == 'cursor' or KeysetPagination.cursor_query_param in params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+def parse_date_params(request, params):
+    """
+    Read optional YYYY-MM-DD query parameters. Returns ({param: date or None}, None),
+    or (None, a 400 response) if one is malformed.
+    """
+    dates = {}
+    for param in params:
+        value = request.query_params.get(param, None)
+        try:
+            dates[param] = parse_date(value) if value else None
+        except ValueError:
+            dates[param] = None
+        if value and dates[param] is None:
+            return None, Response({'error': f'{param} must be a date formatted YYYY-MM-DD'},
+                                  status=status.HTTP_400_BAD_REQUEST)
+    return dates, None
+
 # Supplier ViewSet
-class SupplierViewSet(viewsets.ModelViewSet):
+class SupplierViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Supplier.objects.all().order_by('name')
     serializer_class = SupplierSerializer
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = StandardResultsSetPagination
+    version_sources = ((Supplier, 'updated_at'),)
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -36,14 +161,57 @@ class SupplierViewSet(viewsets.ModelViewSet):
         if code is not None:
             queryset = queryset.filter(code__icontains=code)
         
+        # Full-text prefix search on name, ranked by relevance
+        q = self.request.query_params.get('q', None)
+        if q:
+            queryset = search_queryset(queryset, 'supplier', q, ('name',))
+        
         return queryset
+    
+    @action(detail=False, methods=['get'])
+    def balances(self, request):
+        """Outstanding balance of every supplier, aggregated in SQL"""
+        return Response(supplier_balances())
+    
+    @action(detail=True, methods=['get'])
+    def balance(self, request, pk=None):
+        """Totals, outstanding balance and aging buckets of the unpaid amounts (`as_of`, default today)"""
+        supplier = self.get_object()
+        dates, error = parse_date_params(request, ('as_of',))
+        if error:
+            return error
+        return Response(supplier_balance(supplier, dates['as_of']))
+    
+    @action(detail=True, methods=['get'])
+    def statement(self, request, pk=None):
+        """Purchase totals between `start_date` and `end_date`, overall and per `bucket` (default month)"""
+        supplier = self.get_object()
+        dates, error = parse_date_params(request, ('start_date', 'end_date'))
+        if error:
+            return error
+        
+        bucket = request.query_params.get('bucket', 'month')
+        if bucket not in BUCKETS:
+            return Response({'error': f"bucket must be one of: {', '.join(BUCKETS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(supplier_statement(supplier, dates['start_date'], dates['end_date'], bucket))
 
 # Purchase ViewSet
-class PurchaseViewSet(viewsets.ModelViewSet):
+class PurchaseViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Purchase.objects.all().order_by('-date')
     serializer_class = PurchaseSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = FeedPagination
+    keyset_field = 'date'
+    keyset_descending = True
+    select_related_fields = ('supplier',)
+    prefetch_related_fields = ('items',)
+    # List pages can skip the nested lines with ?omit=items
+    sparse_field_dependencies = {
+        'payment_status_display': ('payment_status',),
+        'payment_method_display': ('payment_method',),
+    }
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -81,39 +249,18 @@ class PurchaseViewSet(viewsets.ModelViewSet):
         
         if serializer.is_valid():
             with transaction.atomic():
-                # Create the purchase
+                # Create the purchase and all of its lines in one pass
                 supplier = Supplier.objects.get(pk=serializer.validated_data['supplier_id'])
-                purchase_data = {
-                    'supplier': supplier,
-                    'reference_number': serializer.validated_data['reference_number'],
-                    'date': serializer.validated_data['date'],
-                    'payment_status': serializer.validated_data['payment_status'],
-                    'payment_method': serializer.validated_data['payment_method'],
-                    'notes': serializer.validated_data.get('notes', ''),
-                    'soumis_tva': serializer.validated_data.get('soumis_tva', True),
-                    'total_amount': 0  # Will be updated after adding items
-                }
-                
-                purchase = Purchase.objects.create(**purchase_data)
-                
-                # Add items to the purchase
-                for item_data in serializer.validated_data['items']:
-                    item = PurchaseItem.objects.create(
-                        purchase=purchase,
-                        product_id=item_data['product_id'],
-                        product_name=item_data['product_name'],
-                        product_code=item_data['product_code'],
-                        quantity=item_data['quantity'],
-                        discount=item_data.get('discount', 0),
-                        unit_price=item_data['unit_price'],
-                        # ht, tva, and ttc will be calculated in the save method
-                        ht=0,
-                        tva=0,
-                        ttc=0
-                    )
-                
-                # Update purchase totals based on items
-                purchase.update_totals()
+                purchase = record_purchase(
+                    supplier,
+                    serializer.validated_data['items'],
+                    reference_number=serializer.validated_data['reference_number'],
+                    date=serializer.validated_data['date'],
+                    payment_status=serializer.validated_data['payment_status'],
+                    payment_method=serializer.validated_data['payment_method'],
+                    notes=serializer.validated_data.get('notes', ''),
+                    soumis_tva=serializer.validated_data.get('soumis_tva', True),
+                )
                 
                 return Response(
                     PurchaseSerializer(purchase).data,
@@ -121,3 +268,81 @@ class PurchaseViewSet(viewsets.ModelViewSet):
                 )
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=True, methods=['post'])
+    def receive(self, request, pk=None):
+        """Add the purchase's quantities to stock; receiving it again changes nothing"""
+        purchase = self.get_object()
+        if purchase.payment_status == 'CANCELLED':
+            return Response({'error': 'A cancelled purchase cannot be received'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            with transaction.atomic():
+                receipt = receive_purchase(purchase)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if receipt is None:
+            received_at = Purchase.objects.values_list('received_at', flat=True).get(pk=purchase.pk)
+            return Response({
+                'success': 'Purchase was already received',
+                'already_received': True,
+                'received_at': received_at,
+            }, status=status.HTTP_200_OK)
+        
+        return Response({
+            'success': f"Received {receipt['units']} units of {receipt['products']} products",
+            'already_received': False,
+            **receipt,
+        }, status=status.HTTP_200_OK)
+    
+    @action(detail=True, methods=['post'])
+    def pay(self, request, pk=None):
+        """Record a payment, optionally taken from a cash register"""
+        purchase = self.get_object()
+        serializer = CreatePurchasePaymentSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer.validated_data
+        caisse = data.get('caisse_id')
+        if caisse is None and data['from_caisse']:
+            caisse = get_default_caisse()
+        
+        try:
+            with transaction.atomic():
+                payment = record_purchase_payment(
+                    purchase,
+                    data['amount'],
+                    payment_method=data['payment_method'],
+                    payment_date=data.get('payment_date'),
+                    caisse=caisse,
+                    notes=data.get('notes'),
+                    user=request.user,
+                )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'payment': PurchasePaymentSerializer(payment).data,
+            'amount_paid': purchase.amount_paid,
+            'amount_remaining': purchase.amount_remaining,
+            'payment_status': purchase.payment_status,
+        }, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['get'])
+    def payments(self, request, pk=None):
+        """Payments of the purchase, oldest first"""
+        purchase = self.get_object()
+        payments = purchase.payments.select_related('recorded_by').order_by('payment_date', 'id')
+        return Response(PurchasePaymentSerializer(payments, many=True).data)
+    
+    @action(detail=False, methods=['get'], keyset_descending=False)
+    def unpaid(self, request):
+        """Purchases still owing money, oldest first in both pagination modes; served by purchase_status_date_idx"""
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.filter(payment_status__in=UNPAID_STATUSES).order_by('date', 'id')
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(queryset, many=True).data)
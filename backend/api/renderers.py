@@ -0,0 +1,69 @@
+"""
+JSON renderer and parser backed by orjson.
+
+orjson serializes dicts, lists, strings, datetimes and UUIDs in C; values it
+does not know (Decimal, lazy strings, querysets...) go through DRF's own
+encoder, so the output matches `rest_framework.renderers.JSONRenderer`.
+Without orjson installed, or when an indented response is requested (e.g. the
+browsable API), both classes behave exactly like DRF's defaults.
+"""
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+if HAS_ORJSON:
+    # Z suffix for UTC like DRF's encoder; dict keys may be ints (e.g. grouped counts)
+    ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+else:
+    ORJSON_OPTIONS = 0
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Renders compact JSON with orjson, falling back to DRF's JSONRenderer"""
+    _encoder = encoders.JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not HAS_ORJSON or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=self._encoder.default, option=ORJSON_OPTIONS)
+        # Keep the output a strict JavaScript subset, as JSONRenderer does
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class FastJSONParser(JSONParser):
+    """Parses UTF-8 JSON request bodies with orjson, falling back to DRF's JSONParser"""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', 'utf-8')
+        if not HAS_ORJSON or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Renders text already in the Prometheus exposition format (`?format=prometheus`)"""
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            # Errors such as a failed permission check
+            data = '# ' + str(data.get('detail', data)) + '\n'
+        return data.encode(self.charset)
@@ -0,0 +1,242 @@
+"""
+Cash register and supplier reports computed in SQL.
+
+`caisse_report` aggregates a caisse's ledger with GROUP BY queries instead of
+shipping operations to the client. Results are cached per caisse under a
+generation number that `api.signals` bumps once a written operation commits,
+so a cached report is never served after the ledger changed. Reports read
+from the replica are also keyed by the replica snapshot they were built from.
+
+`supplier_balances`, `supplier_balance` and `supplier_statement` aggregate
+purchases the same way, so supplier statements never load purchase rows.
+Cancelled purchases are left out of every supplier figure.
+"""
+from datetime import datetime, time, timedelta
+from time import time_ns
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Min, Q, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from smartstore.routers import replica_stamp
+
+from .models import Purchase
+
+REPORT_CACHE_TIMEOUT = 60 * 60
+
+BUCKETS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def _generation_key(caisse_id):
+    return f'caisse-report-generation:{caisse_id}'
+
+
+def report_generation(caisse_id):
+    """Current cache generation of a caisse's reports"""
+    # Starts from the clock so an evicted counter never reuses an old generation
+    return cache.get_or_set(_generation_key(caisse_id), time_ns, timeout=None)
+
+
+def _bump(caisse_id):
+    key = _generation_key(caisse_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time_ns(), timeout=None)
+
+
+def invalidate_caisse_reports(caisse_id):
+    """Make every cached report of the caisse stale once the current transaction commits"""
+    # Bumping before the commit would let a concurrent report cache the old
+    # ledger under the new generation
+    transaction.on_commit(lambda: _bump(caisse_id))
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _decimal(value):
+    return value or 0
+
+
+def caisse_report(caisse, start_date=None, end_date=None, bucket='day'):
+    """
+    Aggregate the operations of `caisse` between `start_date` and `end_date`
+    (inclusive dates, either may be None) into totals, per-type figures and
+    per-`bucket` series. Today/this-week counts are always relative to now.
+    """
+    today = timezone.localdate()
+    cache_key = (
+        f'caisse-report:{caisse.pk}:{report_generation(caisse.pk)}:'
+        f'{start_date}:{end_date}:{bucket}:{today}:{replica_stamp()}'
+    )
+    report = cache.get(cache_key)
+    if report is not None:
+        return report
+
+    operations = caisse.operations.all()
+    if start_date:
+        operations = operations.filter(timestamp__gte=_start_of_day(start_date))
+    if end_date:
+        operations = operations.filter(timestamp__lt=_start_of_day(end_date + timedelta(days=1)))
+
+    by_type = {
+        row['operation_type']: {'count': row['count'], 'total': _decimal(row['total'])}
+        for row in operations.order_by().values('operation_type').annotate(
+            count=Count('id'), total=Sum('amount')
+        )
+    }
+
+    series = [
+        {
+            'period': row['period'].date().isoformat(),
+            'count': row['count'],
+            'inflow': _decimal(row['inflow']),
+            'outflow': -_decimal(row['outflow']),
+            'net': _decimal(row['net']),
+        }
+        for row in operations.order_by().annotate(period=BUCKETS[bucket]('timestamp')).values('period').annotate(
+            count=Count('id'),
+            inflow=Sum('amount', filter=Q(amount__gt=0)),
+            outflow=Sum('amount', filter=Q(amount__lt=0)),
+            net=Sum('amount'),
+        ).order_by('period')
+    ]
+
+    recent = caisse.operations.aggregate(
+        today=Count('id', filter=Q(timestamp__gte=_start_of_day(today))),
+        week=Count('id', filter=Q(timestamp__gte=_start_of_day(today - timedelta(days=7)))),
+    )
+
+    deposits = by_type.get('DEPOSIT', {}).get('total', 0)
+    withdrawals = by_type.get('WITHDRAWAL', {}).get('total', 0)
+    report = {
+        'caisse': caisse.pk,
+        'start_date': start_date.isoformat() if start_date else None,
+        'end_date': end_date.isoformat() if end_date else None,
+        'bucket': bucket,
+        'total_deposits': deposits,
+        'total_withdrawals': abs(withdrawals),
+        'net': sum((entry['total'] for entry in by_type.values()), 0),
+        'operation_count': sum(entry['count'] for entry in by_type.values()),
+        'today_operations': recent['today'],
+        'weekly_operations': recent['week'],
+        'operations_by_type': by_type,
+        'series': series,
+    }
+    cache.set(cache_key, report, REPORT_CACHE_TIMEOUT)
+    return report
+
+
+# Aging buckets of unpaid amounts: (label, minimum age, maximum age) in days since the purchase date
+AGING_BUCKETS = (
+    ('0-30', 0, 30),
+    ('31-60', 31, 60),
+    ('61-90', 61, 90),
+    ('90+', 91, None),
+)
+
+
+def _open_purchases():
+    return Purchase.objects.exclude(payment_status='CANCELLED').order_by()
+
+
+def _purchase_totals():
+    """Aggregates shared by the supplier balance figures"""
+    return {
+        'purchase_count': Count('id'),
+        'total_ttc': Sum('ttc'),
+        'total_paid': Sum('amount_paid'),
+        'outstanding': Sum('amount_remaining'),
+        'oldest_unpaid_date': Min('date', filter=Q(amount_remaining__gt=0)),
+    }
+
+
+def _balance(row):
+    return {
+        'purchase_count': row['purchase_count'],
+        'total_ttc': _decimal(row['total_ttc']),
+        'total_paid': _decimal(row['total_paid']),
+        'outstanding': _decimal(row['outstanding']),
+        'oldest_unpaid_date': row['oldest_unpaid_date'].isoformat() if row['oldest_unpaid_date'] else None,
+    }
+
+
+def supplier_balances():
+    """Outstanding balance of every supplier with purchases, largest first, in one GROUP BY"""
+    rows = _open_purchases().values('supplier_id', 'supplier__name').annotate(**_purchase_totals())
+    balances = [
+        {'supplier': row['supplier_id'], 'supplier_name': row['supplier__name'], **_balance(row)}
+        for row in rows
+    ]
+    return sorted(balances, key=lambda balance: balance['outstanding'], reverse=True)
+
+
+def supplier_balance(supplier, as_of=None):
+    """
+    Totals, outstanding balance and aging of the unpaid amounts of `supplier`
+    as of the `as_of` date (today if None), in one query.
+    """
+    as_of = as_of or timezone.localdate()
+    aging = {}
+    for label, minimum, maximum in AGING_BUCKETS:
+        age = Q(date__lte=as_of - timedelta(days=minimum))
+        if maximum is not None:
+            age &= Q(date__gte=as_of - timedelta(days=maximum))
+        aging[f'aging_{label}'] = Sum('amount_remaining', filter=age & Q(amount_remaining__gt=0))
+
+    row = _open_purchases().filter(supplier=supplier).aggregate(**_purchase_totals(), **aging)
+    return {
+        'supplier': supplier.pk,
+        'supplier_name': supplier.name,
+        'as_of': as_of.isoformat(),
+        **_balance(row),
+        'aging': {label: _decimal(row[f'aging_{label}']) for label, _, _ in AGING_BUCKETS},
+    }
+
+
+def supplier_statement(supplier, start_date=None, end_date=None, bucket='month'):
+    """
+    Purchase totals of `supplier` between `start_date` and `end_date`
+    (inclusive dates, either may be None), overall and per `bucket`.
+    """
+    purchases = _open_purchases().filter(supplier=supplier)
+    if start_date:
+        purchases = purchases.filter(date__gte=start_date)
+    if end_date:
+        purchases = purchases.filter(date__lte=end_date)
+
+    figures = {
+        'count': Count('id'),
+        'ht': Sum('ht'),
+        'tva': Sum('tva'),
+        'ttc': Sum('ttc'),
+        'paid': Sum('amount_paid'),
+        'remaining': Sum('amount_remaining'),
+    }
+
+    def amounts(row):
+        return {name: row[name] if name == 'count' else _decimal(row[name]) for name in figures}
+
+    series = [
+        {'period': row['period'].isoformat(), **amounts(row)}
+        for row in purchases.annotate(period=BUCKETS[bucket]('date')).values('period').annotate(
+            **figures
+        ).order_by('period')
+    ]
+    return {
+        'supplier': supplier.pk,
+        'supplier_name': supplier.name,
+        'start_date': start_date.isoformat() if start_date else None,
+        'end_date': end_date.isoformat() if end_date else None,
+        'bucket': bucket,
+        'totals': amounts(purchases.aggregate(**figures)),
+        'series': series,
+    }
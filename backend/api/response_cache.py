@@ -0,0 +1,91 @@
+"""
+Cache of rendered read responses.
+
+Viewsets using `api.mixins.CachedResponseMixin` keep the rendered JSON of
+their read actions under a key built from the request path and query string,
+the requesting user and the current generation of every table the response
+is built from. A hit is returned as-is, without touching the ORM or the
+serializer.
+
+`api.signals` bumps a table's generation once a write to it commits, so a
+response is never served after the data behind it changed. Writes made with
+queryset `update()`, which sends no signals (e.g. `Stock.decrement_many`
+during a sale), call `invalidate_responses` themselves.
+
+Responses live in the default cache (see CACHES in settings); use a shared
+backend when running several workers.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+RESPONSE_CACHE_TIMEOUT = 15 * 60
+
+# Tables responses are cached against
+BRAND = 'brand'
+MODEL = 'model'
+PRODUCT = 'product'
+STOCK = 'stock'
+PHONE_IMAGE = 'phoneimage'
+
+
+def _generation_key(table):
+    return f'response-generation:{table}'
+
+
+def _fresh_generation():
+    # Never reuses a value seen before, even if the counter was evicted
+    return time.time_ns()
+
+
+def table_generations(tables):
+    """Current generation of each table, in order"""
+    keys = [_generation_key(table) for table in tables]
+    found = cache.get_many(keys)
+    generations = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, _fresh_generation(), timeout=None)
+            found[key] = cache.get(key)
+        generations.append(found[key])
+    return generations
+
+
+def _bump(tables):
+    for table in tables:
+        key = _generation_key(table)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_generation(), timeout=None)
+
+
+def invalidate_responses(*tables):
+    """Make every cached response built from `tables` stale once the current transaction commits"""
+    # Bumping before the commit would let a concurrent request cache the old
+    # rows under the new generation
+    transaction.on_commit(lambda: _bump(tables))
+
+
+def response_cache_key(request, tables):
+    """Cache key of a read request against the current generations of `tables`"""
+    generations = ':'.join(str(generation) for generation in table_generations(tables))
+    user = request.user.pk if request.user.is_authenticated else 'anonymous'
+    path = hashlib.md5(request.get_full_path().encode(), usedforsecurity=False).hexdigest()
+    return f'response:{generations}:{user}:{request.accepted_renderer.format}:{path}'
+
+
+# Headers replayed with a cached body, validators included
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Cache-Control', 'Vary')
+
+
+def get_cached_response(key):
+    """(content, headers) stored under `key`, or None"""
+    return cache.get(key)
+
+
+def store_response(key, response):
+    headers = {name: response[name] for name in STORED_HEADERS if response.has_header(name)}
+    cache.set(key, (response.content, headers), RESPONSE_CACHE_TIMEOUT)
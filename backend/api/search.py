@@ -0,0 +1,182 @@
+"""
+Full-text search over the catalog backed by an SQLite FTS5 virtual table.
+
+One FTS5 table (`api_search_index`) holds a document per phone, accessory,
+brand and supplier. The rowid encodes both the object id and its kind
+(`object_id * KIND_COUNT + kind`) so keeping the index in sync is a rowid
+lookup instead of a scan. `search_queryset` filters and ranks inside SQL, so
+counts and pagination cover every match. When the database is not SQLite or
+was built without FTS5, it falls back to `icontains` filters.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q, FloatField
+from django.db.models.expressions import RawSQL
+
+from .models import Phone, Accessory, Brand, Supplier
+
+SEARCH_TABLE = 'api_search_index'
+
+KIND_PHONE = 0
+KIND_ACCESSORY = 1
+KIND_BRAND = 2
+KIND_SUPPLIER = 3
+KIND_COUNT = 4
+
+KINDS = {
+    'phone': KIND_PHONE,
+    'accessory': KIND_ACCESSORY,
+    'brand': KIND_BRAND,
+    'supplier': KIND_SUPPLIER,
+}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_available():
+    """Whether the FTS5 index can be used on the current connection"""
+    if connection.vendor != 'sqlite':
+        return False
+    # Only a positive answer is remembered: the table may be created by a later migration
+    if not getattr(connection, '_has_search_index', False):
+        connection._has_search_index = SEARCH_TABLE in connection.introspection.table_names()
+    return connection._has_search_index
+
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query: every token must match as a prefix"""
+    tokens = TOKEN_RE.findall(text or '')
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_queryset(queryset, kind, text, fallback_fields):
+    """
+    Restrict `queryset` to objects matching `text`, ordered by relevance.
+    Falls back to case-insensitive `icontains` on `fallback_fields`.
+
+    The match runs as a subquery of the paginated query rather than as a
+    separate id lookup, so `count` and every page see all matches.
+    """
+    match = build_match_query(text)
+    if not is_available():
+        for token in TOKEN_RE.findall(text or ''):
+            condition = Q()
+            for field in fallback_fields:
+                condition |= Q(**{f'{field}__icontains': token})
+            queryset = queryset.filter(condition)
+        return queryset
+
+    if not match:
+        return queryset.none()
+
+    kind_index = KINDS[kind]
+    meta = queryset.model._meta
+    pk_column = f'{connection.ops.quote_name(meta.db_table)}.{connection.ops.quote_name(meta.pk.column)}'
+    matches = RawSQL(
+        f'SELECT rowid / {KIND_COUNT} FROM {SEARCH_TABLE} '
+        f'WHERE {SEARCH_TABLE} MATCH %s AND rowid %% {KIND_COUNT} = %s',
+        (match, kind_index)
+    )
+    # Only evaluated for matching rows: one rowid lookup each
+    rank = RawSQL(
+        f'(SELECT rank FROM {SEARCH_TABLE} '
+        f'WHERE {SEARCH_TABLE} MATCH %s AND rowid = {pk_column} * {KIND_COUNT} + %s)',
+        (match, kind_index),
+        output_field=FloatField()
+    )
+    return queryset.filter(pk__in=matches).annotate(search_rank=rank).order_by('search_rank', 'pk')
+
+
+def indexed_name(kind, object_id):
+    """Name currently indexed for an object, or None"""
+    if not is_available():
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT name FROM {SEARCH_TABLE} WHERE rowid = %s', [_rowid(kind, object_id)])
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+# --- Document builders ---
+def product_document(product):
+    """Build the indexed columns for a Phone or Accessory instance"""
+    model_name = ''
+    storage = ''
+    if isinstance(product, Phone):
+        model_name = product.model.name if product.model_id else ''
+        storage = f'{product.storage_gb}GB' if product.storage_gb else ''
+
+    return {
+        'name': product.name,
+        'code': product.code or '',
+        'brand': product.brand.name if product.brand_id else '',
+        'model': model_name,
+        'color': getattr(product, 'color', None) or '',
+        'storage': storage,
+    }
+
+
+def name_document(obj):
+    """Build the indexed columns for objects searched by name only"""
+    return {'name': obj.name, 'code': '', 'brand': '', 'model': '', 'color': '', 'storage': ''}
+
+
+# --- Index maintenance ---
+def _rowid(kind, object_id):
+    return object_id * KIND_COUNT + KINDS[kind]
+
+
+def index_documents(kind, documents):
+    """Insert or replace documents given as (object_id, columns) pairs"""
+    if not documents or not is_available():
+        return
+
+    rows = [
+        (_rowid(kind, object_id), doc['name'], doc['code'], doc['brand'],
+         doc['model'], doc['color'], doc['storage'])
+        for object_id, doc in documents
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, name, code, brand, model, color, storage) '
+            f'VALUES (%s, %s, %s, %s, %s, %s, %s)',
+            rows
+        )
+
+
+def remove_documents(kind, object_ids):
+    """Remove the documents of the given objects from the index"""
+    if not object_ids or not is_available():
+        return
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+            [(_rowid(kind, object_id),) for object_id in object_ids]
+        )
+
+
+def index_products(products):
+    """Index Phone and Accessory instances, grouping them by kind"""
+    by_kind = {}
+    for product in products:
+        if isinstance(product, (Phone, Accessory)):
+            by_kind.setdefault(product.product_type, []).append((product.pk, product_document(product)))
+    for kind, documents in by_kind.items():
+        index_documents(kind, documents)
+
+
+def rebuild_index():
+    """Rebuild the whole index from the database"""
+    if not is_available():
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+
+    index_products(Phone.objects.select_related('brand', 'model'))
+    index_products(Accessory.objects.select_related('brand'))
+    index_documents('brand', [(brand.pk, name_document(brand)) for brand in Brand.objects.all()])
+    index_documents('supplier', [(supplier.pk, name_document(supplier)) for supplier in Supplier.objects.all()])
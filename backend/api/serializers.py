@@ -1,11 +1,14 @@
+from decimal import Decimal, InvalidOperation
+
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import (
     Brand, Model, Product, Phone, PhoneImage, Accessory, 
-    Stock, Sale, SaleItem, Invoice, SALE_TYPES,
-    Supplier, Purchase, PurchaseItem, PAYMENT_STATUS_CHOICES, PAYMENT_METHOD_CHOICES,
+    Stock, Sale, SaleItem, Invoice, SALE_TYPES, PAYMENT_METHOD_CHOICES_SALE,
+    Supplier, Purchase, PurchaseItem, PurchasePayment, PAYMENT_STATUS_CHOICES, PAYMENT_METHOD_CHOICES,
     Caisse, CaisseOperation
 )
+from .images import thumbnail_urls
 
 # User Serializer
 class UserSerializer(serializers.ModelSerializer):
@@ -16,9 +19,14 @@ class UserSerializer(serializers.ModelSerializer):
 
 # Brand Serializer
 class BrandSerializer(serializers.ModelSerializer):
+    picture_thumbnails = serializers.SerializerMethodField()
+    
     class Meta:
         model = Brand
-        fields = '__all__'
+        exclude = ('thumbnails',)
+    
+    def get_picture_thumbnails(self, obj):
+        return thumbnail_urls(obj.picture, obj.thumbnails, self.context.get('request'))
 
 # Model Serializer
 class ModelSerializer(serializers.ModelSerializer):
@@ -54,16 +62,28 @@ class ProductSerializer(serializers.ModelSerializer):
 
 # PhoneImage Serializer
 class PhoneImageSerializer(serializers.ModelSerializer):
+    thumbnails = serializers.SerializerMethodField()
+    
     class Meta:
         model = PhoneImage
-        fields = ['id', 'phone', 'image', 'is_primary', 'color_variant', 'sort_order', 'source_url', 'created_at']
+        fields = ['id', 'phone', 'image', 'thumbnails', 'is_primary', 'color_variant', 'sort_order', 'source_url', 'created_at']
         read_only_fields = ['created_at']
+    
+    def get_thumbnails(self, obj):
+        return thumbnail_urls(obj.image, obj.thumbnails, self.context.get('request'))
 
 # Phone Image List Serializer (simplified for use in PhoneSerializer)
 class PhoneImageListSerializer(serializers.ModelSerializer):
+    # List rows only need the grid thumbnail, a few KB instead of the full picture
+    thumbnail = serializers.SerializerMethodField()
+    
     class Meta:
         model = PhoneImage
-        fields = ['id', 'image', 'is_primary', 'color_variant']
+        fields = ['id', 'image', 'thumbnail', 'is_primary', 'color_variant']
+    
+    def get_thumbnail(self, obj):
+        urls = thumbnail_urls(obj.image, obj.thumbnails, self.context.get('request'))
+        return urls and urls['grid']
 
 # Phone Serializer
 class PhoneSerializer(serializers.ModelSerializer):
@@ -157,6 +177,8 @@ class RecordSaleSerializer(serializers.Serializer):
     sale_type = serializers.ChoiceField(choices=SALE_TYPES)
     customer_name = serializers.CharField(required=False, allow_blank=True)
     generate_invoice = serializers.BooleanField(default=False)
+    payment_method = serializers.ChoiceField(choices=PAYMENT_METHOD_CHOICES_SALE, default='CASH')
+    add_to_caisse = serializers.BooleanField(default=True)
     items = serializers.ListField(
         child=serializers.DictField(
             child=serializers.CharField(),
@@ -166,7 +188,8 @@ class RecordSaleSerializer(serializers.Serializer):
     )
     
     def validate_items(self, items):
-        validated_items = []
+        parsed_items = []
+        requested = {}  # product_id -> total quantity over all lines
         
         for item in items:
             # Validate required fields
@@ -182,27 +205,38 @@ class RecordSaleSerializer(serializers.Serializer):
             if quantity <= 0:
                 raise serializers.ValidationError("Quantity must be greater than zero")
             
+            parsed_items.append((product_id, quantity))
+            requested[product_id] = requested.get(product_id, 0) + quantity
+        
+        # Resolve the whole basket with one product query and one stock query
+        products = Product.objects.in_bulk(list(requested))
+        stocks = Stock.objects.in_bulk(list(requested), field_name='product_id')
+        
+        for product_id, quantity in requested.items():
             # Check if product exists
-            try:
-                product = Product.objects.get(id=product_id)
-            except Product.DoesNotExist:
+            product = products.get(product_id)
+            if product is None:
                 raise serializers.ValidationError(f"Product with id {product_id} does not exist")
             
             # Check if there's enough stock
-            try:
-                stock = Stock.objects.get(product=product)
-                if stock.quantity < quantity:
-                    raise serializers.ValidationError(
-                        f"Not enough stock for {product.name} (Code: {product.code}). "
-                        f"Available: {stock.quantity}, Requested: {quantity}"
-                    )
-            except Stock.DoesNotExist:
+            stock = stocks.get(product_id)
+            if stock is None:
                 raise serializers.ValidationError(
                     f"No stock record found for {product.name} (Code: {product.code})"
                 )
+            if stock.quantity < quantity:
+                raise serializers.ValidationError(
+                    f"Not enough stock for {product.name} (Code: {product.code}). "
+                    f"Available: {stock.quantity}, Requested: {quantity}"
+                )
+        
+        validated_items = []
+        sale_type = self.initial_data.get('sale_type')
+        
+        for product_id, quantity in parsed_items:
+            product = products[product_id]
             
             # Determine price based on sale type
-            sale_type = self.initial_data.get('sale_type')
             if sale_type == 'bulk' and product.selling_bulk_price:
                 price = product.selling_bulk_price
             elif sale_type == 'semi-bulk' and product.selling_semi_bulk_price:
@@ -252,7 +286,34 @@ class PurchaseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Purchase
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at')
+        # Maintained by the payments ledger (POST /purchases/<id>/pay/) and by
+        # POST /purchases/<id>/receive/, which adds the lines to stock only while received_at is null
+        read_only_fields = ('created_at', 'updated_at', 'amount_paid', 'amount_remaining', 'received_at')
+    
+    def validate_payment_status(self, value):
+        # PENDING/PARTIAL/PAID follow the payments; edits may only keep the status or cancel
+        current = self.instance.payment_status if self.instance is not None else 'PENDING'
+        if value not in (current, 'CANCELLED'):
+            raise serializers.ValidationError('The payment status follows the recorded payments; it can only be set to CANCELLED')
+        return value
+
+# PurchasePayment Serializers
+class PurchasePaymentSerializer(serializers.ModelSerializer):
+    payment_method_display = serializers.CharField(source='get_payment_method_display', read_only=True)
+    recorded_by_username = serializers.CharField(source='recorded_by.username', read_only=True, default=None)
+    
+    class Meta:
+        model = PurchasePayment
+        fields = '__all__'
+
+class CreatePurchasePaymentSerializer(serializers.Serializer):
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    payment_method = serializers.ChoiceField(choices=PAYMENT_METHOD_CHOICES, default='CASH')
+    payment_date = serializers.DateField(required=False)
+    # Take the money from a cash register: `caisse_id`, or the main one when omitted
+    from_caisse = serializers.BooleanField(default=False)
+    caisse_id = serializers.PrimaryKeyRelatedField(queryset=Caisse.objects.all(), required=False, allow_null=True)
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
 
 # Serializer for creating a purchase with multiple items
 class CreatePurchaseSerializer(serializers.Serializer):
@@ -299,9 +360,12 @@ class CreatePurchaseSerializer(serializers.Serializer):
                 product_name = item['product_name']
                 product_code = item.get('product_code', '')
                 quantity = int(item['quantity'])
-                unit_price = float(item['unit_price'])
-                discount = float(item.get('discount', 0))
-            except (ValueError, TypeError):
+                unit_price = Decimal(str(item['unit_price']))
+                discount = Decimal(str(item.get('discount', 0)))
+            except (ValueError, TypeError, InvalidOperation):
+                raise serializers.ValidationError("Invalid data types in item fields")
+            
+            if not unit_price.is_finite() or not discount.is_finite():
                 raise serializers.ValidationError("Invalid data types in item fields")
             
             if quantity <= 0:
@@ -339,6 +403,8 @@ class CaisseOperationSerializer(serializers.ModelSerializer):
 
 
 class CaisseSerializer(serializers.ModelSerializer):
+    current_balance = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    
     class Meta:
         model = Caisse
         fields = ['id', 'name', 'current_balance', 'last_updated', 'created_at']
@@ -346,6 +412,7 @@ class CaisseSerializer(serializers.ModelSerializer):
 
 
 class CaisseDetailSerializer(serializers.ModelSerializer):
+    current_balance = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
     operations = serializers.SerializerMethodField()
     
     class Meta:
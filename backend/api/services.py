@@ -0,0 +1,155 @@
+from decimal import Decimal
+
+from django.db.models import F, Case, When, Value
+from django.utils import timezone
+
+from .models import Caisse, Product, Purchase, PurchaseItem, PurchasePayment, Stock
+
+
+def get_default_caisse():
+    """Return the main cash register, creating it on first use"""
+    caisse = Caisse.objects.order_by('id').first()
+    if caisse is None:
+        caisse = Caisse.objects.create(name="Main Cash Register")
+    return caisse
+
+
+def post_sale_to_caisse(sale):
+    """
+    Post a sale whose total is final to the cash register.
+
+    Appends exactly one SALE operation to the caisse ledger; the balance is
+    derived from the ledger, so the Caisse row itself is not written. Sets
+    `sale.caisse` without saving; the caller saves the sale afterwards.
+    Returns the operation, or None when the sale does not go to the register.
+    """
+    if not sale.add_to_caisse or sale.payment_method != 'CASH' or sale.total_amount <= 0:
+        return None
+
+    caisse = sale.caisse or get_default_caisse()
+    sale.caisse = caisse
+
+    return caisse.record_operation(
+        'SALE',
+        sale.total_amount,
+        description=f"Sale #{sale.id} - {sale.customer_name or 'Unknown customer'}",
+        user=sale.sold_by,
+        reference_id=str(sale.id)
+    )
+
+
+def record_purchase(supplier, items, **fields):
+    """
+    Create a purchase and its lines in one pass.
+
+    `items` are dicts with product_id, product_name, product_code, quantity,
+    unit_price and discount. Line amounts and header totals are computed in
+    memory, so the purchase is inserted once, already totalled, and its lines
+    with a single bulk_create. Call inside a transaction.
+    """
+    purchase = Purchase(supplier=supplier, **fields)
+    lines = [PurchaseItem(**item) for item in items]
+    total_ht = total_tva = Decimal('0.00')
+    for line in lines:
+        line.compute_amounts(purchase.soumis_tva)
+        total_ht += line.ht
+        total_tva += line.tva
+    purchase.apply_totals(total_ht, total_tva)
+    purchase.save()
+
+    for line in lines:
+        line.purchase = purchase
+    PurchaseItem.objects.bulk_create(lines)
+    return purchase
+
+
+def receive_purchase(purchase):
+    """
+    Add the quantities of a purchase's lines to stock, at most once.
+
+    The purchase is claimed with a conditional UPDATE on `received_at`, so a
+    repeated or concurrent call finds nothing to claim and returns None
+    without touching stock. Otherwise all lines are applied with
+    Stock.increment_many and a summary dict is returned. Raises ValueError,
+    with nothing applied once the caller's transaction rolls back, if a line
+    refers to a product that no longer exists. Call inside a transaction.
+    """
+    now = timezone.now()
+    claimed = Purchase.objects.filter(pk=purchase.pk, received_at__isnull=True).update(
+        received_at=now, updated_at=now
+    )
+    if not claimed:
+        return None
+
+    quantities = {}
+    for product_id, quantity in purchase.items.values_list('product_id', 'quantity'):
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+    missing = set(quantities).difference(Product.objects.filter(id__in=list(quantities)).values_list('id', flat=True))
+    if missing:
+        raise ValueError(f"Products no longer exist: {', '.join(str(product_id) for product_id in sorted(missing))}")
+
+    created = Stock.increment_many(quantities)
+    purchase.received_at = now
+    return {
+        'received_at': now,
+        'products': len(quantities),
+        'units': sum(quantities.values()),
+        'stock_created': created,
+    }
+
+
+def record_purchase_payment(purchase, amount, payment_method='CASH', payment_date=None,
+                            caisse=None, notes=None, user=None):
+    """
+    Record a (possibly partial) payment of a purchase.
+
+    amount_paid, amount_remaining and payment_status are moved with one
+    conditional UPDATE on F() expressions, so concurrent payments add up and
+    none can take the purchase past its total; nothing is recomputed from the
+    other payments. When `caisse` is given, the amount is withdrawn from it as
+    a PURCHASE_PAYMENT operation. Raises ValueError if the purchase is
+    cancelled, the amount exceeds what remains or the caisse lacks the funds;
+    call inside a transaction so that nothing is kept in that case. Refreshes
+    the payment fields of `purchase` and returns the PurchasePayment.
+    """
+    if amount <= 0:
+        raise ValueError("Payment amount must be greater than zero")
+
+    # SET expressions read the row as it was before the update
+    paid = Purchase.objects.filter(pk=purchase.pk, amount_remaining__gte=amount).exclude(
+        payment_status='CANCELLED'
+    ).update(
+        amount_paid=F('amount_paid') + amount,
+        amount_remaining=F('amount_remaining') - amount,
+        payment_status=Case(When(amount_remaining__lte=amount, then=Value('PAID')), default=Value('PARTIAL')),
+        updated_at=timezone.now(),
+    )
+    if not paid:
+        current = Purchase.objects.values('payment_status', 'amount_remaining').get(pk=purchase.pk)
+        if current['payment_status'] == 'CANCELLED':
+            raise ValueError("A cancelled purchase cannot be paid")
+        raise ValueError(f"Payment exceeds the amount remaining ({current['amount_remaining']})")
+
+    operation = None
+    if caisse is not None:
+        operation = caisse.record_operation(
+            'PURCHASE_PAYMENT',
+            -amount,
+            description=f"Payment of purchase {purchase.reference_number}",
+            user=user,
+            reference_id=str(purchase.pk)
+        )
+
+    payment = PurchasePayment.objects.create(
+        purchase=purchase,
+        amount=amount,
+        payment_date=payment_date or timezone.localdate(),
+        payment_method=payment_method,
+        from_caisse=caisse,
+        caisse_operation=operation,
+        notes=notes,
+        recorded_by=user,
+    )
+    purchase.refresh_from_db(fields=['amount_paid', 'amount_remaining', 'payment_status', 'updated_at'])
+    return payment
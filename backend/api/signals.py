@@ -0,0 +1,124 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .models import (
+    Product, Phone, PhoneImage, Accessory, Brand, Model, Stock, Supplier, CaisseOperation, DeletedProduct
+)
+from .reports import invalidate_caisse_reports
+from .authentication import forget_token, forget_user
+from . import images
+from . import response_cache
+from . import search
+
+
+# --- Search index synchronisation ---
+@receiver(post_save, sender=Phone)
+@receiver(post_save, sender=Accessory)
+def index_saved_product(sender, instance, **kwargs):
+    search.index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def remove_deleted_product(sender, instance, **kwargs):
+    if instance.product_type in search.KINDS:
+        search.remove_documents(instance.product_type, [instance.pk])
+
+
+# --- Catalog delta sync ---
+@receiver(post_delete, sender=Product)
+def record_deleted_product(sender, instance, **kwargs):
+    DeletedProduct.objects.create(product_id=instance.pk)
+    # An index range delete; keeps the table, and every changes query, bounded
+    DeletedProduct.prune()
+
+
+@receiver(post_save, sender=Brand)
+def index_saved_brand(sender, instance, **kwargs):
+    # Saves that keep the name change nothing in the index
+    if search.indexed_name('brand', instance.pk) == instance.name:
+        return
+    search.index_documents('brand', [(instance.pk, search.name_document(instance))])
+    # Products carry the brand name in their documents
+    search.index_products(Phone.objects.filter(brand=instance).select_related('brand', 'model'))
+    search.index_products(Accessory.objects.filter(brand=instance).select_related('brand'))
+
+
+@receiver(post_delete, sender=Brand)
+def remove_deleted_brand(sender, instance, **kwargs):
+    search.remove_documents('brand', [instance.pk])
+
+
+@receiver(post_save, sender=Model)
+def index_saved_model(sender, instance, **kwargs):
+    # Phones carry the model name in their documents
+    search.index_products(Phone.objects.filter(model=instance).select_related('brand', 'model'))
+
+
+@receiver(post_save, sender=Supplier)
+def index_saved_supplier(sender, instance, **kwargs):
+    search.index_documents('supplier', [(instance.pk, search.name_document(instance))])
+
+
+@receiver(post_delete, sender=Supplier)
+def remove_deleted_supplier(sender, instance, **kwargs):
+    search.remove_documents('supplier', [instance.pk])
+
+
+# --- Image processing ---
+@receiver(post_save, sender=PhoneImage)
+def process_phone_image(sender, instance, **kwargs):
+    if images.needs_processing(instance, 'image'):
+        images.schedule_processing(instance, 'image', response_cache.PHONE_IMAGE)
+
+
+@receiver(post_save, sender=Brand)
+def process_brand_picture(sender, instance, **kwargs):
+    if images.needs_processing(instance, 'picture'):
+        images.schedule_processing(instance, 'picture', response_cache.BRAND)
+
+
+# --- Report cache invalidation ---
+@receiver(post_save, sender=CaisseOperation)
+@receiver(post_delete, sender=CaisseOperation)
+def invalidate_caisse_report_cache(sender, instance, **kwargs):
+    invalidate_caisse_reports(instance.caisse_id)
+
+
+# --- Response cache invalidation ---
+RESPONSE_CACHE_TABLES = (
+    (Brand, response_cache.BRAND),
+    (Model, response_cache.MODEL),
+    (Product, response_cache.PRODUCT),
+    (Stock, response_cache.STOCK),
+    (PhoneImage, response_cache.PHONE_IMAGE),
+)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_cached_responses(sender, instance, **kwargs):
+    # Connected for every sender so Phone and Accessory saves count as Product writes
+    tables = [table for model, table in RESPONSE_CACHE_TABLES if isinstance(instance, model)]
+    if tables:
+        response_cache.invalidate_responses(*tables)
+
+
+@receiver(m2m_changed, sender=Accessory.compatible_phones.through)
+def invalidate_cached_compatibility(sender, action, **kwargs):
+    if action.startswith('post_'):
+        response_cache.invalidate_responses(response_cache.PRODUCT)
+
+
+# --- Token cache invalidation ---
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    forget_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user_tokens(sender, instance, **kwargs):
+    # Deactivated or deleted users must stop authenticating at once
+    forget_user(instance.pk)
@@ -1,3 +1,1309 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, datetime, time as clock, timedelta
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+from django.db import connection, transaction, OperationalError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from smartstore import routers
+from smartstore.metrics import registry
+
+from .models import (
+    Product, Brand, Model, Phone, PhoneImage, Accessory, Stock, Sale, SaleItem, Invoice,
+    Supplier, Purchase, PurchaseItem, Caisse, CaisseOperation, ProductCodeSequence, DeletedProduct
+)
+from . import catalog_views, checks, codes, search, serializers, views
+from .renderers import FastJSONParser, FastJSONRenderer
+from .services import record_purchase
+from .authentication import token_cache_key
+
+
+class ListQueryCountTests(TestCase):
+    """List endpoints must run a fixed number of queries whatever the page size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cashier', password='secret')
+        cls.brand = Brand.objects.create(name='Brand')
+        cls.model = Model.objects.create(brand=cls.brand, name='Model')
+        cls.supplier = Supplier.objects.create(name='Supplier')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_rows(self, count):
+        # Run the response cache invalidations the rows would trigger on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_rows(count)
+
+    def _create_rows(self, count):
+        for _ in range(count):
+            index = Phone.objects.count()
+            phone = Phone.objects.create(
+                name=f'Phone {index}', brand=self.brand, model=self.model,
+                cost_price=Decimal('100.00'), selling_unite_price=Decimal('150.00')
+            )
+            Stock.objects.create(product=phone, quantity=5)
+            # No files behind these names: mark them processed so no thumbnails are generated
+            PhoneImage.objects.create(
+                phone=phone, image='phone_images/a.jpg', thumbnails={'source': 'phone_images/a.jpg'}, is_primary=True
+            )
+            PhoneImage.objects.create(phone=phone, image='phone_images/b.jpg', thumbnails={'source': 'phone_images/b.jpg'})
+
+            accessory = Accessory.objects.create(
+                name=f'Accessory {index}', brand=self.brand, accessory_category='case',
+                cost_price=Decimal('5.00'), selling_unite_price=Decimal('10.00')
+            )
+            accessory.compatible_phones.add(phone)
+            Stock.objects.create(product=accessory, quantity=5)
+
+            sale = Sale.objects.create(
+                sale_type='particular', total_amount=Decimal('160.00'),
+                sold_by=self.user, add_to_caisse=False
+            )
+            SaleItem.objects.create(sale=sale, product=phone, quantity_sold=1, price_per_item=Decimal('150.00'))
+            SaleItem.objects.create(sale=sale, product=accessory, quantity_sold=1, price_per_item=Decimal('10.00'))
+            Invoice.objects.create(sale=sale, invoice_number=f'INV-{index}', total_amount=Decimal('160.00'))
+
+            purchase = Purchase.objects.create(
+                supplier=self.supplier, reference_number=f'REF-{index}', date='2025-01-01', soumis_tva=False
+            )
+            PurchaseItem.objects.create(
+                purchase=purchase, product_id=phone.id, product_name=phone.name,
+                quantity=1, unit_price=Decimal('100.00'), ht=0, tva=0, ttc=0
+            )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'page_size': 50})
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assert_constant_queries(self, url):
+        self.create_rows(2)
+        small = self.count_queries(url)
+        self.create_rows(10)
+        large = self.count_queries(url)
+        self.assertEqual(small, large, f'{url} query count grows with the number of rows')
+
+    def test_phone_list(self):
+        self.assert_constant_queries('/api/phones/')
+
+    def test_accessory_list(self):
+        self.assert_constant_queries('/api/accessories/')
+
+    def test_stock_list(self):
+        self.assert_constant_queries('/api/stock/')
+
+    def test_sale_list(self):
+        self.assert_constant_queries('/api/sales/')
+
+    def test_invoice_list(self):
+        self.assert_constant_queries('/api/invoices/')
+
+    def test_purchase_list(self):
+        self.assert_constant_queries('/api/purchases/')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite connection profile')
+class SqliteProfileTests(TestCase):
+    """Every connection gets the pragmas and transaction mode from settings"""
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('temp_store'), 2)  # MEMORY
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+        self.assertEqual(self.pragma('busy_timeout'), 20000)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+class SharedCacheCheckTests(TestCase):
+    """Several workers refuse to start on a per-process cache"""
+    locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    database = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache'}}
+
+    def test_single_worker_may_use_memory(self):
+        with override_settings(WEB_WORKERS=1, CACHES=self.locmem):
+            self.assertEqual(checks.check_shared_cache(None), [])
+
+    def test_several_workers_need_shared_cache(self):
+        with override_settings(WEB_WORKERS=4, CACHES=self.locmem):
+            self.assertEqual([error.id for error in checks.check_shared_cache(None)], ['api.E001'])
+        with override_settings(WEB_WORKERS=4, CACHES=self.database):
+            self.assertEqual(checks.check_shared_cache(None), [])
+
+
+class ConcurrentSaleTests(TransactionTestCase):
+    """Parallel sales of one SKU must neither oversell nor lose stock updates"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cashier', password='secret')
+        brand = Brand.objects.create(name='Brand')
+        model = Model.objects.create(brand=brand, name='Model')
+        self.phone = Phone.objects.create(
+            name='Phone', brand=brand, model=model,
+            cost_price=Decimal('100.00'), selling_unite_price=Decimal('150.00')
+        )
+
+    # Attempts per seller before a lock regression fails the test instead of hanging it
+    MAX_ATTEMPTS = 100
+
+    def sell_in_parallel(self, sellers, quantity=1):
+        barrier = threading.Barrier(sellers)
+        statuses = []
+        failures = []
+        lock = threading.Lock()
+
+        def sell():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            barrier.wait()
+            try:
+                for _ in range(self.MAX_ATTEMPTS):
+                    try:
+                        response = client.post('/api/sales/record/', {
+                            'sale_type': 'particular',
+                            'items': [{'product_id': str(self.phone.id), 'quantity': str(quantity)}],
+                        }, format='json')
+                        break
+                    except OperationalError:
+                        # SQLite reports lock contention between writers; retry like a cashier would
+                        time.sleep(0.01)
+                else:
+                    with lock:
+                        failures.append(f'Sale still locked out after {self.MAX_ATTEMPTS} attempts')
+                    return
+                with lock:
+                    statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=sell) for _ in range(sellers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=60)
+        self.assertFalse(any(thread.is_alive() for thread in threads), 'Sellers did not finish within 60s')
+        self.assertEqual(failures, [])
+        return statuses
+
+    def test_no_oversell(self):
+        Stock.objects.create(product=self.phone, quantity=5)
+
+        statuses = self.sell_in_parallel(12)
+
+        self.assertEqual(len(statuses), 12)
+        self.assertEqual(statuses.count(201), 5)
+        self.assertTrue(all(code in (201, 400, 409) for code in statuses), statuses)
+        self.assertEqual(Stock.objects.get(product=self.phone).quantity, 0)
+        self.assertEqual(SaleItem.objects.filter(product=self.phone).count(), 5)
+
+    def test_no_lost_updates(self):
+        Stock.objects.create(product=self.phone, quantity=50)
+
+        statuses = self.sell_in_parallel(10, quantity=2)
+
+        self.assertEqual(statuses, [201] * 10)
+        self.assertEqual(Stock.objects.get(product=self.phone).quantity, 30)
+        self.assertEqual(SaleItem.objects.filter(product=self.phone).count(), 10)
+
+
+class SalePostingTests(TestCase):
+    """A cash sale posts exactly one SALE operation to the caisse, and only when asked to"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='cashier', password='secret'))
+        brand = Brand.objects.create(name='Brand')
+        model = Model.objects.create(brand=brand, name='Model')
+        self.phone = Phone.objects.create(
+            name='Phone', brand=brand, model=model,
+            cost_price=Decimal('100.00'), selling_unite_price=Decimal('150.00')
+        )
+        Stock.objects.create(product=self.phone, quantity=10)
+
+    def sell(self, **fields):
+        response = self.client.post('/api/sales/record/', {
+            'sale_type': 'particular',
+            'items': [{'product_id': str(self.phone.id), 'quantity': '2'}],
+            **fields,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Sale.objects.get(pk=response.json()['sale_id'])
+
+    def test_cash_sale_posts_once(self):
+        sale = self.sell()
+        operation = CaisseOperation.objects.get()
+        self.assertEqual(operation.operation_type, 'SALE')
+        self.assertEqual(operation.amount, Decimal('300.00'))
+        self.assertEqual(operation.reference_id, str(sale.id))
+        self.assertEqual(sale.caisse, operation.caisse)
+        self.assertEqual(operation.caisse.current_balance, Decimal('300.00'))
+
+    def test_sales_kept_out_of_the_caisse(self):
+        self.assertIsNone(self.sell(add_to_caisse=False).caisse)
+        self.assertIsNone(self.sell(payment_method='CREDIT_CARD').caisse)
+        self.assertFalse(CaisseOperation.objects.exists())
+
+    def test_query_count_does_not_grow_with_lines(self):
+        brand, model = self.phone.brand, self.phone.model
+        phones = [self.phone] + [
+            Phone.objects.create(
+                name=f'Bulk {index}', brand=brand, model=model,
+                cost_price=Decimal('100.00'), selling_unite_price=Decimal('150.00'), selling_bulk_price=Decimal('120.00')
+            )
+            for index in range(199)
+        ]
+        for phone in phones[1:]:
+            Stock.objects.create(product=phone, quantity=10)
+
+        def queries(lines):
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.post('/api/sales/record/', {
+                    'sale_type': 'bulk',
+                    'items': [{'product_id': str(phone.id), 'quantity': '1'} for phone in lines],
+                }, format='json')
+            self.assertEqual(response.status_code, 201)
+            return len(captured.captured_queries)
+
+        queries(phones[:1])  # Creates the default caisse and closes the day
+        few, many = queries(phones[:2]), queries(phones)
+        self.assertEqual(few, many)
+        self.assertLess(many, 25)  # Not one statement per line or more
+        self.assertEqual(SaleItem.objects.count(), 203)
+        self.assertEqual(Stock.objects.get(product=phones[-1]).quantity, 9)
+
+
+
+class CaisseLedgerTests(TestCase):
+    """Balances come from the latest snapshot plus later operations; only outflows are checked"""
+
+    def setUp(self):
+        self.caisse = Caisse.objects.create(name='Main')
+
+    def test_outflow_cannot_overdraw(self):
+        self.caisse.record_operation('DEPOSIT', Decimal('50.00'))
+        with self.assertRaises(ValueError):
+            self.caisse.withdraw_funds(Decimal('80.00'))
+        self.assertEqual(self.caisse.operations.count(), 1)
+
+        operation = self.caisse.record_operation('SALE', Decimal('20.00'))
+        self.assertEqual(operation.balance_after, Decimal('70.00'))
+        self.caisse.withdraw_funds(Decimal('70.00'))
+        self.assertEqual(self.caisse.current_balance, Decimal('0.00'))
+
+    def test_snapshot_and_balance_at(self):
+        yesterday = timezone.make_aware(datetime.combine(timezone.localdate() - timedelta(days=1), clock(10)))
+        self.caisse.record_operation('DEPOSIT', Decimal('100.00'))
+        self.caisse.record_operation('WITHDRAWAL', Decimal('-30.00'))
+        # As if posted yesterday, before any day was closed
+        self.caisse.operations.update(timestamp=yesterday)
+        self.caisse.snapshots.all().delete()
+
+        # The first posting of the day closes yesterday
+        self.caisse.record_operation('DEPOSIT', Decimal('5.00'))
+        snapshot = self.caisse.snapshots.get()
+        self.assertEqual(snapshot.snapshot_date, yesterday.date())
+        self.assertEqual(snapshot.balance, Decimal('70.00'))
+
+        self.assertEqual(self.caisse.current_balance, Decimal('75.00'))
+        self.assertEqual(Caisse.annotate_balances(Caisse.objects.all()).get().current_balance, Decimal('75.00'))
+        self.assertEqual(self.caisse.balance_at(yesterday), Decimal('70.00'))
+        self.assertEqual(self.caisse.balance_at(yesterday - timedelta(days=1)), Decimal('0.00'))
+
+    def test_every_posting_locks_before_closing_the_day(self):
+        for operation_type, amount in (('SALE', Decimal('20.00')), ('DEPOSIT', Decimal('5.00')), ('WITHDRAWAL', Decimal('-1.00'))):
+            with self.subTest(operation_type=operation_type):
+                calls = mock.Mock()
+                with mock.patch.object(Caisse, 'lock', autospec=True, side_effect=Caisse.lock) as lock, \
+                        mock.patch.object(Caisse, 'roll_snapshot', autospec=True, side_effect=Caisse.roll_snapshot) as roll:
+                    calls.attach_mock(lock, 'lock')
+                    calls.attach_mock(roll, 'roll_snapshot')
+                    self.caisse.record_operation(operation_type, amount)
+                self.assertEqual([name for name, _, _ in calls.mock_calls], ['lock', 'roll_snapshot'])
+
+    def test_list_balances_in_one_query(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='manager', password='secret'))
+        self.caisse.record_operation('DEPOSIT', Decimal('10.00'))
+
+        def list_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get('/api/caisse/')
+            self.assertEqual(response.status_code, 200)
+            return len(queries.captured_queries), response.json()
+
+        single, _ = list_queries()
+        for index in range(3):
+            Caisse.objects.create(name=f'Register {index}').record_operation('DEPOSIT', Decimal('1.00'))
+        several, body = list_queries()
+        self.assertEqual(single, several)
+        rows = body['results'] if isinstance(body, dict) else body
+        self.assertEqual({row['name']: row['current_balance'] for row in rows}['Main'], '10.00')
+
+
+class ConcurrentPostingTests(TransactionTestCase):
+    """A posting committed late still counts towards later balances and the day's snapshot"""
+
+    def setUp(self):
+        self.caisse = Caisse.objects.create(name='Main')
+
+    def test_late_commit_is_not_skipped(self):
+        yesterday = timezone.make_aware(datetime.combine(timezone.localdate() - timedelta(days=1), clock(23, 59)))
+        self.caisse.record_operation('DEPOSIT', Decimal('100.00'))
+        # Posted yesterday, and the day has not been closed yet
+        self.caisse.operations.update(timestamp=yesterday)
+        self.caisse.snapshots.all().delete()
+        posted, release = threading.Event(), threading.Event()
+
+        def slow_posting():
+            # Stamped before midnight; commits only after the next posting has started
+            try:
+                with transaction.atomic():
+                    operation = Caisse.objects.get(pk=self.caisse.pk).record_operation('SALE', Decimal('10.00'))
+                    CaisseOperation.objects.filter(pk=operation.pk).update(timestamp=yesterday)
+                    posted.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        def next_posting():
+            try:
+                Caisse.objects.get(pk=self.caisse.pk).record_operation('SALE', Decimal('1.00'))
+            finally:
+                connection.close()
+
+        first = threading.Thread(target=slow_posting)
+        first.start()
+        self.assertTrue(posted.wait(10))
+        second = threading.Thread(target=next_posting)
+        second.start()
+        time.sleep(0.3)
+        release.set()
+        first.join(timeout=60)
+        second.join(timeout=60)
+
+        operations = list(self.caisse.operations.order_by('id'))
+        self.assertEqual([op.balance_after for op in operations], [Decimal('100.00'), Decimal('110.00'), Decimal('111.00')])
+        # The snapshot holds exactly the operations up to its boundary; the rest are summed after it
+        snapshot = self.caisse.snapshots.get()
+        covered = sum(op.amount for op in operations if op.id <= snapshot.last_operation_id)
+        self.assertEqual(snapshot.balance, covered)
+        self.assertEqual(self.caisse.current_balance, Decimal('111.00'))
+        self.assertEqual(self.caisse.balance_at(yesterday), Decimal('110.00'))
+
+
+class CaisseReportCacheTests(TestCase):
+    """A cached caisse report is dropped once a new operation commits, not before"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='manager', password='secret'))
+        self.caisse = Caisse.objects.create(name='Main')
+
+    def operation_count(self):
+        return self.client.get(f'/api/caisse/{self.caisse.id}/report/').json()['operation_count']
+
+    def test_committed_operation_invalidates_report(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.caisse.record_operation('DEPOSIT', Decimal('10.00'))
+        self.assertEqual(self.operation_count(), 1)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.caisse.record_operation('DEPOSIT', Decimal('5.00'))
+        # Not committed yet: the generation must not have moved
+        self.assertEqual(self.operation_count(), 1)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.operation_count(), 2)
+
+
+class FilterQueryPlanTests(TestCase):
+    """Every viewset filter must be answered by an index, never by a full table scan"""
+
+    # (viewset, query params, table the filter applies to)
+    FILTERS = [
+        (views.SaleViewSet, {'start_date': '2025-01-01'}, 'api_sale'),
+        (views.SaleViewSet, {'sale_type': 'bulk'}, 'api_sale'),
+        (views.SaleViewSet, {'sale_type': 'bulk', 'start_date': '2025-01-01'}, 'api_sale'),
+        (views.SaleViewSet, {'sold_by': '1'}, 'api_sale'),
+        (views.InvoiceViewSet, {'start_date': '2025-01-01'}, 'api_invoice'),
+        (views.CaisseOperationViewSet, {'caisse': '1'}, 'api_caisseoperation'),
+        (views.CaisseOperationViewSet, {'caisse': '1', 'start_date': '2025-01-01'}, 'api_caisseoperation'),
+        (views.CaisseOperationViewSet, {'operation_type': 'SALE'}, 'api_caisseoperation'),
+        (views.PurchaseViewSet, {'supplier_id': '1'}, 'api_purchase'),
+        (views.PurchaseViewSet, {'payment_status': 'PAID'}, 'api_purchase'),
+        (views.PurchaseViewSet, {'start_date': '2025-01-01'}, 'api_purchase'),
+        (views.StockViewSet, {'low_stock': '5'}, 'api_stock'),
+        (views.StockViewSet, {'out_of_stock': 'true'}, 'api_stock'),
+        (views.PhoneViewSet, {'condition': 'new'}, 'api_phone'),
+        (views.PhoneViewSet, {'condition': 'new', 'version': 'global', 'phone_type': 'ordinary'}, 'api_phone'),
+        (views.PhoneImageViewSet, {'phone': '1'}, 'api_phoneimage'),
+    ]
+
+    def filtered_queryset(self, viewset, params):
+        view = viewset()
+        view.request = Request(APIRequestFactory().get('/', params))
+        view.format_kwarg = None
+        view.action = 'list'
+        view.kwargs = {}
+        return view.filter_queryset(view.get_queryset())
+
+    def test_filters_use_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plans are checked with SQLite EXPLAIN QUERY PLAN')
+
+        for viewset, params, table in self.FILTERS:
+            with self.subTest(viewset=viewset.__name__, params=params):
+                plan = self.filtered_queryset(viewset, params).explain()
+                self.assertRegex(plan, rf'SEARCH {table}\b', plan)
+                self.assertNotRegex(plan, rf'SCAN {table}\b', plan)
+
+    def test_primary_image_lookup_uses_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plans are checked with SQLite EXPLAIN QUERY PLAN')
+
+        plan = PhoneImage.objects.filter(phone_id=1, is_primary=True).explain()
+        self.assertNotRegex(plan, r'SCAN api_phoneimage\b', plan)
+
+
+class ProductCodeTests(TestCase):
+    """The sequence-backed allocator hands out each code once and knows when it runs out"""
+
+    def create_phone(self, code=None):
+        brand, _ = Brand.objects.get_or_create(name='Brand')
+        model, _ = Model.objects.get_or_create(brand=brand, name='Model')
+        return Phone.objects.create(
+            name=f'Phone {Phone.objects.count()}', code=code, brand=brand, model=model,
+            cost_price=Decimal('100.00'), selling_unite_price=Decimal('150.00')
+        )
+
+    def test_scramble_is_a_bijection(self):
+        self.assertEqual(len({codes.scramble(value) for value in range(codes.CODE_SPACE)}), codes.CODE_SPACE)
+        for value in (0, 1, 12345, codes.CODE_MASK):
+            self.assertEqual(codes.unscramble(codes.scramble(value)), value)
+            self.assertEqual(codes.decode(codes.encode(codes.scramble(value))), codes.scramble(value))
+
+    def test_batch_codes_are_unique_and_skip_existing(self):
+        legacy = codes.encode(codes.scramble(3))
+        self.create_phone(code=legacy)
+        self.assertEqual(codes.remaining_product_codes(), codes.CODE_SPACE - 1)
+
+        batch = codes.allocate_product_codes(500)
+        self.assertEqual(len(set(batch)), 500)
+        self.assertNotIn(legacy, batch)
+        self.assertEqual(codes.remaining_product_codes(), codes.CODE_SPACE - 501)
+        self.assertNotIn(self.create_phone().code, batch)
+
+    def test_exhausted_code_space(self):
+        ProductCodeSequence.objects.update_or_create(pk=codes.SEQUENCE_ID, defaults={'next_value': codes.CODE_SPACE - 3})
+        self.create_phone(code=codes.encode(codes.scramble(codes.CODE_SPACE - 1)))
+        self.assertEqual(codes.remaining_product_codes(), 2)
+
+        self.assertEqual(len(codes.allocate_product_codes(2)), 2)
+        self.assertEqual(codes.remaining_product_codes(), 0)
+        with self.assertRaises(codes.ProductCodeSpaceExhausted):
+            codes.allocate_product_code()
+
+
+class FastJSONTests(TestCase):
+    """The orjson renderer matches DRF's JSON output and round-trips through the parser"""
+
+    def test_matches_drf_and_round_trips(self):
+        data = {
+            'price': Decimal('1234.50'),
+            'created_at': timezone.make_aware(datetime(2026, 1, 2, 3, 4, 5, 678000)),
+            'day': date(2026, 1, 2),
+            'name': 'Line\u2028separator',
+            'counts': {1: 2},
+            'items': [{'quantity': 3, 'discount': None}],
+        }
+        rendered = FastJSONRenderer().render(data)
+        self.assertEqual(rendered, JSONRenderer().render(data))
+
+        parsed = FastJSONParser().parse(BytesIO(rendered))
+        # Bare Decimals become numbers, as in DRF; serializer DecimalFields already emit strings
+        self.assertEqual(Decimal(str(parsed['price'])), data['price'])
+        self.assertEqual(parsed['created_at'], '2026-01-02T03:04:05.678000Z')
+        self.assertEqual(parsed['day'], '2026-01-02')
+        self.assertEqual(parsed['name'], data['name'])
+        self.assertEqual(parsed['counts'], {'1': 2})
+        self.assertEqual(parsed['items'], data['items'])
+
+
+class CatalogSyncTests(TestCase):
+    """Changes since a snapshot include late commits, stock moves and deletions"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='till', password='secret'))
+        brand = Brand.objects.create(name='Brand')
+        model = Model.objects.create(brand=brand, name='Model')
+        self.phones = []
+        for index in range(3):
+            phone = Phone.objects.create(
+                name=f'Synced {index}', brand=brand, model=model,
+                cost_price=Decimal('100.00'), selling_unite_price=Decimal('150.00')
+            )
+            Stock.objects.create(product=phone, quantity=5)
+            self.phones.append(phone)
+
+    def test_overlap_covers_busy_timeout(self):
+        busy_timeout = settings.DATABASES['default'].get('OPTIONS', {}).get('timeout', 0)
+        self.assertGreaterEqual(catalog_views.sync_overlap(), timedelta(seconds=busy_timeout))
+
+    def test_changes_after_snapshot(self):
+        # Rows are stamped before this point, then nothing changes for a while
+        Product.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        Stock.objects.update(last_updated=timezone.now() - timedelta(hours=1))
+
+        snapshot = self.client.get('/api/catalog/snapshot/').json()
+        self.assertEqual(snapshot['count'], 3)
+        unchanged = self.client.get('/api/catalog/changes/', {'since': snapshot['token']}).json()
+        self.assertEqual((unchanged['count'], unchanged['deleted']), (0, []))
+
+        edited, restocked, deleted = self.phones
+        edited.selling_unite_price = Decimal('140.00')
+        edited.save()
+        Stock.objects.filter(product=restocked).update(quantity=9, last_updated=timezone.now())
+        deleted.delete()
+
+        changes = self.client.get('/api/catalog/changes/', {'since': snapshot['token']}).json()
+        self.assertEqual(changes['columns']['id'], [edited.id, restocked.id])
+        self.assertEqual(changes['columns']['price'][0], '140.00')
+        self.assertEqual(changes['columns']['stock'][1], 9)
+        self.assertEqual(changes['deleted'], [deleted.id])
+
+    def test_commit_delayed_by_busy_timeout_is_not_missed(self):
+        Product.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        Stock.objects.update(last_updated=timezone.now() - timedelta(hours=1))
+        started = timezone.now()
+        token = self.client.get('/api/catalog/snapshot/').json()['token']
+
+        # A write stamped before the snapshot that waited the whole busy timeout for the lock
+        busy_timeout = settings.DATABASES['default'].get('OPTIONS', {}).get('timeout', 0)
+        Product.objects.filter(pk=self.phones[0].pk).update(updated_at=started - timedelta(seconds=busy_timeout))
+
+        changes = self.client.get('/api/catalog/changes/', {'since': token}).json()
+        self.assertEqual(changes['columns']['id'], [self.phones[0].id])
+
+    def test_old_tombstones_are_pruned(self):
+        self.phones[0].delete()
+        DeletedProduct.objects.update(deleted_at=timezone.now() - timedelta(days=settings.CATALOG_SYNC_MAX_AGE_DAYS + 1))
+        self.phones[1].delete()
+        self.assertEqual(list(DeletedProduct.objects.values_list('product_id', flat=True)), [self.phones[1].id])
+
+    def test_token_older_than_sync_window_needs_snapshot(self):
+        expired = timezone.now() - timedelta(days=settings.CATALOG_SYNC_MAX_AGE_DAYS, minutes=1)
+        response = self.client.get('/api/catalog/changes/', {'since': catalog_views.encode_token(expired)})
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.json()['snapshot_required'])
+
+        recent = timezone.now() - timedelta(days=settings.CATALOG_SYNC_MAX_AGE_DAYS - 1)
+        response = self.client.get('/api/catalog/changes/', {'since': catalog_views.encode_token(recent)})
+        self.assertEqual(response.status_code, 200)
+
+
+class SearchTests(TestCase):
+    """Full-text search returns every match, best first, and falls back to icontains"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='cashier', password='secret'))
+        self.brand = Brand.objects.create(name='Samsung')
+        self.model = Model.objects.create(brand=self.brand, name='S24')
+
+    def create_phone(self, name, brand=None):
+        return Phone.objects.create(
+            name=name, brand=brand or self.brand, model=self.model,
+            cost_price=Decimal('100.00'), selling_unite_price=Decimal('150.00')
+        )
+
+    def names(self, url):
+        return [row['name'] for row in self.client.get(url).json()['results']]
+
+    def test_prefix_search_counts_every_match(self):
+        for index in range(25):
+            self.create_phone(f'Galaxy {index}')
+        self.create_phone('Pixel', Brand.objects.create(name='Google'))
+
+        response = self.client.get('/api/phones/?q=gal&page_size=10&page=3').json()
+        self.assertEqual(response['count'], 25)
+        self.assertEqual(len(response['results']), 5)
+        self.assertEqual(self.names('/api/phones/?q=goog'), ['Pixel'])
+        self.assertEqual(self.names('/api/phones/?q=nothing'), [])
+
+    def test_best_match_first(self):
+        self.create_phone('Galaxy S24')
+        self.create_phone('Samsung Galaxy S24')
+        self.assertEqual(self.names('/api/phones/?q=samsung'), ['Samsung Galaxy S24', 'Galaxy S24'])
+
+    def test_renaming_brand_reindexes_products(self):
+        self.create_phone('Galaxy S24')
+        self.brand.name = 'Renamed'
+        self.brand.save()
+        self.assertEqual(self.names('/api/phones/?q=renamed'), ['Galaxy S24'])
+
+    def test_icontains_fallback(self):
+        self.create_phone('Galaxy S24')
+        self.create_phone('Pixel', Brand.objects.create(name='Google'))
+        with mock.patch.object(search, 'is_available', return_value=False):
+            self.assertEqual(self.names('/api/phones/?q=laxy'), ['Galaxy S24'])
+            self.assertEqual(self.names('/api/phones/?q=goo pix'), ['Pixel'])
+
+
+class ConditionalGetTests(TestCase):
+    """Unchanged lists answer If-None-Match with 304; any write moves the ETag"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='buyer', password='secret'))
+        self.first = Supplier.objects.create(name='First')
+        self.second = Supplier.objects.create(name='Second')
+
+    def etag(self):
+        response = self.client.get('/api/suppliers/')
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.etag()
+        response = self.client.get('/api/suppliers/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+        other = self.client.get('/api/suppliers/?name=First', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(other.status_code, 200)
+
+    def test_update_changes_etag(self):
+        etag = self.etag()
+        self.first.tel = '0600000000'
+        self.first.save()
+        response = self.client.get('/api/suppliers/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_delete_changes_etag(self):
+        etag = self.etag()
+        self.first.delete()
+        response = self.client.get('/api/suppliers/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_delete_paired_with_insert_changes_etag(self):
+        etag = self.etag()
+        # Same row count and, once backdated, the same latest updated_at as before
+        stamp = Supplier.objects.get(pk=self.first.pk).updated_at
+        self.first.delete()
+        replacement = Supplier.objects.create(name='Replacement')
+        Supplier.objects.filter(pk=replacement.pk).update(updated_at=stamp)
+
+        response = self.client.get('/api/suppliers/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Replacement', [row['name'] for row in response.json()['results']])
+
+    def test_append_only_ledger_is_not_counted(self):
+        caisse = Caisse.objects.create(name='Main')
+        caisse.record_operation('DEPOSIT', Decimal('10.00'))
+        with CaptureQueriesContext(connection) as context:
+            etag = self.client.get('/api/caisse/')['ETag']
+        ledger = [query['sql'] for query in context.captured_queries if 'COUNT' in query['sql'] and 'api_caisseoperation' in query['sql']]
+        self.assertEqual(ledger, [])
+
+        self.assertEqual(self.client.get('/api/caisse/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        caisse.record_operation('DEPOSIT', Decimal('5.00'))
+        self.assertEqual(self.client.get('/api/caisse/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ResponseCacheTests(TransactionTestCase):
+    """Cached read responses must be replayed without queries and dropped once the data changes"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cashier', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        brand = Brand.objects.create(name='Brand')
+        model = Model.objects.create(brand=brand, name='Model')
+        self.phone = Phone.objects.create(
+            name='Phone', brand=brand, model=model,
+            cost_price=Decimal('100.00'), selling_unite_price=Decimal('150.00')
+        )
+        Stock.objects.create(product=self.phone, quantity=5)
+
+    def get_stock_quantity(self):
+        response = self.client.get(f'/api/phones/{self.phone.id}/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['stock_quantity']
+
+    def test_hit_runs_no_queries(self):
+        self.get_stock_quantity()
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.get_stock_quantity(), 5)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_sale_invalidates_stock(self):
+        self.assertEqual(self.get_stock_quantity(), 5)
+        response = self.client.post('/api/sales/record/', {
+            'sale_type': 'particular',
+            'items': [{'product_id': str(self.phone.id), 'quantity': '2'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.get_stock_quantity(), 3)
+
+    def test_brand_rename_invalidates_models(self):
+        self.client.get('/api/models/', {'all': 'true'})
+        brand = self.phone.brand
+        brand.name = 'Renamed'
+        brand.save()
+        response = self.client.get('/api/models/', {'all': 'true'})
+        self.assertEqual(response.json()[0]['brand_name'], 'Renamed')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Token lookups are remembered in the shared cache and forgotten on logout"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cashier', password='secret')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeated_requests_skip_token_lookup(self):
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 200)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/auth/user/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['token'], self.token.key)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_logout_invalidates_token(self):
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 200)
+        # Held in the default cache, which every worker reads, not in process memory
+        self.assertIsNotNone(cache.get(token_cache_key(self.token.key)))
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, 200)
+        self.assertIsNone(cache.get(token_cache_key(self.token.key)))
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 401)
+
+    def test_deleted_token_is_rejected(self):
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 200)
+        Token.objects.filter(pk=self.token.pk).delete()
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 401)
+
+
+class ReplicaRoutingTests(TestCase):
+    """Only the action itself reads from the replica; authentication stays on the primary"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(username='auditor', password='secret')
+        self.token = Token.objects.create(user=self.user)
+        self.caisse = Caisse.objects.create(name='Main')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_authentication_reads_primary(self):
+        reads = []
+
+        def db_for_read(router, model, **hints):
+            reads.append((model, routers._reading_from_replica.get()))
+            return routers.PRIMARY_DB
+
+        with mock.patch.object(routers, 'replica_available', return_value=True), \
+                mock.patch.object(routers, '_reopen_if_refreshed'), \
+                mock.patch.object(routers.PrimaryReplicaRouter, 'db_for_read', db_for_read):
+            response = self.client.get(f'/api/caisse/{self.caisse.pk}/report/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn((Token, False), reads)
+        self.assertNotIn((Token, True), reads)
+        self.assertIn((Caisse, True), reads)
+
+
+class RequestMetricsTests(TestCase):
+    """Requests are profiled per route and exposed to admins only"""
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.client = APIClient()
+
+    def test_routes_are_recorded(self):
+        admin = User.objects.create_superuser(username='admin', password='secret')
+        self.client.force_authenticate(admin)
+        Brand.objects.create(name='Brand')
+        self.client.get('/api/brands/', {'all': 'true'})
+
+        routes = self.client.get('/api/_metrics/').json()['routes']
+        self.assertEqual(routes['GET brand-list']['count'], 1)
+        self.assertGreaterEqual(routes['GET brand-list']['queries']['max'], 1)
+
+        response = self.client.get('/api/_metrics/', {'format': 'prometheus'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'smartstore_request_duration_seconds_count{method="GET",route="brand-list"} 1',
+            response.content.decode()
+        )
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(User.objects.create_user(username='cashier', password='secret'))
+        self.assertEqual(self.client.get('/api/_metrics/').status_code, 403)
+
+    def test_serializer_time_is_measured(self):
+        self.client.force_authenticate(User.objects.create_superuser(username='admin', password='secret'))
+        Brand.objects.create(name='First')
+        Brand.objects.create(name='Second')
+        represent = serializers.BrandSerializer.to_representation
+
+        def slow(serializer, instance):
+            time.sleep(0.02)
+            return represent(serializer, instance)
+
+        with mock.patch.object(serializers.BrandSerializer, 'to_representation', autospec=True, side_effect=slow):
+            self.client.get('/api/brands/', {'all': 'true'})
+
+        route = self.client.get('/api/_metrics/').json()['routes']['GET brand-list']
+        # Both brands serialized inside the view, counted once each and not as rendering
+        self.assertGreaterEqual(route['serialize_ms']['avg'], 40)
+        self.assertLess(route['render_ms']['avg'], 40)
+        self.assertLessEqual(route['serialize_ms']['avg'], route['latency_ms']['avg'])
+        prometheus = self.client.get('/api/_metrics/', {'format': 'prometheus'}).content.decode()
+        self.assertIn('smartstore_serialize_seconds_total{method="GET",route="brand-list"}', prometheus)
+
+
+class RecordPurchaseTests(TestCase):
+    """Purchases created in one pass carry the same line and header totals as line-by-line saves"""
+
+    ITEMS = [
+        # 3 x 12.35 less 10%: 33.345 rounds half up
+        {'product_id': 1, 'product_name': 'Case', 'product_code': 'A', 'quantity': 3,
+         'unit_price': Decimal('12.35'), 'discount': Decimal('10')},
+        # Discounts above 100 are absolute amounts
+        {'product_id': 2, 'product_name': 'Phone', 'product_code': 'B', 'quantity': 2,
+         'unit_price': Decimal('100.00'), 'discount': Decimal('150')},
+    ]
+
+    def setUp(self):
+        self.supplier = Supplier.objects.create(name='Supplier')
+
+    def lines(self, purchase):
+        return list(purchase.items.order_by('product_id').values_list('ht', 'tva', 'ttc'))
+
+    def test_totals_with_tva(self):
+        purchase = record_purchase(self.supplier, self.ITEMS, reference_number='R-1', date=date(2026, 1, 1))
+        purchase.refresh_from_db()
+        self.assertEqual(self.lines(purchase), [
+            (Decimal('33.35'), Decimal('6.34'), Decimal('39.69')),
+            (Decimal('50.00'), Decimal('9.50'), Decimal('59.50')),
+        ])
+        self.assertEqual((purchase.ht, purchase.tva, purchase.ttc), (Decimal('83.35'), Decimal('15.84'), Decimal('99.19')))
+        self.assertEqual(purchase.amount_remaining, Decimal('99.19'))
+        self.assertEqual(purchase.payment_status, 'PENDING')
+
+        # Same figures as saving each line and recomputing the header
+        legacy = Purchase.objects.create(supplier=self.supplier, reference_number='R-2', date=date(2026, 1, 1))
+        for item in self.ITEMS:
+            PurchaseItem(purchase=legacy, ht=0, tva=0, ttc=0, **item).save()
+        legacy.update_totals()
+        legacy.refresh_from_db()
+        self.assertEqual(self.lines(legacy), self.lines(purchase))
+        self.assertEqual((legacy.ht, legacy.tva, legacy.ttc), (purchase.ht, purchase.tva, purchase.ttc))
+
+    def test_totals_without_tva(self):
+        purchase = record_purchase(
+            self.supplier, self.ITEMS, reference_number='R-3', date=date(2026, 1, 1), soumis_tva=False
+        )
+        purchase.refresh_from_db()
+        self.assertEqual(self.lines(purchase), [
+            (Decimal('33.35'), Decimal('0.00'), Decimal('33.35')),
+            (Decimal('50.00'), Decimal('0.00'), Decimal('50.00')),
+        ])
+        self.assertEqual((purchase.ht, purchase.tva, purchase.ttc), (Decimal('83.35'), Decimal('0.00'), Decimal('83.35')))
+
+    def test_query_count_does_not_grow_with_lines(self):
+        def queries(count, reference):
+            items = [dict(self.ITEMS[0], product_id=index) for index in range(count)]
+            with CaptureQueriesContext(connection) as captured:
+                record_purchase(self.supplier, items, reference_number=reference, date=date(2026, 1, 1))
+            return len(captured.captured_queries)
+
+        self.assertEqual(queries(1, 'R-4'), queries(50, 'R-5'))
+
+
+class PurchaseReceiptTests(TestCase):
+    """Receiving a purchase adds every line to stock exactly once"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='buyer', password='secret'))
+        brand = Brand.objects.create(name='Brand')
+        model = Model.objects.create(brand=brand, name='Model')
+        self.phones = [
+            Phone.objects.create(
+                name=f'Phone {index}', brand=brand, model=model,
+                cost_price=Decimal('100.00'), selling_unite_price=Decimal('150.00')
+            )
+            for index in range(3)
+        ]
+        Stock.objects.create(product=self.phones[0], quantity=2)
+        supplier = Supplier.objects.create(name='Supplier')
+        response = self.client.post('/api/purchases/create_purchase/', {
+            'supplier_id': supplier.id,
+            'reference_number': 'REF-1',
+            'date': '2026-01-01',
+            'items': [
+                {'product_id': str(phone.id), 'product_name': phone.name, 'quantity': '4', 'unit_price': '100.00'}
+                for phone in self.phones
+            ] + [
+                {'product_id': str(self.phones[0].id), 'product_name': 'Again', 'quantity': '1', 'unit_price': '100.00'}
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.purchase_id = response.json()['id']
+
+    def stock_levels(self):
+        return [Stock.objects.get(product=phone).quantity for phone in self.phones]
+
+    def test_receive_once(self):
+        response = self.client.post(f'/api/purchases/{self.purchase_id}/receive/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['already_received'])
+        self.assertEqual(response.json()['stock_created'], 2)
+        self.assertEqual(self.stock_levels(), [7, 4, 4])
+
+        response = self.client.post(f'/api/purchases/{self.purchase_id}/receive/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['already_received'])
+        self.assertEqual(self.stock_levels(), [7, 4, 4])
+
+    def test_edit_cannot_rearm_receipt(self):
+        self.assertEqual(self.client.post(f'/api/purchases/{self.purchase_id}/receive/').status_code, 200)
+        received_at = Purchase.objects.get(pk=self.purchase_id).received_at
+
+        response = self.client.patch(f'/api/purchases/{self.purchase_id}/', {'received_at': None}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Purchase.objects.get(pk=self.purchase_id).received_at, received_at)
+
+        response = self.client.post(f'/api/purchases/{self.purchase_id}/receive/')
+        self.assertTrue(response.json()['already_received'])
+        self.assertEqual(self.stock_levels(), [7, 4, 4])
+
+    def test_edit_cannot_mark_paid(self):
+        response = self.client.patch(f'/api/purchases/{self.purchase_id}/', {'payment_status': 'PAID'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f'/api/purchases/{self.purchase_id}/', {'payment_status': 'CANCELLED'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Purchase.objects.get(pk=self.purchase_id).payment_status, 'CANCELLED')
+
+
+class PurchasePaymentTests(TestCase):
+    """Payments move a purchase's paid/remaining amounts and can debit the caisse"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='buyer', password='secret'))
+        supplier = Supplier.objects.create(name='Supplier')
+        self.purchase = Purchase.objects.create(
+            supplier=supplier, reference_number='PAY-1', date=date(2026, 1, 1),
+            ttc=Decimal('100.00'), amount_remaining=Decimal('100.00')
+        )
+        self.caisse = Caisse.objects.create(name='Main')
+        self.caisse.record_operation('DEPOSIT', Decimal('50.00'))
+
+    def pay(self, **data):
+        return self.client.post(f'/api/purchases/{self.purchase.id}/pay/', data, format='json')
+
+    def test_partial_then_full_payment(self):
+        response = self.pay(amount='30.00', from_caisse=True)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['payment_status'], 'PARTIAL')
+        self.assertEqual(self.caisse.current_balance, Decimal('20.00'))
+        self.assertEqual(self.client.get('/api/purchases/unpaid/').json()['count'], 1)
+
+        self.assertEqual(self.pay(amount='80.00').status_code, 400)
+        self.assertEqual(self.pay(amount='70.00', payment_method='CHECK').status_code, 201)
+
+        self.purchase.refresh_from_db()
+        self.assertEqual((self.purchase.amount_paid, self.purchase.amount_remaining), (Decimal('100.00'), Decimal('0.00')))
+        self.assertEqual(self.purchase.payment_status, 'PAID')
+        self.assertEqual(len(self.client.get(f'/api/purchases/{self.purchase.id}/payments/').json()), 2)
+        self.assertEqual(self.client.get('/api/purchases/unpaid/').json()['count'], 0)
+
+    def test_insufficient_funds_records_nothing(self):
+        response = self.pay(amount='60.00', from_caisse=True)
+        self.assertEqual(response.status_code, 400)
+        self.purchase.refresh_from_db()
+        self.assertEqual(self.purchase.amount_paid, Decimal('0.00'))
+        self.assertFalse(self.purchase.payments.exists())
+        self.assertEqual(self.caisse.current_balance, Decimal('50.00'))
+
+
+class SparseFieldsetTests(TestCase):
+    """?fields= and ?omit= prune both the rendered fields and the queries behind them"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cashier', password='secret')
+        brand = Brand.objects.create(name='Brand')
+        model = Model.objects.create(brand=brand, name='Model')
+        for index in range(3):
+            phone = Phone.objects.create(
+                name=f'Sparse {index}', brand=brand, model=model,
+                cost_price=Decimal('100.00'), selling_unite_price=Decimal('150.00')
+            )
+            Stock.objects.create(product=phone, quantity=5)
+            PhoneImage.objects.create(phone=phone, image='phone_images/a.jpg', thumbnails={'source': 'phone_images/a.jpg'})
+        supplier = Supplier.objects.create(name='Supplier')
+        purchase = Purchase.objects.create(supplier=supplier, reference_number='SPARSE-1', date=date(2026, 1, 1))
+        PurchaseItem.objects.create(
+            purchase=purchase, product_id=phone.id, product_name=phone.name, quantity=1, unit_price=Decimal('100.00')
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results'], [query['sql'] for query in context.captured_queries]
+
+    def test_fields_keep_only_listed_columns(self):
+        rows, queries = self.get('/api/phones/?fields=id,name')
+        self.assertEqual([sorted(row) for row in rows], [['id', 'name']] * 3)
+        self.assertEqual(len(queries), 2)  # COUNT(*) and the page
+        page = queries[-1]
+        self.assertNotIn('api_brand', page)
+        self.assertNotIn('api_stock', page)
+        self.assertNotIn('"description"', page)
+
+    def test_omit_drops_prefetch(self):
+        rows, queries = self.get('/api/phones/?omit=images')
+        self.assertNotIn('images', rows[0])
+        self.assertIn('stock_quantity', rows[0])
+        self.assertFalse(any('api_phoneimage' in sql for sql in queries))
+
+        rows, queries = self.get('/api/phones/')
+        self.assertIn('images', rows[0])
+        self.assertTrue(any('api_phoneimage' in sql for sql in queries))
+
+    def test_omit_nested_purchase_lines(self):
+        rows, queries = self.get('/api/purchases/?omit=items')
+        self.assertNotIn('items', rows[0])
+        self.assertIn('supplier_details', rows[0])
+        self.assertFalse(any('api_purchaseitem' in sql for sql in queries))
+
+
+class FeedPaginationTests(TestCase):
+    """Cursor pages are stable under inserts and break date ties by id; page numbers stay the default"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='buyer', password='secret'))
+        self.supplier = Supplier.objects.create(name='Supplier')
+        self.ids = [self.create_purchase(date(2026, 1, 1 + index // 2)).id for index in range(6)]
+
+    def create_purchase(self, day):
+        count = Purchase.objects.count()
+        return Purchase.objects.create(supplier=self.supplier, reference_number=f'FEED-{count}', date=day)
+
+    def ids_of(self, body):
+        return [row['id'] for row in body['results']]
+
+    def test_cursor_pages_walk_every_row_once(self):
+        first = self.client.get('/api/purchases/?pagination=cursor&page_size=2&omit=items').json()
+        self.assertNotIn('count', first)
+        # Newest date first; rows sharing a date by descending id
+        self.assertEqual(self.ids_of(first), [self.ids[5], self.ids[4]])
+
+        # Rows inserted while scrolling land before the cursor and do not shift later pages
+        self.create_purchase(date(2026, 2, 1))
+        self.create_purchase(date(2026, 1, 3))
+        seen = self.ids_of(first)
+        body = first
+        while body['cursor']:
+            body = self.client.get('/api/purchases/', {'cursor': body['cursor'], 'page_size': 2, 'omit': 'items'}).json()
+            seen.extend(self.ids_of(body))
+        self.assertEqual(seen, list(reversed(self.ids)))
+        self.assertIsNone(body['next'])
+
+    def test_page_mode_by_default(self):
+        body = self.client.get('/api/purchases/?page_size=4&page=2&omit=items').json()
+        self.assertEqual(body['count'], 6)
+        self.assertEqual(len(body['results']), 2)
+        self.assertIn('previous', body)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/purchases/?cursor=garbage').status_code, 404)
+
+
+class UnpaidPurchasesTests(TestCase):
+    """Unpaid purchases come oldest first in both pagination modes, in a fixed number of queries"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='buyer', password='secret'))
+        self.supplier = Supplier.objects.create(name='Supplier')
+        # Two per day, entered newest first so ids do not follow dates
+        self.ids = []
+        for index in reversed(range(6)):
+            self.ids.insert(0, self.create_purchase(date(2026, 1, 1 + index // 2)).id)
+        Purchase.objects.filter(pk=self.create_purchase(date(2025, 12, 1)).pk).update(payment_status='PAID')
+
+    def create_purchase(self, day):
+        count = Purchase.objects.count()
+        purchase = Purchase.objects.create(supplier=self.supplier, reference_number=f'UNPAID-{count}', date=day)
+        PurchaseItem.objects.create(
+            purchase=purchase, product_id=1, product_name='Phone', quantity=1, unit_price=Decimal('100.00')
+        )
+        return purchase
+
+    def ids_of(self, body):
+        return [row['id'] for row in body['results']]
+
+    def expected(self):
+        # Oldest date first; rows sharing a date by ascending id
+        return [row.id for row in sorted(Purchase.objects.exclude(payment_status='PAID'), key=lambda row: (row.date, row.id))]
+
+    def test_page_numbers_oldest_first(self):
+        body = self.client.get('/api/purchases/unpaid/', {'page_size': 100}).json()
+        self.assertEqual(body['count'], 6)
+        self.assertEqual(self.ids_of(body), self.expected())
+
+    def test_cursor_pages_oldest_first(self):
+        body = self.client.get('/api/purchases/unpaid/', {'pagination': 'cursor', 'page_size': 2}).json()
+        seen = self.ids_of(body)
+        while body['cursor']:
+            body = self.client.get('/api/purchases/unpaid/', {'cursor': body['cursor'], 'page_size': 2}).json()
+            seen.extend(self.ids_of(body))
+        self.assertEqual(seen, self.expected())
+
+    def test_query_count_is_constant(self):
+        def queries():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get('/api/purchases/unpaid/', {'page_size': 100})
+            self.assertEqual(response.status_code, 200)
+            return len(context.captured_queries)
+
+        baseline = queries()
+        for index in range(5):
+            self.create_purchase(date(2026, 2, 1 + index))
+        self.assertEqual(queries(), baseline)
+        self.assertEqual(baseline, 3)  # COUNT(*), the page with its supplier, the items
+
+
+class SupplierBalanceTests(TestCase):
+    """Supplier balances and aging are aggregated from purchase headers"""
+
+    def test_balance_and_aging(self):
+        supplier = Supplier.objects.create(name='Supplier')
+        for reference, age, ttc, paid, payment_status in (
+            ('A', 5, '100.00', '0.00', 'PENDING'),
+            ('B', 45, '200.00', '50.00', 'PARTIAL'),
+            ('C', 200, '300.00', '0.00', 'PENDING'),
+            ('D', 10, '999.00', '0.00', 'CANCELLED'),
+        ):
+            Purchase.objects.create(
+                supplier=supplier, reference_number=reference, date=date(2026, 6, 30) - timedelta(days=age),
+                ttc=Decimal(ttc), amount_paid=Decimal(paid), amount_remaining=Decimal(ttc) - Decimal(paid),
+                payment_status=payment_status, soumis_tva=False
+            )
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='buyer', password='secret'))
+
+        balance = client.get(f'/api/suppliers/{supplier.id}/balance/', {'as_of': '2026-06-30'}).json()
+
+        self.assertEqual(balance['purchase_count'], 3)
+        self.assertEqual(Decimal(str(balance['outstanding'])), Decimal('550.00'))
+        self.assertEqual(
+            {label: Decimal(str(amount)) for label, amount in balance['aging'].items()},
+            {'0-30': Decimal('100'), '31-60': Decimal('150'), '61-90': Decimal('0'), '90+': Decimal('300')}
+        )
+
+
+class ImagePipelineTests(TestCase):
+    """Uploaded pictures are recompressed without metadata and get their thumbnails"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, IMAGE_PIPELINE_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='manager', password='secret'))
+        brand = Brand.objects.create(name='Brand')
+        model = Model.objects.create(brand=brand, name='Model')
+        self.phone = Phone.objects.create(
+            name='Phone', brand=brand, model=model,
+            cost_price=Decimal('100.00'), selling_unite_price=Decimal('150.00')
+        )
+
+    def upload(self, name, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/phone-images/upload_multiple/', {
+                'phone': self.phone.id,
+                'images': [SimpleUploadedFile(name, content, 'image/jpeg')],
+            }, format='multipart')
+
+    def test_thumbnails(self):
+        picture = Image.new('RGB', (3000, 2000), 'red')
+        exif = picture.getexif()
+        exif[0x010f] = 'Camera maker'
+        buffer = BytesIO()
+        picture.save(buffer, 'JPEG', exif=exif)
+        self.assertEqual(self.upload('photo.jpg', buffer.getvalue()).status_code, 201)
+
+        image = PhoneImage.objects.get()
+        self.assertEqual(image.thumbnails['source'], image.image.name)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'phone_images')), [os.path.basename(image.image.name)])
+        for size, bound in (('grid', 200), ('detail', 600), ('zoom', 1200)):
+            with Image.open(os.path.join(self.media_root, image.thumbnails[size])) as thumbnail:
+                self.assertEqual(max(thumbnail.size), bound)
+                self.assertEqual(dict(thumbnail.getexif()), {})
+
+        row = self.client.get(f'/api/phones/{self.phone.id}/').json()['images'][0]
+        self.assertTrue(row['thumbnail'].endswith(image.thumbnails['grid']))
+
+    def test_rejects_non_images(self):
+        self.assertEqual(self.upload('photo.jpg', b'not an image').status_code, 400)
+        self.assertFalse(PhoneImage.objects.exists())
@@ -15,6 +15,7 @@ router.register(r'suppliers', views.SupplierViewSet)
 router.register(r'purchases', views.PurchaseViewSet)
 router.register(r'caisse', views.CaisseViewSet)
 router.register(r'caisse-operations', views.CaisseOperationViewSet)
+router.register(r'catalog', views.CatalogViewSet, basename='catalog')
 
 urlpatterns = [
     # Authentication endpoints
@@ -22,6 +23,9 @@ urlpatterns = [
     path('auth/login/', views.LoginView.as_view(), name='login'),
     path('auth/logout/', views.LogoutView.as_view(), name='logout'),
     path('auth/user/', views.UserView.as_view(), name='user'),
+
+    # Request metrics (admin only)
+    path('_metrics/', views.MetricsView.as_view(), name='metrics'),
     
     # API router
     path('', include(router.urls)),
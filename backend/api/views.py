@@ -2,6 +2,7 @@ from django.shortcuts import render, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.db import transaction, models
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.http import JsonResponse
 from django.middleware.csrf import get_token
 from django.views.decorators.csrf import ensure_csrf_cookie
@@ -10,12 +11,15 @@ from django.core.files.base import ContentFile
 from django.conf import settings
 from rest_framework.authtoken.models import Token
 import re
+import logging
 
 import urllib.request
 import urllib.error
 import json
 import tempfile
 
+logger = logging.getLogger(__name__)
+
 # Simple HTML parsing using string operations
 def extract_image_urls_from_html(html_content):
     """Extract image URLs from HTML content using simple string operations"""
@@ -117,7 +121,7 @@ def download_image(url):
             
             return temp_file.name
     except Exception as e:
-        print(f"Error downloading image: {str(e)}")
+        logger.warning(f"Error downloading image: {str(e)}")
         return None
         
 # Function to download a web page
@@ -139,7 +143,7 @@ def download_webpage(url):
             with open(target_file, 'r', encoding='utf-8') as f:
                 return f.read()
         else:
-            print(f"Local GSMArena file not found: {target_file}")
+            logger.warning(f"Local GSMArena file not found: {target_file}")
             return None
     
     # For non-GSMArena URLs, use the original method
@@ -155,7 +159,7 @@ def download_webpage(url):
             # Read the content
             return response.read().decode('utf-8')
     except Exception as e:
-        print(f"Error downloading page: {str(e)}")
+        logger.warning(f"Error downloading page: {str(e)}")
         return None
 
 from rest_framework import viewsets, status, permissions
@@ -184,7 +188,19 @@ import random
 import string
 
 # Import pagination class from purchase_views.py
-from .purchase_views import SupplierViewSet, PurchaseViewSet, StandardResultsSetPagination
+from .purchase_views import SupplierViewSet, PurchaseViewSet, StandardResultsSetPagination, FeedPagination
+from .catalog_views import CatalogViewSet
+from .metrics_views import MetricsView
+from .mixins import (
+    CachedResponseMixin, ConditionalGetMixin, QueryPlanMixin, ReplicaReadMixin, SparseFieldsetMixin
+)
+from . import response_cache
+from .response_cache import invalidate_responses
+from .authentication import forget_token
+from .images import validate_upload
+from .search import search_queryset
+from .services import post_sale_to_caisse
+from .reports import caisse_report, BUCKETS
 
 # Authentication Views
 @method_decorator(ensure_csrf_cookie, name='dispatch')
@@ -202,14 +218,11 @@ class LoginView(APIView):
     permission_classes = [AllowAny]
     
     def post(self, request):
-        print(f"Login attempt with data: {request.data}")
-        print(f"Request headers: {request.headers}")
-        
         username = request.data.get('username')
         password = request.data.get('password')
         
         if not username or not password:
-            print("Login failed: Missing username or password")
+            logger.info("Login failed: Missing username or password")
             return Response(
                 {'error': 'Please provide both username and password'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -225,7 +238,7 @@ class LoginView(APIView):
                 # Login the user (for session-based auth as well)
                 login(request, user)
                 
-                print(f"User {username} logged in successfully with token")
+                logger.info(f"User {username} logged in successfully with token")
                 
                 # Return user data and token
                 user_data = UserSerializer(user).data
@@ -236,13 +249,13 @@ class LoginView(APIView):
                     status=status.HTTP_200_OK
                 )
             else:
-                print(f"Login failed for user {username}: Invalid credentials")
+                logger.info(f"Login failed for user {username}: Invalid credentials")
                 return Response(
                     {'error': 'Invalid credentials'},
                     status=status.HTTP_401_UNAUTHORIZED
                 )
         except Exception as e:
-            print(f"Login error: {str(e)}")
+            logger.exception(f"Login error: {str(e)}")
             return Response(
                 {'error': f'Login failed: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -254,10 +267,11 @@ class LogoutView(APIView):
     def post(self, request):
         # Delete the user's token
         try:
+            forget_token(request.user.auth_token.key)
             request.user.auth_token.delete()
-            print(f"Token deleted for user {request.user.username}")
+            logger.info(f"Token deleted for user {request.user.username}")
         except Exception as e:
-            print(f"Error deleting token: {str(e)}")
+            logger.warning(f"Error deleting token: {str(e)}")
         
         # Logout from session-based auth
         logout(request)
@@ -271,28 +285,23 @@ class UserView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        print(f"User view accessed by: {request.user.username}")
-        print(f"Auth header: {request.META.get('HTTP_AUTHORIZATION', 'None')}")
-        
-        # Get the user's token
-        try:
-            token = Token.objects.get(user=request.user)
-            user_data = UserSerializer(request.user).data
-            user_data['token'] = token.key
-            return Response(user_data, status=status.HTTP_200_OK)
-        except Token.DoesNotExist:
-            # If no token exists, create one
-            token = Token.objects.create(user=request.user)
-            user_data = UserSerializer(request.user).data
-            user_data['token'] = token.key
-            return Response(user_data, status=status.HTTP_200_OK)
+        # Token-authenticated requests already carry the token
+        token = request.auth
+        if not isinstance(token, Token):
+            # Session login: get the user's token, creating one if none exists
+            token, created = Token.objects.get_or_create(user=request.user)
+        user_data = UserSerializer(request.user).data
+        user_data['token'] = token.key
+        return Response(user_data, status=status.HTTP_200_OK)
 
 # Brand ViewSet
-class BrandViewSet(viewsets.ModelViewSet):
+class BrandViewSet(CachedResponseMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
     permission_classes = [AllowAny]
     pagination_class = StandardResultsSetPagination
+    version_sources = ((Brand, 'updated_at'),)
+    cache_tables = (response_cache.BRAND,)
     
     def get_queryset(self):
         queryset = Brand.objects.all()
@@ -303,20 +312,30 @@ class BrandViewSet(viewsets.ModelViewSet):
             # Case-insensitive search (contains)
             queryset = queryset.filter(name__icontains=name)
 
+        queryset = queryset.order_by('name')
+
+        # Full-text prefix search, ranked by relevance
+        q = self.request.query_params.get('q', None)
+        if q:
+            queryset = search_queryset(queryset, 'brand', q, ('name',))
+
         # If all=true, return all brands (pagination will be handled in the frontend or by custom logic)
         if all_param:
             self.pagination_class = None
         else:
             self.pagination_class = StandardResultsSetPagination
 
-        return queryset.order_by('name')
+        return queryset
 
 # Model ViewSet
-class ModelViewSet(viewsets.ModelViewSet):
+class ModelViewSet(CachedResponseMixin, ConditionalGetMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Model.objects.all()
     serializer_class = ModelSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
+    select_related_fields = ('brand',)
+    version_sources = ((Model, 'updated_at'), (Brand, 'updated_at'))  # brand_name comes from Brand
+    cache_tables = (response_cache.MODEL, response_cache.BRAND)
     
     def get_queryset(self):
         queryset = Model.objects.all()
@@ -374,6 +393,13 @@ class PhoneImageViewSet(viewsets.ModelViewSet):
         images = request.FILES.getlist('images')
         if not images:
             return Response({'error': 'No images provided'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Reject anything that is not an image before storing; recompression and thumbnails follow in the background
+        try:
+            for image_file in images:
+                validate_upload(image_file)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             
         # Process color variant and primary status
         color_variant = request.data.get('color_variant', '')
@@ -381,6 +407,7 @@ class PhoneImageViewSet(viewsets.ModelViewSet):
         if make_primary:
             # If this is primary, update other images for this phone to non-primary
             PhoneImage.objects.filter(phone=phone, is_primary=True).update(is_primary=False)
+            invalidate_responses(response_cache.PHONE_IMAGE)
             
         # Save all images
         phone_images = []
@@ -514,12 +541,20 @@ class PhoneImageViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 # Phone ViewSet
-class PhoneViewSet(viewsets.ModelViewSet):
+class PhoneViewSet(CachedResponseMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Phone.objects.all()
     serializer_class = PhoneSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
     http_method_names = ['get', 'post', 'put', 'patch', 'delete', 'head', 'options']
+    # Relations read by PhoneSerializer (brand_name, model_name, stock_quantity, images)
+    select_related_fields = ('brand', 'model', 'stock')
+    prefetch_related_fields = ('images',)
+    sparse_field_dependencies = {'stock_quantity': ('stock__quantity',)}
+    cache_tables = (
+        response_cache.PRODUCT, response_cache.BRAND, response_cache.MODEL,
+        response_cache.STOCK, response_cache.PHONE_IMAGE,
+    )
     
     def get_queryset(self):
         queryset = self.queryset
@@ -549,6 +584,14 @@ class PhoneViewSet(viewsets.ModelViewSet):
         if name:
             queryset = queryset.filter(name__icontains=name)
             
+        # Full-text prefix search over name, code, brand, model, color and storage
+        q = self.request.query_params.get('q', None)
+        if q:
+            queryset = search_queryset(
+                queryset, 'phone', q,
+                ('name', 'code', 'brand__name', 'model__name', 'color')
+            )
+            
         # Search by code if provided
         code = self.request.query_params.get('code', None)
         if code:
@@ -632,12 +675,19 @@ class PhoneViewSet(viewsets.ModelViewSet):
         
         if not image and not image_url:
             return Response({'error': 'Either image file or image URL is required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if image and not image_url:
+            try:
+                validate_upload(image)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             
         # Check if this should be the primary image
         is_primary = request.data.get('is_primary', False)
         if is_primary:
             # Update existing primary images to non-primary
             PhoneImage.objects.filter(phone=phone, is_primary=True).update(is_primary=False)
+            invalidate_responses(response_cache.PHONE_IMAGE)
             
         # Get highest sort_order
         highest_order = PhoneImage.objects.filter(phone=phone).order_by('-sort_order').first()
@@ -758,11 +808,19 @@ class PhoneViewSet(viewsets.ModelViewSet):
         return response
 
 # Accessory ViewSet
-class AccessoryViewSet(viewsets.ModelViewSet):
+class AccessoryViewSet(CachedResponseMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Accessory.objects.all()
     serializer_class = AccessorySerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
+    # Relations read by AccessorySerializer (brand_name, stock_quantity, compatible_phones_info)
+    select_related_fields = ('brand', 'stock')
+    prefetch_related_fields = ('compatible_phones',)
+    sparse_field_dependencies = {
+        'stock_quantity': ('stock__quantity',),
+        'compatible_phones_info': ('compatible_phones',),
+    }
+    cache_tables = (response_cache.PRODUCT, response_cache.BRAND, response_cache.STOCK)
     
     def get_queryset(self):
         queryset = Accessory.objects.all()
@@ -792,6 +850,11 @@ class AccessoryViewSet(viewsets.ModelViewSet):
         if name is not None:
             queryset = queryset.filter(name__icontains=name)
         
+        # Full-text prefix search over name, code, brand and color
+        q = self.request.query_params.get('q', None)
+        if q:
+            queryset = search_queryset(queryset, 'accessory', q, ('name', 'code', 'brand__name', 'color'))
+        
         return queryset
     
     def perform_create(self, serializer):
@@ -800,11 +863,13 @@ class AccessoryViewSet(viewsets.ModelViewSet):
         Stock.objects.create(product=accessory, quantity=0)
 
 # Stock ViewSet
-class StockViewSet(viewsets.ReadOnlyModelViewSet):
+class StockViewSet(CachedResponseMixin, QueryPlanMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Stock.objects.all()
     serializer_class = StockSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
+    select_related_fields = ('product',)
+    cache_tables = (response_cache.STOCK, response_cache.PRODUCT)
     
     def get_queryset(self):
         queryset = Stock.objects.all()
@@ -852,12 +917,18 @@ class StockViewSet(viewsets.ReadOnlyModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class InsufficientStockError(Exception):
+    """Raised inside a sale transaction when stock ran out since validation"""
+
 # Sale ViewSet
-class SaleViewSet(viewsets.ModelViewSet):
+class SaleViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Sale.objects.all().order_by('-sale_date')
     serializer_class = SaleSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = FeedPagination
+    keyset_field = 'sale_date'
+    select_related_fields = ('sold_by',)
+    prefetch_related_fields = ('items__product',)
     
     def get_queryset(self):
         queryset = Sale.objects.all().order_by('-sale_date')
@@ -900,71 +971,102 @@ class SaleViewSet(viewsets.ModelViewSet):
         serializer = RecordSaleSerializer(data=request.data)
         
         if serializer.is_valid():
-            with transaction.atomic():
-                # Create the sale
-                sale = Sale.objects.create(
-                    sale_type=serializer.validated_data['sale_type'],
-                    customer_name=serializer.validated_data.get('customer_name', ''),
-                    total_amount=0,  # Will be calculated below
-                    sold_by=request.user
-                )
-                
-                total_amount = 0
-                
-                # Create sale items and update stock
-                for item_data in serializer.validated_data['items']:
-                    product = item_data['product']
-                    quantity = item_data['quantity']
-                    price = item_data['price']
-                    
-                    # Create sale item
-                    SaleItem.objects.create(
-                        sale=sale,
-                        product=product,
-                        quantity_sold=quantity,
-                        price_per_item=price
+            items = serializer.validated_data['items']
+            
+            # Total quantity per product, as the same product may appear on several lines
+            quantities = {}
+            for item_data in items:
+                product_id = item_data['product'].id
+                quantities[product_id] = quantities.get(product_id, 0) + item_data['quantity']
+            
+            try:
+                with transaction.atomic():
+                    # Create the sale
+                    sale = Sale.objects.create(
+                        sale_type=serializer.validated_data['sale_type'],
+                        customer_name=serializer.validated_data.get('customer_name', ''),
+                        total_amount=0,  # Will be calculated below
+                        sold_by=request.user,
+                        payment_method=serializer.validated_data['payment_method'],
+                        add_to_caisse=serializer.validated_data['add_to_caisse']
                     )
                     
-                    # Update stock
-                    stock = Stock.objects.get(product=product)
-                    stock.quantity -= quantity
-                    stock.save()
+                    # Decrement all stock rows in one conditional UPDATE so concurrent sales
+                    # of the last units cannot both succeed; abort the whole sale otherwise
+                    if not Stock.decrement_many(quantities):
+                        raise InsufficientStockError()
                     
-                    # Add to total amount
-                    total_amount += price * quantity
-                
-                # Update sale total
-                sale.total_amount = total_amount
-                
-                # Generate invoice if requested
-                if serializer.validated_data.get('generate_invoice', False):
-                    # Generate a unique invoice number
-                    invoice_number = self._generate_invoice_number()
+                    # Create all sale items in one batch
+                    SaleItem.objects.bulk_create([
+                        SaleItem(
+                            sale=sale,
+                            product=item_data['product'],
+                            quantity_sold=item_data['quantity'],
+                            price_per_item=item_data['price']
+                        )
+                        for item_data in items
+                    ])
                     
-                    # Create the invoice
-                    Invoice.objects.create(
-                        sale=sale,
-                        invoice_number=invoice_number,
-                        total_amount=total_amount,
-                        customer_info=serializer.validated_data.get('customer_name', '')
-                    )
+                    total_amount = sum(item_data['price'] * item_data['quantity'] for item_data in items)
                     
-                    sale.has_invoice = True
-                
-                sale.save()
-                
-                return Response(
-                    {
-                        'success': 'Sale recorded successfully',
-                        'sale_id': sale.id,
-                        'total_amount': total_amount,
-                        'has_invoice': sale.has_invoice
-                    },
-                    status=status.HTTP_201_CREATED
-                )
+                    # Update sale total
+                    sale.total_amount = total_amount
+                    
+                    # Generate invoice if requested
+                    if serializer.validated_data.get('generate_invoice', False):
+                        # Generate a unique invoice number
+                        invoice_number = self._generate_invoice_number()
+                        
+                        # Create the invoice
+                        Invoice.objects.create(
+                            sale=sale,
+                            invoice_number=invoice_number,
+                            total_amount=total_amount,
+                            customer_info=serializer.validated_data.get('customer_name', '')
+                        )
+                        
+                        sale.has_invoice = True
+                    
+                    # Post cash sales to the register now that the total is final
+                    post_sale_to_caisse(sale)
+                    
+                    sale.save()
+            except InsufficientStockError:
+                return self._stock_conflict_response(items, quantities)
+            
+            return Response(
+                {
+                    'success': 'Sale recorded successfully',
+                    'sale_id': sale.id,
+                    'total_amount': total_amount,
+                    'has_invoice': sale.has_invoice
+                },
+                status=status.HTTP_201_CREATED
+            )
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    def _stock_conflict_response(self, items, quantities):
+        """Build a 409 response naming the products that ran out since validation"""
+        products = {item_data['product'].id: item_data['product'] for item_data in items}
+        stocks = Stock.objects.in_bulk(list(quantities), field_name='product_id')
+        
+        shortages = []
+        for product_id, quantity in quantities.items():
+            stock = stocks.get(product_id)
+            available = stock.quantity if stock else 0
+            if available < quantity:
+                product = products[product_id]
+                shortages.append(
+                    f"{product.name} (Code: {product.code}). Available: {available}, Requested: {quantity}"
+                )
+        
+        message = "Not enough stock for " + "; ".join(shortages) if shortages else "Stock changed during the sale"
+        return Response(
+            {'error': f"{message}. The sale was not recorded."},
+            status=status.HTTP_409_CONFLICT
+        )
+    
     def _generate_invoice_number(self):
         # Generate a unique invoice number format: INV-YYYYMMDD-XXXX
         # Where XXXX is a random 4-digit number
@@ -980,11 +1082,14 @@ class SaleViewSet(viewsets.ModelViewSet):
         return invoice_number
 
 # Invoice ViewSet
-class InvoiceViewSet(viewsets.ReadOnlyModelViewSet):
+class InvoiceViewSet(ReplicaReadMixin, QueryPlanMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Invoice.objects.all().order_by('-invoice_date')
     serializer_class = InvoiceSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = FeedPagination
+    keyset_field = 'invoice_date'
+    select_related_fields = ('sale__sold_by',)
+    prefetch_related_fields = ('sale__items__product',)
     
     def get_queryset(self):
         queryset = Invoice.objects.all().order_by('-invoice_date')
@@ -1012,9 +1117,20 @@ class InvoiceViewSet(viewsets.ReadOnlyModelViewSet):
         return queryset
 
 # Caisse (Cash Register) Views
-class CaisseViewSet(viewsets.ModelViewSet):
+class CaisseViewSet(ConditionalGetMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Caisse.objects.all().order_by('name')
     permission_classes = [permissions.IsAuthenticated]
+    replica_actions = ('report',)  # Balances on list/detail must reflect the latest deposit
+    # Balances and the detail's operations change with every recorded operation
+    version_sources = ((Caisse, 'last_updated'), (CaisseOperation, 'id'))
+    append_only_sources = (CaisseOperation,)  # The ledger is never edited; see CaisseOperationAdmin
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            # current_balance in the same query rather than two queries per caisse
+            queryset = Caisse.annotate_balances(queryset)
+        return queryset
     
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -1064,13 +1180,36 @@ class CaisseViewSet(viewsets.ModelViewSet):
                                 status=status.HTTP_400_BAD_REQUEST)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=True, methods=['get'])
+    def report(self, request, pk=None):
+        """Deposit/withdrawal totals, per-type figures and a dated series, aggregated in SQL"""
+        caisse = self.get_object()
+        
+        # Date range (inclusive, YYYY-MM-DD)
+        dates = {}
+        for param in ('start_date', 'end_date'):
+            value = request.query_params.get(param, None)
+            dates[param] = parse_date(value) if value else None
+            if value and dates[param] is None:
+                return Response({'error': f'{param} must be a date formatted YYYY-MM-DD'},
+                                status=status.HTTP_400_BAD_REQUEST)
+        
+        bucket = request.query_params.get('bucket', 'day')
+        if bucket not in BUCKETS:
+            return Response({'error': f"bucket must be one of: {', '.join(BUCKETS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(caisse_report(caisse, dates['start_date'], dates['end_date'], bucket))
 
 
-class CaisseOperationViewSet(viewsets.ReadOnlyModelViewSet):
+class CaisseOperationViewSet(ReplicaReadMixin, QueryPlanMixin, viewsets.ReadOnlyModelViewSet):
     queryset = CaisseOperation.objects.all().order_by('-timestamp')
     serializer_class = CaisseOperationSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = FeedPagination
+    keyset_field = 'timestamp'
+    select_related_fields = ('caisse', 'performed_by')
     filterset_fields = ['caisse', 'operation_type', 'performed_by']
     search_fields = ['description', 'reference_id']
     
@@ -1080,13 +1219,11 @@ class CaisseOperationViewSet(viewsets.ReadOnlyModelViewSet):
         # Explicitly check for caisse filter to ensure it works
         caisse_id = self.request.query_params.get('caisse', None)
         if caisse_id:
-            print(f"Filtering operations by caisse_id: {caisse_id}")
             queryset = queryset.filter(caisse_id=caisse_id)
         
         # Explicitly handle operation_type filter
         operation_type = self.request.query_params.get('operation_type', None)
         if operation_type:
-            print(f"Filtering operations by operation_type: {operation_type}")
             queryset = queryset.filter(operation_type=operation_type)
         
         # Filter by date range if provided
@@ -1108,5 +1245,4 @@ class CaisseOperationViewSet(viewsets.ReadOnlyModelViewSet):
                 models.Q(performed_by__username__icontains=search)
             )
         
-        print(f"CaisseOperation query: {queryset.query}")
         return queryset
@@ -14,8 +14,11 @@ EOF
 # Run migrations
 python manage.py migrate
 
+# Create the cache table when CACHE_BACKEND is the database cache (no-op otherwise)
+python manage.py createcachetable
+
 # Collect static files
 python manage.py collectstatic --noinput
 
 # Start the server with the overridden settings
-exec gunicorn --bind 0.0.0.0:8000 smartstore.wsgi:application
+exec gunicorn --workers "${GUNICORN_WORKERS:-1}" --bind 0.0.0.0:8000 smartstore.wsgi:application
@@ -0,0 +1,94 @@
+"""
+Benchmark JSON rendering of the phone list and sale history endpoints.
+
+Builds a throwaway in-memory catalog, fetches one page of each endpoint
+through its viewset and times rendering that page with DRF's JSONRenderer and
+with api.renderers.FastJSONRenderer. Both outputs are checked to be identical.
+
+Usage: python scripts/bench_json_render.py [--rows 100] [--repeat 200]
+"""
+import argparse
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smartstore.settings')
+os.environ['DATABASE_NAME'] = ':memory:'
+
+import django
+django.setup()
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.models import Brand, Model, Phone, PhoneImage, Stock, Sale, SaleItem
+from api.renderers import FastJSONRenderer, HAS_ORJSON
+from api.views import PhoneViewSet, SaleViewSet
+
+
+def populate(rows):
+    user = User.objects.create_user(username='bench', password='bench')
+    brand = Brand.objects.create(name='Bench')
+    model = Model.objects.create(brand=brand, name='Bench', platform_chipset='Chipset', platform_os='Android 14')
+    phones = []
+    for index in range(rows):
+        phone = Phone.objects.create(
+            name=f'Bench phone {index}', brand=brand, model=model, color='Midnight black',
+            storage_gb=256, ram_gb=8, cost_price=Decimal('310.50'), selling_unite_price=Decimal('399.99'),
+            selling_semi_bulk_price=Decimal('379.99'), selling_bulk_price=Decimal('359.99'),
+            description='Unicode description – “quoted” ✓'
+        )
+        Stock.objects.create(product=phone, quantity=index)
+        PhoneImage.objects.create(phone=phone, image=f'phone_images/{index}.jpg', is_primary=True)
+        phones.append(phone)
+
+    for index in range(rows):
+        sale = Sale.objects.create(
+            sale_type='particular', total_amount=Decimal('799.98'), sold_by=user,
+            customer_name=f'Customer {index}', add_to_caisse=False
+        )
+        for phone in phones[index % rows:index % rows + 2]:
+            SaleItem.objects.create(sale=sale, product=phone, quantity_sold=1, price_per_item=Decimal('399.99'))
+    return user
+
+
+def page_data(viewset, user, rows):
+    request = APIRequestFactory().get('/', {'page_size': rows})
+    force_authenticate(request, user=user)
+    response = viewset.as_view({'get': 'list'})(request)
+    return response.data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    settings.ALLOWED_HOSTS = ['*']
+    call_command('migrate', verbosity=0)
+    user = populate(args.rows)
+
+    print(f'orjson available: {HAS_ORJSON}')
+    for label, viewset in (('phones', PhoneViewSet), ('sales', SaleViewSet)):
+        data = page_data(viewset, user, args.rows)
+        stock, fast = JSONRenderer(), FastJSONRenderer()
+        assert stock.render(data) == fast.render(data), f'{label}: renderers disagree'
+
+        size = len(fast.render(data))
+        stock_time = min(timeit.repeat(lambda: stock.render(data), number=args.repeat, repeat=3)) / args.repeat
+        fast_time = min(timeit.repeat(lambda: fast.render(data), number=args.repeat, repeat=3)) / args.repeat
+        print(
+            f'{label:>6}: {len(data["results"])} rows, {size / 1024:.0f} KiB  '
+            f'JSONRenderer {stock_time * 1000:.2f} ms  FastJSONRenderer {fast_time * 1000:.2f} ms  '
+            f'({stock_time / fast_time:.1f}x)'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark creating purchases of 10, 100 and 1000 lines.
+
+Compares the per-line path create_purchase used to take (one INSERT per
+PurchaseItem, each save() fetching its purchase, then update_totals re-reading
+the lines and saving the header again) with api.services.record_purchase
+(line and header totals computed in memory, one header INSERT and one
+bulk_create). Both run in a transaction against a throwaway in-memory
+database; the totals they produce are checked to be identical.
+
+Usage: python scripts/bench_purchase_ingest.py [--lines 10 100 1000] [--repeat 5]
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+from decimal import Decimal
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smartstore.settings')
+os.environ['DATABASE_NAME'] = ':memory:'
+
+import django
+django.setup()
+
+from django.core.management import call_command
+from django.db import connection, transaction
+
+from api.models import Supplier, Purchase, PurchaseItem
+from api.services import record_purchase
+from smartstore.metrics import QueryTimer
+
+references = itertools.count()
+
+
+def make_items(count):
+    return [
+        {
+            'product_id': index + 1,
+            'product_name': f'Product {index}',
+            'product_code': f'P{index:03d}',
+            'quantity': 1 + index % 7,
+            'unit_price': Decimal('12.35') + index,
+            'discount': Decimal('5') if index % 3 == 0 else Decimal('0'),
+        }
+        for index in range(count)
+    ]
+
+
+def header():
+    return {'reference_number': f'BENCH-{next(references)}', 'date': '2026-01-01', 'soumis_tva': True}
+
+
+def per_line(supplier, items):
+    purchase = Purchase.objects.create(supplier=supplier, **header())
+    for item in items:
+        # Referenced by id, as the lines used to be: save() fetches the purchase for soumis_tva
+        PurchaseItem(purchase_id=purchase.id, ht=0, tva=0, ttc=0, **item).save()
+    purchase.update_totals()
+    return purchase
+
+
+def bulk(supplier, items):
+    return record_purchase(supplier, items, **header())
+
+
+def measure(create, supplier, items, repeat):
+    best = None
+    for _ in range(repeat):
+        queries = QueryTimer()
+        with connection.execute_wrapper(queries):
+            start = time.perf_counter()
+            with transaction.atomic():
+                purchase = create(supplier, items)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, queries.count, purchase
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    supplier = Supplier.objects.create(name='Bench supplier')
+
+    for count in args.lines:
+        items = make_items(count)
+        old_time, old_queries, old = measure(per_line, supplier, items, args.repeat)
+        new_time, new_queries, new = measure(bulk, supplier, items, args.repeat)
+        old.refresh_from_db()
+        new.refresh_from_db()
+        assert (old.ht, old.tva, old.ttc) == (new.ht, new.tva, new.ttc), f'{count} lines: totals disagree'
+        print(
+            f'{count:>5} lines: per-line {old_time * 1000:8.1f} ms ({old_queries} queries)  '
+            f'bulk {new_time * 1000:7.1f} ms ({new_queries} queries)  ({old_time / new_time:.1f}x)'
+        )
+
+
+if __name__ == '__main__':
+    main()
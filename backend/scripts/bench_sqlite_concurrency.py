@@ -0,0 +1,149 @@
+"""
+Benchmark read throughput while a write-heavy sale stream runs.
+
+Each SQLite profile runs in its own process on a fresh database file (the
+DATABASE_* variables are read when settings are imported):
+
+  - legacy: rollback journal, synchronous=FULL, deferred transactions, 5s timeout
+  - tuned:  the defaults from settings (WAL, synchronous=NORMAL, IMMEDIATE, ...)
+
+Writers post sales through /api/sales/record/ while readers list phones and
+stock. Reported: completed reads/s and sales/s, and requests that failed with
+"database is locked".
+
+Usage: python scripts/bench_sqlite_concurrency.py [--seconds 10] [--readers 8] [--writers 4]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = {
+    'legacy': {
+        'DATABASE_JOURNAL_MODE': 'DELETE',
+        'DATABASE_SYNCHRONOUS': 'FULL',
+        'DATABASE_MMAP_SIZE': '0',
+        'DATABASE_CACHE_SIZE': '-2000',
+        'DATABASE_TEMP_STORE': 'DEFAULT',
+        'DATABASE_BUSY_TIMEOUT': '5',
+        'DATABASE_TRANSACTION_MODE': 'DEFERRED',
+    },
+    'tuned': {},
+}
+
+
+def run_profile(args):
+    """Run inside a child process whose environment selects the profile"""
+    sys.path.append(BACKEND_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smartstore.settings')
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import connection, OperationalError
+    from rest_framework.test import APIClient
+
+    from api.models import Brand, Model, Phone, Stock
+
+    settings.ALLOWED_HOSTS = ['*']
+    call_command('migrate', verbosity=0)
+
+    user = User.objects.create_user(username='bench', password='bench')
+    brand = Brand.objects.create(name='Bench')
+    model = Model.objects.create(brand=brand, name='Bench')
+    phones = []
+    for index in range(50):
+        phone = Phone.objects.create(
+            name=f'Bench phone {index}', brand=brand, model=model,
+            cost_price=Decimal('100.00'), selling_unite_price=Decimal('150.00')
+        )
+        Stock.objects.create(product=phone, quantity=1_000_000)
+        phones.append(phone.id)
+
+    counts = {'reads': 0, 'writes': 0, 'locked': 0, 'errors': 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def count(key):
+        with lock:
+            counts[key] += 1
+
+    def worker(request):
+        client = APIClient()
+        client.force_authenticate(user)
+        index = 0
+        try:
+            while not stop.is_set():
+                index += 1
+                try:
+                    kind, ok = request(client, index)
+                    count(kind if ok else 'errors')
+                except OperationalError as e:
+                    count('locked' if 'locked' in str(e) else 'errors')
+        finally:
+            connection.close()
+
+    def read(client, index):
+        url = '/api/phones/' if index % 2 else '/api/stock/'
+        return 'reads', client.get(url, {'page_size': 20}).status_code == 200
+
+    def write(client, index):
+        items = [
+            {'product_id': str(phones[(index + offset) % len(phones)]), 'quantity': '1'}
+            for offset in range(3)
+        ]
+        response = client.post('/api/sales/record/', {
+            'sale_type': 'particular', 'items': items, 'add_to_caisse': True,
+        }, format='json')
+        return 'writes', response.status_code == 201
+
+    threads = [threading.Thread(target=worker, args=(read,)) for _ in range(args.readers)]
+    threads += [threading.Thread(target=worker, args=(write,)) for _ in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(
+        f"reads/s={counts['reads'] / args.seconds:.1f} "
+        f"sales/s={counts['writes'] / args.seconds:.1f} "
+        f"locked={counts['locked']} errors={counts['errors']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--profile', choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        run_profile(args)
+        return
+
+    for name, overrides in PROFILES.items():
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, DATABASE_NAME=os.path.join(directory, 'bench.sqlite3'), **overrides)
+            result = subprocess.run(
+                [sys.executable, '-W', 'ignore', os.path.abspath(__file__), '--profile', name,
+                 '--seconds', str(args.seconds), '--readers', str(args.readers), '--writers', str(args.writers)],
+                env=env, capture_output=True, text=True
+            )
+            output = result.stdout.strip().splitlines()
+            print(f"{name:>7}: {output[-1] if output else result.stderr.strip()}")
+
+
+if __name__ == '__main__':
+    main()
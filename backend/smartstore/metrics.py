@@ -0,0 +1,267 @@
+"""
+Per-route request profiling.
+
+RequestMetricsMiddleware times every request and records, per route (HTTP
+method and URL pattern name), the latency, the number of database queries and
+the time spent running them, the time spent serializing (DRF serializer
+`.data`, which runs inside the view), the time spent rendering the response
+body and the response size. Each route keeps cumulative counters and latency histogram
+buckets, exported in the Prometheus text format, plus a rolling window of the
+most recent requests for averages and percentiles. Requests slower than
+SLOW_REQUEST_THRESHOLD_MS are logged as warnings.
+
+Figures are kept in memory per process: with several workers, each reports
+its own.
+"""
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Requests per route kept for averages and percentiles
+WINDOW_SIZE = 1000
+
+
+class RouteStats:
+    """Counters and recent samples of one route"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.latency = 0.0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serialize_time = 0.0
+        self.render_time = 0.0
+        self.response_bytes = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.recent = deque(maxlen=WINDOW_SIZE)
+
+    def add(self, status_code, latency, queries, sql_time, serialize_time, render_time, response_bytes):
+        self.count += 1
+        if status_code >= 500:
+            self.errors += 1
+        self.latency += latency
+        self.queries += queries
+        self.sql_time += sql_time
+        self.serialize_time += serialize_time
+        self.render_time += render_time
+        self.response_bytes += response_bytes
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.buckets[index] += 1
+        self.recent.append((latency, queries, sql_time, serialize_time, render_time, response_bytes))
+
+    def summary(self):
+        """Figures over the rolling window; times in milliseconds"""
+        samples = list(self.recent)
+        latencies = sorted(sample[0] for sample in samples)
+        size = len(samples)
+
+        def average(index, scale=1):
+            return round(sum(sample[index] for sample in samples) / size * scale, 3)
+
+        def percentile(fraction):
+            return round(latencies[min(size - 1, int(fraction * size))] * 1000, 3)
+
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'window': size,
+            'latency_ms': {
+                'avg': average(0, 1000),
+                'p50': percentile(0.50),
+                'p95': percentile(0.95),
+                'p99': percentile(0.99),
+                'max': round(latencies[-1] * 1000, 3),
+            },
+            'queries': {'avg': average(1), 'max': max(sample[1] for sample in samples)},
+            'sql_ms': {'avg': average(2, 1000)},
+            'serialize_ms': {'avg': average(3, 1000)},
+            'render_ms': {'avg': average(4, 1000)},
+            'response_bytes': {'avg': average(5)},
+        }
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    """Route statistics of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._routes = {}
+            self.started = time.time()
+
+    def record(self, method, route, status_code, latency, queries, sql_time, serialize_time, render_time, response_bytes):
+        with self._lock:
+            stats = self._routes.get((method, route))
+            if stats is None:
+                stats = self._routes[(method, route)] = RouteStats()
+            stats.add(status_code, latency, queries, sql_time, serialize_time, render_time, response_bytes)
+
+    def snapshot(self):
+        """{'GET phone-list': {...summary...}, ...}, slowest average first"""
+        with self._lock:
+            summaries = {f'{method} {route}': stats.summary() for (method, route), stats in self._routes.items()}
+        return dict(sorted(summaries.items(), key=lambda item: -item[1]['latency_ms']['avg']))
+
+    def prometheus(self):
+        """All counters in the Prometheus text exposition format"""
+        with self._lock:
+            routes = [
+                (f'method="{_label(method)}",route="{_label(route)}"', stats)
+                for (method, route), stats in sorted(self._routes.items())
+            ]
+            lines = [
+                '# HELP smartstore_request_duration_seconds Request latency by route.',
+                '# TYPE smartstore_request_duration_seconds histogram',
+            ]
+            for labels, stats in routes:
+                for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                    lines.append(f'smartstore_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'smartstore_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.count}')
+                lines.append(f'smartstore_request_duration_seconds_sum{{{labels}}} {stats.latency}')
+                lines.append(f'smartstore_request_duration_seconds_count{{{labels}}} {stats.count}')
+
+            counters = (
+                ('request_errors_total', 'Requests answered with a 5xx status.', 'errors'),
+                ('db_queries_total', 'Database queries run.', 'queries'),
+                ('db_query_seconds_total', 'Time spent running database queries.', 'sql_time'),
+                ('serialize_seconds_total', 'Time spent in serializer .data, queries included.', 'serialize_time'),
+                ('render_seconds_total', 'Time spent rendering response bodies.', 'render_time'),
+                ('response_bytes_total', 'Response body bytes sent.', 'response_bytes'),
+            )
+            for name, help_text, attribute in counters:
+                lines.append(f'# HELP smartstore_{name} {help_text}')
+                lines.append(f'# TYPE smartstore_{name} counter')
+                for labels, stats in routes:
+                    lines.append(f'smartstore_{name}{{{labels}}} {getattr(stats, attribute)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class QueryTimer:
+    """Database execute wrapper counting queries and the time they take"""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.time += time.perf_counter() - start
+
+
+# Seconds spent in serializer `.data` by the current request, when it is being profiled
+_serialize_time = ContextVar('serialize_time', default=None)
+_serializing = ContextVar('serializing', default=False)
+_installed = False
+
+
+def _timed(data):
+    @functools.wraps(data.fget)
+    def timed(serializer):
+        spent = _serialize_time.get()
+        if spent is None or _serializing.get():
+            # Not profiled, or nested inside a serializer already being timed
+            return data.fget(serializer)
+        token = _serializing.set(True)
+        start = time.perf_counter()
+        try:
+            return data.fget(serializer)
+        finally:
+            spent[0] += time.perf_counter() - start
+            _serializing.reset(token)
+    return property(timed)
+
+
+def install_serializer_timer():
+    """Time `.data` of DRF serializers; DRF has no hook for it, so the properties are wrapped once"""
+    global _installed
+    if not _installed:
+        serializers.Serializer.data = _timed(serializers.Serializer.data)
+        serializers.ListSerializer.data = _timed(serializers.ListSerializer.data)
+        _installed = True
+
+
+def route_name(request):
+    """The URL pattern a request matched, without its arguments"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+class RequestMetricsMiddleware:
+    """Records the cost of every request into `registry`; see the module docstring"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_serializer_timer()
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        serialize_time = [0.0]
+        request._metrics_render_time = 0.0
+        start = time.perf_counter()
+        token = _serialize_time.set(serialize_time)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                response = self.get_response(request)
+        finally:
+            _serialize_time.reset(token)
+        latency = time.perf_counter() - start
+
+        route = route_name(request)
+        size = 0 if response.streaming else len(response.content)
+        registry.record(
+            request.method, route, response.status_code, latency,
+            timer.count, timer.time, serialize_time[0], request._metrics_render_time, size,
+        )
+
+        threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 500)
+        if threshold and latency * 1000 >= threshold:
+            logger.warning(
+                'Slow request: %s %s (%s) took %.0f ms, %d queries in %.0f ms, '
+                'serializing %.0f ms, rendering %.0f ms, %d bytes',
+                request.method, request.get_full_path(), route, latency * 1000,
+                timer.count, timer.time * 1000, serialize_time[0] * 1000, request._metrics_render_time * 1000, size,
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that step
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._metrics_render_time = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
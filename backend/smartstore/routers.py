@@ -0,0 +1,122 @@
+"""
+Read/write routing between the primary database and a reporting replica.
+
+The replica is a read-only copy of the primary SQLite file, refreshed with the
+SQLite backup API (`refresh_replica`, run periodically through the
+`refresh_replica` management command). Queries only go to it while
+`read_from_replica()` is active, which reporting viewsets enable for their
+read actions; everything else, and every write, uses the primary.
+"""
+import os
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+PRIMARY_DB = 'default'
+REPLICA_DB = 'replica'
+
+_reading_from_replica = ContextVar('reading_from_replica', default=False)
+
+
+def replica_path():
+    """Path of the replica file, or None when no replica is configured"""
+    database = settings.DATABASES.get(REPLICA_DB)
+    if not database:
+        return None
+    return os.fspath(database['NAME'])
+
+
+def replica_available():
+    """Whether a replica is configured and has been populated at least once"""
+    path = replica_path()
+    return bool(path) and os.path.exists(path)
+
+
+def replica_stamp():
+    """Identifies the replica snapshot current reads see, for cache keys"""
+    if not _reading_from_replica.get():
+        return ''
+    try:
+        return str(os.stat(replica_path()).st_mtime_ns)
+    except (OSError, TypeError):
+        return ''
+
+
+def _reopen_if_refreshed():
+    """Close a replica connection opened on a snapshot that has since been replaced"""
+    connection = connections[REPLICA_DB]
+    stamp = os.stat(replica_path()).st_mtime_ns
+    if getattr(connection, '_replica_stamp', stamp) != stamp:
+        connection.close()
+    connection._replica_stamp = stamp
+
+
+@contextmanager
+def read_from_replica(enabled=True):
+    """Route reads made inside the block to the replica, if one is available"""
+    enabled = enabled and replica_available()
+    if enabled:
+        _reopen_if_refreshed()
+    token = _reading_from_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _reading_from_replica.reset(token)
+
+
+def refresh_replica():
+    """
+    Copy the primary database into the replica file with the SQLite backup API.
+    The copy is written next to the replica and renamed over it, so readers
+    never see a half-written file; connections opened afterwards see the new
+    snapshot. Returns the replica path.
+    """
+    path = replica_path()
+    if path is None:
+        raise RuntimeError(f"No '{REPLICA_DB}' database is configured")
+
+    source = connections[PRIMARY_DB]
+    source.ensure_connection()
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix='.sqlite3')
+    os.close(handle)
+    try:
+        destination = sqlite3.connect(temporary)
+        try:
+            source.connection.backup(destination)
+            # Readers open the replica read-only, which needs a rollback journal rather than WAL
+            destination.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            destination.close()
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    return path
+
+
+class PrimaryReplicaRouter:
+    """Send reads to the replica inside `read_from_replica()`, everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        if _reading_from_replica.get():
+            return REPLICA_DB
+        return PRIMARY_DB
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary and is never migrated directly
+        return db == PRIMARY_DB
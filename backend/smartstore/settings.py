@@ -72,6 +72,7 @@ CORS_ALLOW_HEADERS = [
 ]
 
 MIDDLEWARE = [
+    'smartstore.metrics.RequestMetricsMiddleware',  # First, so it times everything below
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware
@@ -82,6 +83,9 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Requests taking longer are logged by smartstore.metrics; 0 disables the log
+SLOW_REQUEST_THRESHOLD_MS = int(os.environ.get('SLOW_REQUEST_THRESHOLD_MS', 500))
+
 ROOT_URLCONF = 'smartstore.urls'
 
 TEMPLATES = [
@@ -105,10 +109,113 @@ WSGI_APPLICATION = 'smartstore.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'django.db.backends.sqlite3')
+
+if DATABASE_ENGINE == 'django.db.backends.postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': DATABASE_ENGINE,
+            'NAME': os.environ.get('DATABASE_NAME', 'smartstore'),
+            'USER': os.environ.get('DATABASE_USER', 'smartstore'),
+            'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+            'HOST': os.environ.get('DATABASE_HOST', 'localhost'),
+            'PORT': os.environ.get('DATABASE_PORT', '5432'),
+            # Persistent connections, checked before reuse so a restarted server is not an error
+            'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': os.environ.get('DATABASE_CONN_HEALTH_CHECKS', 'true').lower() == 'true',
+            'OPTIONS': {},
+        }
+    }
+
+    # Pooled mode (psycopg 3 with psycopg-pool): each worker process borrows
+    # connections from a shared pool instead of holding one per thread
+    if os.environ.get('DATABASE_POOL', 'false').lower() == 'true':
+        DATABASES['default']['CONN_MAX_AGE'] = 0  # Django requires it with a pool
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', 10)),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': DATABASE_ENGINE,
+            'NAME': os.environ.get('DATABASE_NAME', BASE_DIR / 'db.sqlite3'),
+            # File-backed test database so concurrency tests see real SQLite locking
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
+        }
+    }
+
+# SQLite pragmas applied to every new connection. WAL lets readers run while a
+# sale holds the write lock; the busy timeout makes writers queue instead of
+# failing with "database is locked"; IMMEDIATE transactions take the write lock
+# up front so a transaction never fails half-way when upgrading its lock.
+if DATABASE_ENGINE == 'django.db.backends.sqlite3':
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.environ.get('DATABASE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('DATABASE_SYNCHRONOUS', 'NORMAL'),
+        'mmap_size': int(os.environ.get('DATABASE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'cache_size': int(os.environ.get('DATABASE_CACHE_SIZE', -64 * 1024)),  # Negative values are KiB
+        'temp_store': os.environ.get('DATABASE_TEMP_STORE', 'MEMORY'),
+    }
+    DATABASES['default']['OPTIONS'] = {
+        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        'timeout': float(os.environ.get('DATABASE_BUSY_TIMEOUT', 20)),  # Seconds
+        'transaction_mode': os.environ.get('DATABASE_TRANSACTION_MODE', 'IMMEDIATE'),
+    }
+
+    # Optional read-only replica for reporting reads, refreshed from the primary
+    # with `python manage.py refresh_replica` (see smartstore/routers.py)
+    DATABASE_REPLICA_NAME = os.environ.get('DATABASE_REPLICA_NAME')
+    if DATABASE_REPLICA_NAME:
+        replica_pragmas = {'query_only': 'ON', **{
+            name: value for name, value in SQLITE_PRAGMAS.items()
+            if name not in ('journal_mode', 'synchronous')
+        }}
+        DATABASES['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': DATABASE_REPLICA_NAME,
+            'OPTIONS': {
+                'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in replica_pragmas.items()),
+                'timeout': DATABASES['default']['OPTIONS']['timeout'],
+            },
+            'TEST': {
+                'MIRROR': 'default',
+            },
+        }
+
+DATABASE_ROUTERS = ['smartstore.routers.PrimaryReplicaRouter']
+
+
+# Cache
+# Holds the generation counters and entries of cached caisse reports
+# (api.reports) and API responses (api.response_cache), and the token -> user
+# lookups of api.authentication. Writes bump the generations, and logouts or
+# user changes delete the token entries, in this cache only; with a
+# per-process cache the other workers keep serving stale responses and keep
+# accepting a revoked token until its entry expires (TOKEN_CACHE_TTL). Request
+# metrics (smartstore.metrics) are not kept here and stay per-process.
+# The PostgreSQL profile therefore defaults to the database cache (table
+# created by `createcachetable` in entrypoint.sh); the SQLite profile keeps
+# per-process memory. Either can be replaced with another shared backend
+# (e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache with
+# CACHE_LOCATION=redis://host:6379). The api.E001 system check refuses to
+# start (migrate fails) with several workers on a per-process cache.
+
+# Number of application server processes, as passed to gunicorn by entrypoint.sh
+WEB_WORKERS = int(os.environ.get('GUNICORN_WORKERS', 1))
+
+if DATABASE_ENGINE == 'django.db.backends.postgresql':
+    DEFAULT_CACHE_BACKEND, DEFAULT_CACHE_LOCATION = 'django.core.cache.backends.db.DatabaseCache', 'smartstore_cache'
+else:
+    DEFAULT_CACHE_BACKEND, DEFAULT_CACHE_LOCATION = 'django.core.cache.backends.locmem.LocMemCache', 'smartstore'
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('CACHE_BACKEND', DEFAULT_CACHE_BACKEND),
+        'LOCATION': os.environ.get('CACHE_LOCATION', DEFAULT_CACHE_LOCATION),
     }
 }
 
@@ -157,20 +264,43 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Threads recompressing uploaded pictures and generating their thumbnails (api/images.py);
+# 0 processes them inline once the upload commits
+IMAGE_PIPELINE_WORKERS = int(os.environ.get('IMAGE_PIPELINE_WORKERS', 2))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Seconds a token -> user lookup is remembered in the default cache by
+# api.authentication.CachedTokenAuthentication; 0 disables the cache
+TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 60))
+
+# Days a catalog sync token stays valid (api.catalog_views). Deleted-product
+# tombstones older than this are pruned, and `changes` answers older tokens
+# with 410 Gone so clients take a fresh snapshot instead
+CATALOG_SYNC_MAX_AGE_DAYS = int(os.environ.get('CATALOG_SYNC_MAX_AGE_DAYS', 30))
+
 # Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed JSON (api/renderers.py); identical output to DRF's JSON classes
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
@@ -228,3 +358,17 @@ SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
 SESSION_COOKIE_AGE = 1209600  # 2 weeks in seconds
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False  # Don't expire when browser closes
 SESSION_SAVE_EVERY_REQUEST = True  # Update the session cookie on every request
+
+# Logging
+# Application loggers (api.*, smartstore.* such as the slow request log) go to the console
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api': {'handlers': ['console'], 'level': os.environ.get('LOG_LEVEL', 'INFO')},
+        'smartstore': {'handlers': ['console'], 'level': os.environ.get('LOG_LEVEL', 'INFO')},
+    },
+}
@@ -1,11 +1,19 @@
 import api from './axios';
 import { PaginatedResponse } from '../types/pagination';
 
+// Thumbnail URLs per size; each is the full picture until its thumbnail is generated
+export interface Thumbnails {
+  grid: string;
+  detail: string;
+  zoom: string;
+}
+
 export interface Brand {
   id: number;
   name: string;
   origin_country: string | null;
   picture: string | null;
+  picture_thumbnails: Thumbnails | null;
   description: string | null;
   website: string | null;
 }
@@ -0,0 +1,110 @@
+import api from './axios';
+
+export interface CatalogColumns {
+  id: number[];
+  type: string[];
+  code: (string | null)[];
+  name: string[];
+  price: string[];
+  semi_bulk_price: (string | null)[];
+  bulk_price: (string | null)[];
+  stock: number[];
+}
+
+export interface CatalogSnapshot {
+  token: string;
+  count: number;
+  columns: CatalogColumns;
+}
+
+export interface CatalogChanges extends CatalogSnapshot {
+  deleted: number[];
+}
+
+export interface CatalogProduct {
+  id: number;
+  product_type: string;
+  code: string | null;
+  name: string;
+  selling_unite_price: number;
+  selling_semi_bulk_price: number | null;
+  selling_bulk_price: number | null;
+  stock_quantity: number;
+}
+
+const toPrice = (value: string | null) => (value === null ? null : Number(value));
+
+// Turn the columnar payload back into one object per product
+const toProducts = (columns: CatalogColumns, count: number): CatalogProduct[] => {
+  const products: CatalogProduct[] = [];
+  for (let i = 0; i < count; i++) {
+    products.push({
+      id: columns.id[i],
+      product_type: columns.type[i],
+      code: columns.code[i],
+      name: columns.name[i],
+      selling_unite_price: Number(columns.price[i]),
+      selling_semi_bulk_price: toPrice(columns.semi_bulk_price[i]),
+      selling_bulk_price: toPrice(columns.bulk_price[i]),
+      stock_quantity: columns.stock[i],
+    });
+  }
+  return products;
+};
+
+// Catalog kept between calls so later syncs only fetch what changed
+let products = new Map<number, CatalogProduct>();
+let syncToken: string | null = null;
+
+const catalogService = {
+  // Get the full catalog in one request
+  getSnapshot: async () => {
+    try {
+      const response = await api.get<CatalogSnapshot>('catalog/snapshot/');
+      return response.data;
+    } catch (error) {
+      throw error;
+    }
+  },
+
+  // Get products changed or deleted since a token returned by a previous call
+  getChanges: async (since: string) => {
+    try {
+      const response = await api.get<CatalogChanges>('catalog/changes/', { params: { since } });
+      return response.data;
+    } catch (error) {
+      throw error;
+    }
+  },
+
+  // Bring the local catalog up to date: a snapshot the first time, only changes afterwards
+  sync: async (): Promise<CatalogProduct[]> => {
+    let changes: CatalogChanges | null = null;
+    if (syncToken !== null) {
+      try {
+        changes = await catalogService.getChanges(syncToken);
+      } catch (error: any) {
+        // 410: the token outlived the server's sync window; start over from a snapshot
+        if (error?.response?.status !== 410) throw error;
+      }
+    }
+    if (changes === null) {
+      const snapshot = await catalogService.getSnapshot();
+      products = new Map(toProducts(snapshot.columns, snapshot.count).map(product => [product.id, product]));
+      syncToken = snapshot.token;
+    } else {
+      toProducts(changes.columns, changes.count).forEach(product => products.set(product.id, product));
+      changes.deleted.forEach(id => products.delete(id));
+      syncToken = changes.token;
+    }
+    return Array.from(products.values()).sort((a, b) => a.id - b.id);
+  },
+
+  // Forget the local catalog, e.g. on logout
+  reset: () => {
+    products = new Map();
+    syncToken = null;
+  },
+};
+
+export default catalogService;
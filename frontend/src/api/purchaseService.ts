@@ -47,11 +47,55 @@ export interface Purchase {
   payment_method_display: string;
   notes: string | null;
   soumis_tva: boolean;
+  amount_paid: number;
+  amount_remaining: number;
+  received_at: string | null;
   created_at: string;
   updated_at: string;
   items: PurchaseItem[];
 }
 
+export interface PurchaseReceipt {
+  success: string;
+  already_received: boolean;
+  received_at: string;
+  products?: number;
+  units?: number;
+  stock_created?: number;
+}
+
+export interface PurchasePayment {
+  id: number;
+  purchase: number;
+  amount: string;
+  payment_date: string;
+  payment_method: string;
+  payment_method_display: string;
+  from_caisse: number | null;
+  caisse_operation: number | null;
+  notes: string | null;
+  recorded_by: number | null;
+  recorded_by_username: string | null;
+  created_at: string;
+}
+
+export interface PurchasePaymentData {
+  amount: number | string;
+  payment_method?: string;
+  payment_date?: string;
+  // Take the money from a cash register: caisse_id, or the main one when omitted
+  from_caisse?: boolean;
+  caisse_id?: number | null;
+  notes?: string;
+}
+
+export interface PurchasePaymentResult {
+  payment: PurchasePayment;
+  amount_paid: number;
+  amount_remaining: number;
+  payment_status: string;
+}
+
 const purchaseService = {
   // Get all purchases
   getAllPurchases: async (params?: Record<string, any>) => {
@@ -103,6 +147,46 @@ const purchaseService = {
     }
   },
 
+  // Add the purchase's quantities to stock (repeating the call changes nothing)
+  receivePurchase: async (id: number) => {
+    try {
+      const response = await api.post<PurchaseReceipt>(`purchases/${id}/receive/`);
+      return response.data;
+    } catch (error) {
+      throw error;
+    }
+  },
+
+  // Record a (possibly partial) payment of a purchase
+  payPurchase: async (id: number, data: PurchasePaymentData) => {
+    try {
+      const response = await api.post<PurchasePaymentResult>(`purchases/${id}/pay/`, data);
+      return response.data;
+    } catch (error) {
+      throw error;
+    }
+  },
+
+  // Get the payments of a purchase, oldest first
+  getPayments: async (id: number) => {
+    try {
+      const response = await api.get<PurchasePayment[]>(`purchases/${id}/payments/`);
+      return response.data;
+    } catch (error) {
+      throw error;
+    }
+  },
+
+  // Get purchases still owing money, oldest first
+  getUnpaidPurchases: async (params?: Record<string, any>) => {
+    try {
+      const response = await api.get<PaginatedResponse<Purchase>>('purchases/unpaid/', { params });
+      return response.data;
+    } catch (error) {
+      throw error;
+    }
+  },
+
   // Search purchases by reference number
   searchByReferenceNumber: async (referenceNumber: string, page?: number, pageSize?: number) => {
     try {
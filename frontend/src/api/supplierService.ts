@@ -9,6 +9,40 @@ export interface PaginatedResponse<T> {
   results: T[];
 }
 
+export interface SupplierBalance {
+  supplier: number;
+  supplier_name: string;
+  purchase_count: number;
+  total_ttc: number;
+  total_paid: number;
+  outstanding: number;
+  oldest_unpaid_date: string | null;
+}
+
+export interface SupplierBalanceDetail extends SupplierBalance {
+  as_of: string;
+  aging: Record<'0-30' | '31-60' | '61-90' | '90+', number>;
+}
+
+export interface SupplierStatementFigures {
+  count: number;
+  ht: number;
+  tva: number;
+  ttc: number;
+  paid: number;
+  remaining: number;
+}
+
+export interface SupplierStatement {
+  supplier: number;
+  supplier_name: string;
+  start_date: string | null;
+  end_date: string | null;
+  bucket: 'day' | 'week' | 'month';
+  totals: SupplierStatementFigures;
+  series: Array<SupplierStatementFigures & { period: string }>;
+}
+
 const supplierService = {
   // Get all suppliers with pagination
   getAllSuppliers: async (params?: Record<string, any>) => {
@@ -73,6 +107,38 @@ const supplierService = {
       throw error;
     }
   },
+
+  // Outstanding balance of every supplier, largest first
+  getBalances: async () => {
+    try {
+      const response = await api.get<SupplierBalance[]>('suppliers/balances/');
+      return response.data;
+    } catch (error) {
+      throw error;
+    }
+  },
+
+  // Balance and aging of one supplier's unpaid purchases (asOf: YYYY-MM-DD, default today)
+  getBalance: async (id: number, asOf?: string) => {
+    try {
+      const params: Record<string, any> = {};
+      if (asOf) params.as_of = asOf;
+      const response = await api.get<SupplierBalanceDetail>(`suppliers/${id}/balance/`, { params });
+      return response.data;
+    } catch (error) {
+      throw error;
+    }
+  },
+
+  // Purchase totals of one supplier, overall and per period
+  getStatement: async (id: number, params?: { start_date?: string; end_date?: string; bucket?: 'day' | 'week' | 'month' }) => {
+    try {
+      const response = await api.get<SupplierStatement>(`suppliers/${id}/statement/`, { params });
+      return response.data;
+    } catch (error) {
+      throw error;
+    }
+  },
 };
 
 export default supplierService;
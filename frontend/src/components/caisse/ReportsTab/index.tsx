@@ -1,14 +1,14 @@
 import React from 'react';
-import { CaisseOperation } from '../../../types/Caisse';
 import { useReports } from '../../../hooks/useReports';
 import { getOperationTypeClass } from '../../../utils/caisseUtils';
 
 type ReportsTabProps = {
-  operations: CaisseOperation[];
+  caisseId: number | null | undefined;
+  refreshKey?: unknown;
 };
 
-export const ReportsTab: React.FC<ReportsTabProps> = ({ operations }) => {
-  const reportData = useReports(operations);
+export const ReportsTab: React.FC<ReportsTabProps> = ({ caisseId, refreshKey }) => {
+  const reportData = useReports(caisseId, {}, refreshKey);
 
   return (
     <div className="bg-base-100 rounded-lg p-6 shadow">
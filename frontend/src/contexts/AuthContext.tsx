@@ -1,6 +1,7 @@
 import React, { createContext, useContext, useState, useEffect } from 'react';
 import type { ReactNode } from 'react';
 import authService from '../api/authService';
+import catalogService from '../api/catalogService';
 import type { User, LoginCredentials } from '../api/authService';
 import { TOKEN_STORAGE_KEY } from '../api/axios';
 
@@ -160,6 +161,7 @@ export const AuthProvider: React.FC<AuthProviderProps> = ({ children }) => {
       localStorage.removeItem(TOKEN_STORAGE_KEY);
       setUser(null);
     } finally {
+      catalogService.reset();
       setLoading(false);
     }
   };
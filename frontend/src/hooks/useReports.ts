@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react';
-import { CaisseOperation } from '../types/Caisse';
+import { getCaisseReport } from '../services/caisseService';
 
 interface ReportData {
   totalDeposits: number;
@@ -9,53 +9,53 @@ interface ReportData {
   operationsByType: Record<string, number>;
 }
 
-export const useReports = (operations: CaisseOperation[]) => {
-  const [reportData, setReportData] = useState<ReportData>({
-    totalDeposits: 0,
-    totalWithdrawals: 0,
-    todayOperations: 0,
-    weeklyOperations: 0,
-    operationsByType: {}
-  });
+const emptyReport: ReportData = {
+  totalDeposits: 0,
+  totalWithdrawals: 0,
+  todayOperations: 0,
+  weeklyOperations: 0,
+  operationsByType: {}
+};
+
+// Fetches report figures aggregated by the server over the whole ledger of the cash register.
+// Pass any value that changes after a deposit/withdrawal as `refreshKey` to refetch.
+export const useReports = (
+  caisseId: number | null | undefined,
+  filters: { start_date?: string; end_date?: string } = {},
+  refreshKey?: unknown
+) => {
+  const [reportData, setReportData] = useState<ReportData>(emptyReport);
 
   useEffect(() => {
-    if (operations.length > 0) {
-      calculateReportData();
+    if (!caisseId) {
+      setReportData(emptyReport);
+      return;
     }
-  }, [operations]);
 
-  const calculateReportData = () => {
-    const deposits = operations.filter(op => op.operation_type === 'DEPOSIT');
-    const totalDeposits = deposits.reduce((sum, op) => sum + Number(op.amount), 0);
-    
-    const withdrawals = operations.filter(op => op.operation_type === 'WITHDRAWAL');
-    const totalWithdrawals = Math.abs(withdrawals.reduce((sum, op) => sum + Number(op.amount), 0));
-    
-    const today = new Date();
-    today.setHours(0, 0, 0, 0);
-    const todayOperations = operations.filter(op => new Date(op.timestamp) >= today).length;
-    
-    const oneWeekAgo = new Date();
-    oneWeekAgo.setDate(oneWeekAgo.getDate() - 7);
-    oneWeekAgo.setHours(0, 0, 0, 0);
-    const weeklyOperations = operations.filter(op => new Date(op.timestamp) >= oneWeekAgo).length;
-    
-    const operationsByType: Record<string, number> = {};
-    operations.forEach(op => {
-      if (!operationsByType[op.operation_type]) {
-        operationsByType[op.operation_type] = 0;
-      }
-      operationsByType[op.operation_type]++;
-    });
-    
-    setReportData({
-      totalDeposits,
-      totalWithdrawals,
-      todayOperations,
-      weeklyOperations,
-      operationsByType
-    });
-  };
+    let cancelled = false;
+    getCaisseReport(caisseId, filters)
+      .then(report => {
+        if (cancelled) return;
+        const operationsByType: Record<string, number> = {};
+        Object.entries(report.operations_by_type).forEach(([type, entry]) => {
+          operationsByType[type] = entry.count;
+        });
+        setReportData({
+          totalDeposits: Number(report.total_deposits),
+          totalWithdrawals: Number(report.total_withdrawals),
+          todayOperations: report.today_operations,
+          weeklyOperations: report.weekly_operations,
+          operationsByType
+        });
+      })
+      .catch(error => {
+        console.error('Error fetching caisse report:', error);
+      });
+
+    return () => {
+      cancelled = true;
+    };
+  }, [caisseId, filters.start_date, filters.end_date, refreshKey]);
 
   return reportData;
 };
@@ -203,8 +203,8 @@ const Brands: React.FC = () => {
     { 
       header: 'Logo', 
       accessor: 'picture',
-      render: (value: string) => value ? 
-        <img src={value} alt="Brand logo" className="w-10 h-10 object-contain" /> : 
+      render: (value: string, item: Brand) => value ? 
+        <img src={item.picture_thumbnails?.grid ?? value} alt="Brand logo" className="w-10 h-10 object-contain" /> : 
         <div className="w-10 h-10 bg-gray-200 flex items-center justify-center text-xs">No logo</div>
     },
     { header: 'Country', accessor: 'origin_country' },
@@ -2,6 +2,7 @@ import { useState, useEffect } from 'react';
 import { getCaisses, depositFunds, withdrawFunds, getCaisseOperations, createCaisse } from '../services/caisseService';
 import { Caisse as CaisseType, CaisseOperation } from '../types/Caisse';
 import { FiChevronLeft, FiChevronRight } from 'react-icons/fi';
+import { useReports } from '../hooks/useReports';
 
 const Caisse = () => {
   const [caisses, setCaisses] = useState<CaisseType[]>([]);
@@ -13,6 +14,8 @@ const Caisse = () => {
   const [currentPage, setCurrentPage] = useState(1);
   const [totalPages, setTotalPages] = useState(1);
   const [totalOperations, setTotalOperations] = useState(0);
+  // Bumped after each deposit/withdrawal made here; the report refetches on it, not on page loads
+  const [postings, setPostings] = useState(0);
   
   // Tab management
   const [activeTab, setActiveTab] = useState<'operations' | 'reports'>('operations');
@@ -24,15 +27,6 @@ const Caisse = () => {
   const [filterPerformedBy, setFilterPerformedBy] = useState<string>('');
   const [filterDate, setFilterDate] = useState<string>('');
 
-  // Reports data
-  const [reportData, setReportData] = useState({
-    totalDeposits: 0,
-    totalWithdrawals: 0,
-    todayOperations: 0,
-    weeklyOperations: 0,
-    operationsByType: {} as Record<string, number>
-  });
-  
   // Modal states
   const [isDepositModalOpen, setIsDepositModalOpen] = useState(false);
   const [isWithdrawalModalOpen, setIsWithdrawalModalOpen] = useState(false);
@@ -131,44 +125,8 @@ const Caisse = () => {
     fetchOperations(1, false);
   }, [selectedCaisse, showAllOperations]);
 
-  useEffect(() => {
-    if (operations.length > 0) {
-      calculateReportData();
-    }
-  }, [operations]);
-  
-  const calculateReportData = () => {
-    const deposits = operations.filter(op => op.operation_type === 'DEPOSIT');
-    const totalDeposits = deposits.reduce((sum, op) => sum + Number(op.amount), 0);
-    
-    const withdrawals = operations.filter(op => op.operation_type === 'WITHDRAWAL');
-    const totalWithdrawals = Math.abs(withdrawals.reduce((sum, op) => sum + Number(op.amount), 0));
-    
-    const today = new Date();
-    today.setHours(0, 0, 0, 0);
-    const todayOperations = operations.filter(op => new Date(op.timestamp) >= today).length;
-    
-    const oneWeekAgo = new Date();
-    oneWeekAgo.setDate(oneWeekAgo.getDate() - 7);
-    oneWeekAgo.setHours(0, 0, 0, 0);
-    const weeklyOperations = operations.filter(op => new Date(op.timestamp) >= oneWeekAgo).length;
-    
-    const operationsByType: Record<string, number> = {};
-    operations.forEach(op => {
-      if (!operationsByType[op.operation_type]) {
-        operationsByType[op.operation_type] = 0;
-      }
-      operationsByType[op.operation_type]++;
-    });
-    
-    setReportData({
-      totalDeposits,
-      totalWithdrawals,
-      todayOperations,
-      weeklyOperations,
-      operationsByType
-    });
-  };
+  // Reports are aggregated server-side over the whole ledger; refetched after new postings only
+  const reportData = useReports(selectedCaisse?.id, {}, postings);
 
   const showNotification = (message: string, type: 'success' | 'error' | 'info' = 'info') => {
     setNotification({
@@ -218,6 +176,7 @@ const Caisse = () => {
       setDepositError('');
       setIsDepositModalOpen(false);
       
+      setPostings(count => count + 1);
       await fetchCaisses();
       await fetchOperations(1);
       
@@ -253,6 +212,7 @@ const Caisse = () => {
       setWithdrawalError('');
       setIsWithdrawalModalOpen(false);
       
+      setPostings(count => count + 1);
       await fetchCaisses();
       await fetchOperations(1);
       
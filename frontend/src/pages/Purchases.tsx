@@ -13,6 +13,9 @@ import PurchaseFormModal from '../components/purchases/PurchaseFormModal';
 import PurchaseViewModal from '../components/purchases/PurchaseViewModal';
 import { FiChevronLeft, FiChevronRight } from 'react-icons/fi';
 
+// The purchase form only needs names and cost prices; skip the spec columns and images
+const PRODUCT_PICKER_FIELDS = 'id,name,code,cost_price';
+
 const Purchases: React.FC = () => {
   const [purchases, setPurchases] = useState<Purchase[]>([]);
   const [phones, setPhones] = useState<Phone[]>([]);
@@ -117,7 +120,7 @@ const Purchases: React.FC = () => {
 
   const fetchPhones = async () => {
     try {
-      const data = await phoneService.getAllPhones();
+      const data = await phoneService.getAllPhones({ fields: PRODUCT_PICKER_FIELDS });
       setPhones(data);
     } catch (err: any) {
       console.error('Error fetching phones:', err);
@@ -126,7 +129,7 @@ const Purchases: React.FC = () => {
 
   const fetchAccessories = async () => {
     try {
-      const data = await accessoryService.getAllAccessories();
+      const data = await accessoryService.getAllAccessories({ fields: PRODUCT_PICKER_FIELDS });
       setAccessories(data);
     } catch (err: any) {
       console.error('Error fetching accessories:', err);
@@ -177,6 +180,20 @@ const Purchases: React.FC = () => {
     }
   };
 
+  const handleReceivePurchase = async (id: number) => {
+    if (!window.confirm('Add the quantities of this purchase to stock?')) return;
+    
+    try {
+      const receipt = await purchaseService.receivePurchase(id);
+      setPurchases(purchases.map(purchase =>
+        purchase.id === id ? { ...purchase, received_at: receipt.received_at } : purchase
+      ));
+    } catch (err: any) {
+      console.error('Error receiving purchase:', err);
+      setError(err.response?.data?.error || 'Failed to receive purchase. Please try again.');
+    }
+  };
+
   const onSubmit = async (data: any) => {
     try {
       // Calculate total amount
@@ -335,6 +352,9 @@ const Purchases: React.FC = () => {
         <div className="flex space-x-2">
           <button onClick={() => handleViewPurchase(item)} className="btn btn-sm btn-info">View</button>
           <button onClick={() => handleEditPurchase(item)} className="btn btn-sm btn-warning">Edit</button>
+          {!item.received_at && item.payment_status !== 'CANCELLED' && (
+            <button onClick={() => handleReceivePurchase(item.id)} className="btn btn-sm btn-success">Receive</button>
+          )}
           <button onClick={() => handleDeletePurchase(item.id)} className="btn btn-sm btn-error">Delete</button>
         </div>
       )
@@ -1,9 +1,8 @@
 import React, { useState, useEffect } from 'react';
 import saleService from '../api/saleService';
 import type { Sale } from '../api/saleService';
-import phoneService from '../api/phoneService';
+import catalogService from '../api/catalogService';
 import type { Phone } from '../api/phoneService';
-import accessoryService from '../api/accessoryService';
 import type { Accessory } from '../api/accessoryService';
 import Table from '../components/common/Table';
 import Button from '../components/common/Button';
@@ -51,8 +50,7 @@ const Sales: React.FC = () => {
   // Fetch sales, phones, and accessories on component mount
   useEffect(() => {
     fetchSales();
-    fetchPhones();
-    fetchAccessories();
+    fetchCatalog();
   }, []);
 
   // Effect to refetch when page changes
@@ -99,21 +97,14 @@ const Sales: React.FC = () => {
     }
   };
 
-  const fetchPhones = async () => {
+  // The sale form only needs names, prices and stock, which the catalog sync provides
+  const fetchCatalog = async () => {
     try {
-      const data = await phoneService.getAllPhones();
-      setPhones(data);
+      const products = await catalogService.sync();
+      setPhones(products.filter(p => p.product_type === 'phone') as unknown as Phone[]);
+      setAccessories(products.filter(p => p.product_type === 'accessory') as unknown as Accessory[]);
     } catch (err: any) {
-      console.error('Error fetching phones:', err);
-    }
-  };
-
-  const fetchAccessories = async () => {
-    try {
-      const data = await accessoryService.getAllAccessories();
-      setAccessories(data);
-    } catch (err: any) {
-      console.error('Error fetching accessories:', err);
+      console.error('Error fetching catalog:', err);
     }
   };
 
@@ -132,6 +123,7 @@ const Sales: React.FC = () => {
       await saleService.recordSale(data);
       setIsModalOpen(false);
       fetchSales();
+      fetchCatalog();
     } catch (err: any) {
       console.error('Error recording sale:', err);
       setError('Failed to record sale. Please try again.');
@@ -1,5 +1,5 @@
 import api from '../api/axios';
-import { Caisse, CaisseDetail, CaisseOperation, CaisseDeposit, CaisseWithdrawal, PaginatedResponse } from '../types/Caisse';
+import { Caisse, CaisseDetail, CaisseOperation, CaisseDeposit, CaisseWithdrawal, CaisseReport, PaginatedResponse } from '../types/Caisse';
 
 // Get all cash registers
 export const getCaisses = async (): Promise<Caisse[]> => {
@@ -45,6 +45,19 @@ export const getCaisseOperations = async (
   return response.data;
 };
 
+// Get aggregated report figures for a cash register, computed on the server
+export const getCaisseReport = async (
+  caisseId: number,
+  params: {
+    start_date?: string;
+    end_date?: string;
+    bucket?: 'day' | 'week' | 'month';
+  } = {}
+): Promise<CaisseReport> => {
+  const response = await api.get(`/caisse/${caisseId}/report/`, { params });
+  return response.data;
+};
+
 // Create a new cash register
 export const createCaisse = async (data: Partial<Caisse>): Promise<Caisse> => {
   const response = await api.post('/caisse/', data);
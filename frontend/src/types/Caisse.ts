@@ -39,6 +39,29 @@ export interface CaisseWithdrawal {
   description?: string;
 }
 
+export interface CaisseReportPeriod {
+  period: string;
+  count: number;
+  inflow: number;
+  outflow: number;
+  net: number;
+}
+
+export interface CaisseReport {
+  caisse: number;
+  start_date: string | null;
+  end_date: string | null;
+  bucket: 'day' | 'week' | 'month';
+  total_deposits: number;
+  total_withdrawals: number;
+  net: number;
+  operation_count: number;
+  today_operations: number;
+  weekly_operations: number;
+  operations_by_type: Record<string, { count: number; total: number }>;
+  series: CaisseReportPeriod[];
+}
+
 export interface PaginatedResponse<T> {
   count: number;
   next: string | null;